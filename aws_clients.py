@@ -0,0 +1,276 @@
+import base64
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+# Services whose endpoints are not regional; query them once per run
+GLOBAL_SERVICES = ['s3', 'iam', 'route53', 'cloudfront']
+
+# Error codes meaning the whole region is unusable with these credentials
+# (opt-in region not enabled, keys unknown to the regional STS partition)
+DEAD_REGION_CODES = {'AuthFailure', 'UnrecognizedClientException', 'InvalidClientTokenId', 'OptInRequired'}
+
+DEFAULT_DEAD_REGION_CACHE = os.path.join(os.path.expanduser('~'), '.awsenum', 'dead_regions.json')
+
+def decode_base64_key(encoded_key):
+    """Decode base64 encoded key if necessary"""
+    try:
+        return base64.b64decode(encoded_key).decode('utf-8')
+    except:
+        return encoded_key  # Return as-is if not base64 encoded
+
+class DeadlineExceeded(Exception):
+    pass
+
+class Deadline:
+    """Overall time budget for a run; seconds None means no deadline"""
+
+    def __init__(self, seconds=None):
+        self.expires = time.monotonic() + seconds if seconds else None
+
+    def remaining(self):
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def before_send(self, request, **kwargs):
+        """botocore before-send hook: no attempt starts after the deadline or waits past it
+
+        Abandoned tasks otherwise keep retrying at full timeouts, and the
+        interpreter waits for them at exit.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return
+        if remaining <= 0:
+            raise DeadlineExceeded('Deadline reached before this call was sent')
+        context = getattr(request, 'context', None)
+        if context is not None and 'client_config' in context:
+            read_timeout = context.get('read_timeout') or context['client_config'].read_timeout
+            context['read_timeout'] = max(0.1, min(read_timeout, remaining))
+
+def client_config(connect_timeout=5, read_timeout=30, max_attempts=3, deadline=None):
+    """botocore Config with tight timeouts, capped by what is left of the deadline"""
+    from botocore.config import Config
+    remaining = deadline.remaining() if deadline else None
+    if remaining is not None:
+        connect_timeout = max(0.1, min(connect_timeout, remaining))
+        read_timeout = max(0.1, min(read_timeout, remaining))
+    return Config(connect_timeout=connect_timeout, read_timeout=read_timeout,
+                  retries={'total_max_attempts': max_attempts, 'mode': 'standard'})
+
+def is_dead_region_error(error):
+    """True for errors that will fail other calls in the same region (or, for read timeouts, service) too
+
+    A missing endpoint (EndpointConnectionError) only says one service is
+    not offered in the region, so it is not one of them.
+    """
+    from botocore.exceptions import ClientError, ConnectTimeoutError, ReadTimeoutError
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') in DEAD_REGION_CODES
+    return isinstance(error, (ConnectTimeoutError, ReadTimeoutError))
+
+class DeadRegionCache:
+    """Regions that failed with an auth failure or connect timeout, per access key
+
+    A dead region is skipped for the rest of the run and, when ttl is
+    non-zero, for ttl seconds afterwards via a small JSON file. A read
+    timeout only marks the service that timed out in that region. Nothing
+    is recorded without an identity, so default-chain and profile runs
+    must pass their resolved access key (ClientPool.access_key_id).
+    """
+
+    def __init__(self, path=DEFAULT_DEAD_REGION_CACHE, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self._lock = threading.Lock()
+        if ttl and os.path.exists(path):
+            self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {key: entry for key, entry in entries.items() if entry['until'] > now}
+
+    def reason(self, identity, region, service=None):
+        """Why region (or service in it) is dead for identity, or None if it is usable"""
+        if identity is None:
+            return None
+        entry = self.entries.get(f"{identity}:{region}")
+        if entry is None and service:
+            entry = self.entries.get(f"{identity}:{region}:{service}")
+        return entry['reason'] if entry else None
+
+    def mark_dead(self, identity, region, error, service=None):
+        """Record region, or service in it for a read timeout, as dead; returns the reason"""
+        from botocore.exceptions import ReadTimeoutError
+        reason = type(error).__name__
+        if isinstance(getattr(error, 'response', None), dict):
+            reason = error.response.get('Error', {}).get('Code', reason)
+        if region is None or identity is None:
+            return reason  # a failing global endpoint says nothing about regions
+        key = f"{identity}:{region}"
+        if isinstance(error, ReadTimeoutError):
+            if not service:
+                return reason
+            key += f":{service}"
+        with self._lock:
+            self.entries[key] = {'reason': reason, 'until': time.time() + self.ttl}
+            if self.ttl:
+                self._save()
+        return reason
+
+    def _save(self):
+        """Merge with entries other processes saved, then replace the file atomically (0600: it holds key IDs)"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        entries = self._load()
+        entries.update(self.entries)
+        temporary = f"{self.path}.{os.getpid()}.{threading.get_ident()}"
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f)
+        os.replace(temporary, self.path)
+
+def add_timeout_arguments(parser):
+    parser.add_argument('--connect-timeout', type=float, default=5, help='Seconds to wait for a connection (default: 5)')
+    parser.add_argument('--read-timeout', type=float, default=30, help='Seconds to wait for a response (default: 30)')
+    parser.add_argument('--max-attempts', type=int, default=3, help='Attempts per API call, including retries (default: 3)')
+    parser.add_argument('--deadline', type=float, help='Stop after this many seconds and report partial results')
+    parser.add_argument('--dead-region-ttl', type=int, default=3600,
+                        help='Seconds to keep skipping a region after an auth failure or timeout (default: 3600, 0: this run only)')
+
+_loader_lock = threading.Lock()
+_shared_loader = None
+
+class _CredentialsProvider:
+    """Hand a ready-made botocore credentials object (e.g. refreshable role credentials) to a session"""
+    METHOD = 'awsenum'
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+
+    def load(self):
+        return self.credentials
+
+def new_session(access_key=None, secret_key=None, profile=None, session_token=None, credentials=None):
+    """boto3 Session that shares parsed service models with every other session
+
+    Each botocore session parses the service model JSON on its first client
+    (a few hundred ms for EC2); sessions for many accounts or keys reuse
+    one data loader and parse each model once per process. credentials
+    is a botocore credentials object used instead of the keys.
+    """
+    import boto3
+    import botocore.session
+    global _shared_loader
+    botocore_session = botocore.session.get_session()
+    with _loader_lock:
+        if _shared_loader is None:
+            _shared_loader = botocore_session.get_component('data_loader')
+        botocore_session.register_component('data_loader', _shared_loader)
+    if credentials is not None:
+        botocore_session.get_component('credential_provider').insert_before('env', _CredentialsProvider(credentials))
+    return boto3.Session(
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        aws_session_token=session_token,
+        profile_name=profile,
+        botocore_session=botocore_session
+    )
+
+class ClientPool:
+    """Share one boto3 session and cache its clients per (service, region)
+
+    boto3 clients are thread-safe once created, but creating them from a
+    shared session is not, so creation is serialized behind a lock.
+    """
+
+    def __init__(self, access_key=None, secret_key=None, profile=None, session_token=None, config=None,
+                 credentials=None, deadline=None):
+        self.session = new_session(access_key, secret_key, profile, session_token, credentials)
+        if deadline is not None:
+            self.session.events.register('before-send', deadline.before_send)
+        self.config = config
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, service, region=None):
+        """Return the cached client for a service/region, creating it on first use"""
+        key = (service, region)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self.session.client(service, region_name=region, config=self.config)
+                    self._clients[key] = client
+        return client
+
+    def access_key_id(self):
+        """Access key ID the session's credentials resolve to, or None without credentials"""
+        credentials = self.session.get_credentials()
+        return credentials.access_key if credentials else None
+
+    def get_account_id(self):
+        """Account ID of the session's credentials (cached across runs, see credential_cache)"""
+        from credential_cache import caller_identity
+        return caller_identity(self)['Account']
+
+    def get_all_regions(self):
+        """Get list of all regions enabled for the account"""
+        ec2_client = self.client('ec2', self.session.region_name or 'us-east-1')
+        return [region['RegionName'] for region in ec2_client.describe_regions()['Regions']]
+
+class CallCounter:
+    """Thread-safe API call counter"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, n=1):
+        with self._lock:
+            self.count += n
+
+def run_concurrently(tasks, max_workers=16, deadline=None):
+    """Run a dict of {key: callable} on a thread pool
+
+    Yields (key, result, error) tuples in completion order, so the caller
+    can stream results while slower tasks are still running. When the
+    deadline passes, every unfinished task is yielded with a
+    DeadlineExceeded error and abandoned instead of waited for.
+    """
+    if not tasks:
+        return
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks))))
+    futures = {executor.submit(func): key for key, func in tasks.items()}
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=deadline.remaining() if deadline else None):
+            pending.discard(future)
+            yield (futures[future],) + _outcome(future)
+    except FuturesTimeoutError:
+        for future in pending:
+            if future.done():
+                yield (futures[future],) + _outcome(future)
+            else:
+                yield futures[future], None, DeadlineExceeded('Deadline reached before this task finished')
+    finally:
+        executor.shutdown(wait=not pending, cancel_futures=True)
+
+def _outcome(future):
+    try:
+        return future.result(), None
+    except Exception as e:
+        return None, e
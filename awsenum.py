@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import argparse
+import importlib
+import sys
+
+# Subcommand -> (module, help). A module is only imported when its
+# subcommand runs, so `awsenum --help` never pays for boto3 or rich.
+COMMANDS = {
+    'perms': ('enum_aws', 'Enumerate service permissions for access keys'),
+    'ec2': ('enum_ec2', 'List EC2 instances across all regions'),
+    's3': ('list_buckets', 'List S3 buckets and test access'),
+    'eb': ('enum_elasticbean', 'Enumerate Elastic Beanstalk applications'),
+    'artifactory': ('enum_artifactory', 'Probe Artifactory API endpoints'),
+    'tui': ('enum_aws_tui', 'Interactive permission browser'),
+    'all': ('enum_all', 'Sweep EC2, S3, RDS, ElastiCache and Lambda across regions'),
+    'k8s': ('enum_k8s', 'Inventory EKS clusters and Secrets Manager secret metadata'),
+    'query': ('inventory', 'Query the local inventory without calling AWS'),
+    'org': ('org_audit', 'Run enumerators across every account of an AWS Organization'),
+    'diff': ('snapshot', 'Show what changed between two saved snapshots'),
+    'exposure': ('exposure', 'Find EC2 instances reachable from the internet through security groups'),
+    'ebs': ('enum_ebs', 'Inventory EBS volumes and snapshots with size totals'),
+    'collect': ('collector', 'Inventory any resource type enum_aws probes, from one table entry each')
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='awsenum', description='AWS enumeration toolkit')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND', required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        # Subcommand options (including -h) are parsed by the tool itself
+        subparsers.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    sys.argv[0] = f"awsenum {args.command}"
+    return module.main(rest)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1815 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+FIXTURE_REGIONS = [
+    'us-east-1', 'us-east-2', 'us-west-1', 'us-west-2', 'af-south-1',
+    'ap-east-1', 'ap-south-1', 'ap-northeast-1', 'ap-northeast-2', 'ap-northeast-3',
+    'ap-southeast-1', 'ap-southeast-2', 'ca-central-1', 'eu-central-1', 'eu-west-1',
+    'eu-west-2', 'eu-west-3', 'eu-north-1', 'me-south-1', 'sa-east-1'
+]
+
+class _StubBody:
+    def __init__(self, data):
+        self.data = data
+
+    def stream(self, **kwargs):
+        yield self.data
+
+def stub_transport(pool, responder, latency=0.0):
+    """Answer every HTTP request made by pool's clients without touching the network
+
+    responder(service_id, operation, request) returns (status, body). Bodies
+    are dicts for JSON protocols or bytes for XML ones; botocore still
+    serializes, signs and parses every call. Must run before clients exist.
+    """
+    from botocore.awsrequest import AWSResponse
+
+    def before_send(request, event_name, **kwargs):
+        _, service_id, operation = event_name.split('.')
+        if latency:
+            time.sleep(latency)
+        status, body = responder(service_id, operation, request)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        return AWSResponse(request.url, status, {}, _StubBody(body))
+
+    pool.session.events.register('before-send', before_send)
+    return pool
+
+def stub_pool(responder, latency=0.0):
+    """A ClientPool with fake credentials whose requests are answered by responder"""
+    from aws_clients import ClientPool
+    return stub_transport(ClientPool(access_key='AKIAFAKE', secret_key='fake', profile=None), responder, latency)
+
+# list_k8s.sh as it was before it became a wrapper around enum_k8s.py, the
+# baseline bench_k8s measures
+LEGACY_LIST_K8S = r'''#!/bin/bash
+
+# Script to list all EKS clusters and Secrets Manager secrets across all regions
+
+# Get all AWS regions
+REGIONS=$(aws ec2 describe-regions --query "Regions[].RegionName" --output text)
+
+echo "=== Listing All EKS Clusters Across All Regions ==="
+echo "---------------------------------------------------------"
+
+# Loop through each region to list EKS clusters
+for REGION in $REGIONS; do
+  echo "Checking EKS clusters in region: $REGION"
+  CLUSTERS=$(aws eks list-clusters \
+    --region "$REGION" \
+    --query "clusters[]" \
+    --output table 2>/dev/null)
+  
+  if [ -n "$CLUSTERS" ] && [ "$CLUSTERS" != "||" ]; then
+    echo "$CLUSTERS"
+  else
+    echo "No EKS clusters found in $REGION"
+  fi
+  echo "---------------------------------------------------------"
+done
+
+echo "=== Listing All Secrets Manager Secrets ==="
+echo "---------------------------------------------------------"
+
+# List secrets in each region (Secrets Manager is region-specific)
+for REGION in $REGIONS; do
+  echo "Checking Secrets Manager secrets in region: $REGION"
+  SECRETS=$(aws secretsmanager list-secrets \
+    --region "$REGION" \
+    --query "SecretList[].{Name:Name, ARN:ARN, LastChangedDate:LastChangedDate}" \
+    --output table 2>/dev/null)
+  
+  if [ -n "$SECRETS" ] && [ "$SECRETS" != "||" ]; then
+    echo "$SECRETS"
+  else
+    echo "No secrets found in $REGION"
+  fi
+  echo "---------------------------------------------------------"
+done
+
+echo "Enumeration complete!"
+'''
+
+def fake_aws_cli(directory, outputs, latency):
+    """Write an `aws` executable that costs roughly what the real CLI costs to start
+
+    It imports botocore and loads the service model like the real CLI, sleeps
+    for the simulated round trip, then prints a canned output chosen by the
+    "service operation" words of its arguments.
+    """
+    path = os.path.join(directory, 'aws')
+    with open(path, 'w') as f:
+        f.write(f"""#!{sys.executable}
+import sys, time, botocore.session
+words = [a for a in sys.argv[1:] if not a.startswith('-')]
+botocore.session.get_session().get_service_model(words[0])
+time.sleep({latency!r})
+print({outputs!r}.get(' '.join(words[:2]), ''))
+""")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+def import_profile(args, repeat=5):
+    """Run python -X importtime with args and return (best total µs, imported module names)
+
+    Total is the sum of the cumulative time of every top-level import, which
+    is what the interpreter actually spent importing before exiting.
+    """
+    best = None
+    modules = set()
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                                cwd=HERE, capture_output=True, text=True)
+        total = 0
+        modules = set()
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            modules.add(name.strip())
+            if not name.startswith('  '):  # top-level import, cumulative covers its children
+                total += int(cumulative)
+        best = total if best is None else min(best, total)
+    return best, modules
+
+def bench_importtime(args):
+    """Import cost of --help and of the JSONL output path, eager vs lazy"""
+    jsonl_path = ("import enum_all, aws_clients, output_sink; "
+                  "aws_clients.ClientPool(access_key='x', secret_key='y'); "
+                  "output_sink.open_sink('jsonl').close()")
+    cases = [
+        ('eager tool imports (before)', ['-c', 'import boto3, botocore.exceptions, rich.console, rich.table, curses, json']),
+        ('awsenum --help', ['awsenum.py', '--help']),
+        ('awsenum perms --help', ['awsenum.py', 'perms', '--help']),
+        ('awsenum collect --help', ['awsenum.py', 'collect', '--help']),
+        ('awsenum all --format jsonl imports', ['-c', jsonl_path])
+    ]
+    print(f"{'case':40} {'import ms':>10}  rich  boto3  botocore")
+    for label, case_args in cases:
+        total, modules = import_profile(case_args, args.repeat)
+        print(f"{label:40} {total / 1000:10.1f}  {'yes' if 'rich' in modules else 'no':4}  "
+              f"{'yes' if 'boto3' in modules else 'no':5}  {'yes' if 'botocore' in modules else 'no'}")
+
+def k8s_responder(clusters_per_region, secrets_per_region, page_size=100):
+    """EKS/Secrets Manager fixture: N clusters with two nodegroups, M secrets per region"""
+    def respond(service_id, operation, request):
+        region = request.url.split('.')[1]
+        if operation == 'ListClusters':
+            return 200, {'clusters': [f'{region}-cluster-{i}' for i in range(clusters_per_region)]}
+        if operation == 'DescribeCluster':
+            name = request.url.rsplit('/', 1)[1]
+            return 200, {'cluster': {'name': name, 'arn': f'arn:aws:eks:{region}:123456789012:cluster/{name}',
+                                     'version': '1.29', 'status': 'ACTIVE', 'createdAt': 1700000000,
+                                     'resourcesVpcConfig': {'vpcId': 'vpc-1', 'endpointPublicAccess': True}}}
+        if operation == 'ListNodegroups':
+            return 200, {'nodegroups': ['ng-a', 'ng-b']}
+        if operation == 'ListSecrets':
+            token = json.loads(request.body or b'{}').get('NextToken')
+            start = int(token or 0)
+            end = min(start + page_size, secrets_per_region)
+            body = {'SecretList': [{'Name': f'secret-{i}', 'ARN': f'arn:aws:secretsmanager:{region}:123456789012:secret:s{i}',
+                                    'LastChangedDate': 1700000000, 'RotationEnabled': i % 2 == 0}
+                                   for i in range(start, end)]}
+            if end < secrets_per_region:
+                body['NextToken'] = str(end)
+            return 200, body
+        return 400, {'__type': 'UnknownOperationException', 'message': operation}
+    return respond
+
+def bench_k8s(args):
+    """enum_k8s.py vs list_k8s.sh on a stubbed 20-region EKS/Secrets Manager fixture"""
+    import enum_k8s
+    from output_sink import JsonlSink
+
+    pool = stub_pool(k8s_responder(args.clusters, args.secrets), args.latency)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull:
+        count = enum_k8s.run_inventory(pool, FIXTURE_REGIONS, JsonlSink(devnull))
+    python_time = time.perf_counter() - start
+
+    outputs = {
+        'ec2 describe-regions': '\t'.join(FIXTURE_REGIONS),
+        'eks list-clusters': '\n'.join(f'|  cluster-{i} |' for i in range(args.clusters)),
+        'secretsmanager list-secrets': '\n'.join(f'|  secret-{i} |' for i in range(min(args.secrets, 100)))
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        fake_aws_cli(directory, outputs, args.latency)
+        script = os.path.join(directory, 'list_k8s.sh')
+        with open(script, 'w') as f:
+            f.write(LEGACY_LIST_K8S)
+        env = dict(os.environ, PATH=directory + os.pathsep + os.environ['PATH'])
+        start = time.perf_counter()
+        subprocess.run(['bash', script], env=env, stdout=subprocess.DEVNULL, check=True)
+        shell_time = time.perf_counter() - start
+
+    print(f"regions={len(FIXTURE_REGIONS)} clusters/region={args.clusters} secrets/region={args.secrets} "
+          f"latency={args.latency * 1000:.0f}ms")
+    print(f"list_k8s.sh  {shell_time:8.2f}s  pre-rewrite script: first page only, cluster names only")
+    print(f"enum_k8s.py  {python_time:8.2f}s  {count} records, all pages, clusters described")
+
+class FakeEC2:
+    """Minimal in-memory EC2 client implementing the paginated describe calls
+
+    Filtered describes honour the *-id filters the way EC2 does, pages hold
+    at most page_size items, and every page served is counted in calls.
+    """
+
+    RESULT_KEYS = {
+        'describe_instances': ('Reservations', 'instance-id', 'InstanceId'),
+        'describe_security_groups': ('SecurityGroups', 'group-id', 'GroupId'),
+        'describe_volumes': ('Volumes', 'volume-id', 'VolumeId'),
+        'describe_images': ('Images', 'image-id', 'ImageId'),
+        'describe_snapshots': ('Snapshots', 'snapshot-id', 'SnapshotId')
+    }
+
+    def __init__(self, data, page_size=1000):
+        self.data = data
+        self.page_size = page_size
+        self.calls = {}
+
+    def can_paginate(self, operation):
+        return True
+
+    def paginate(self, Filters=None, **kwargs):
+        operation = self._operation
+        result_key, filter_name, id_key = self.RESULT_KEYS[operation]
+        items = self.data.get(result_key, [])
+        for flt in Filters or []:
+            if flt['Name'] == filter_name:
+                wanted = set(flt['Values'])
+                items = [item for item in items if item[id_key] in wanted]
+        for start in range(0, max(len(items), 1), self.page_size):
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            yield {result_key: items[start:start + self.page_size]}
+
+    def __getattr__(self, name):
+        if name in self.RESULT_KEYS:
+            self._operation = name
+            return lambda **kwargs: next(iter(self.paginate(**kwargs)))
+        raise AttributeError(name)
+
+    def get_paginator(self, operation):
+        self._operation = operation
+        return self
+
+def ec2_fixture(instances, groups, amis, rules_per_group=5):
+    """Synthetic region: instances with two security groups, one volume and a shared AMI each"""
+    data = {
+        'SecurityGroups': [{
+            'GroupId': f'sg-{g:08x}', 'GroupName': f'group-{g}', 'VpcId': 'vpc-1',
+            'IpPermissions': [{'IpProtocol': 'tcp', 'FromPort': 1000 + r, 'ToPort': 1000 + r,
+                               'IpRanges': [{'CidrIp': '0.0.0.0/0' if r == 0 and g % 10 == 0 else f'10.{g % 256}.{r}.0/24'}],
+                               'UserIdGroupPairs': [{'GroupId': f'sg-{(g + 1) % groups:08x}'}] if r == 1 else []}
+                              for r in range(rules_per_group)]
+        } for g in range(groups)],
+        'Images': [{'ImageId': f'ami-{a:08x}', 'Name': f'image-{a}', 'OwnerId': '137112412989',
+                    'CreationDate': '2024-01-01T00:00:00.000Z', 'Public': True} for a in range(amis)],
+        'Volumes': [],
+        'Reservations': []
+    }
+    for i in range(instances):
+        volume_id = f'vol-{i:08x}'
+        data['Volumes'].append({'VolumeId': volume_id, 'Size': 8 + i % 100, 'VolumeType': 'gp3',
+                                'Encrypted': i % 3 != 0, 'State': 'in-use',
+                                'Attachments': [{'InstanceId': f'i-{i:08x}', 'Device': '/dev/xvda'}]})
+        data['Reservations'].append({'Instances': [{
+            'InstanceId': f'i-{i:08x}', 'InstanceType': 't3.micro', 'State': {'Name': 'running'},
+            'ImageId': f'ami-{i % amis:08x}', 'VpcId': 'vpc-1', 'SubnetId': f'subnet-{i % 16}',
+            'PrivateIpAddress': f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}',
+            'PublicIpAddress': f'54.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}' if i % 4 == 0 else None,
+            'SecurityGroups': [{'GroupId': f'sg-{(i * 7) % groups:08x}', 'GroupName': 'a'},
+                               {'GroupId': f'sg-{(i * 13 + 1) % groups:08x}', 'GroupName': 'b'}],
+            'BlockDeviceMappings': [{'DeviceName': '/dev/xvda', 'Ebs': {'VolumeId': volume_id}}],
+            'IamInstanceProfile': {'Arn': 'arn:aws:iam::123456789012:instance-profile/app'},
+            'MetadataOptions': {'HttpTokens': 'required' if i % 2 else 'optional', 'HttpEndpoint': 'enabled'},
+            'Tags': [{'Key': 'Name', 'Value': f'host-{i}'}, {'Key': 'team', 'Value': f'team-{i % 12}'}]
+        }]})
+    return data
+
+def bench_ec2_detailed(args):
+    """API calls and time to enrich a 10k-instance region in enum_ec2 --detailed mode"""
+    import enum_ec2
+
+    data = ec2_fixture(args.instances, groups=300, amis=40)
+    ec2 = FakeEC2(data)
+    raw = [instance for page in ec2.get_paginator('describe_instances').paginate()
+           for reservation in page['Reservations'] for instance in reservation['Instances']]
+    records = [enum_ec2.Ec2Instance.from_api('us-east-1', instance) for instance in raw]
+    enum_ec2.AMI_CACHE.clear()
+    ec2.calls.clear()
+    start = time.perf_counter()
+    _, calls = enum_ec2.enrich_instances(ec2, raw, records)
+    elapsed = time.perf_counter() - start
+    print(f"instances={len(raw)} distinct SGs=300 volumes={len(raw)} AMIs=40")
+    print(f"batched enrichment: {calls} API calls in {elapsed:.2f}s  {ec2.calls}")
+    print(f"per-instance lookups would need ~{len(raw) * 3} calls")
+    ec2.calls.clear()
+    _, calls = enum_ec2.enrich_instances(ec2, raw, records)
+    print(f"second region, warm AMI cache: {calls} API calls  {ec2.calls}")
+
+def legacy_instance_dict(region, instance):
+    """The per-instance dict enum_ec2.get_ec2_instances built before records.py"""
+    instance_details = {
+        'Region': region,
+        'InstanceId': instance.get('InstanceId', 'N/A'),
+        'InstanceType': instance.get('InstanceType', 'N/A'),
+        'State': instance.get('State', {}).get('Name', 'N/A'),
+        'PublicIP': instance.get('PublicIpAddress', 'N/A'),
+        'PrivateIP': instance.get('PrivateIpAddress', 'N/A'),
+        'LaunchTime': str(instance.get('LaunchTime', 'N/A')),
+        'Name': 'N/A'
+    }
+    for tag in instance.get('Tags', []):
+        if tag['Key'] == 'Name':
+            instance_details['Name'] = tag['Value']
+            break
+    return instance_details
+
+def parsed_instances(count):
+    """Instances as botocore hands them over: every string a separate object"""
+    import datetime
+    data = json.loads(json.dumps(ec2_fixture(count, groups=300, amis=40)))
+    instances = [reservation['Instances'][0] for reservation in data['Reservations']]
+    for i, instance in enumerate(instances):
+        instance['LaunchTime'] = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=i)
+    return instances
+
+def bench_records_memory(args):
+    """Per-record memory of legacy dicts vs records.Ec2Instance vs RecordBatch"""
+    import gc
+    import tracemalloc
+    from records import Ec2Instance, RecordBatch
+
+    instances = parsed_instances(args.instances)
+    regions = [''.join(['us-east-', str(1 + i % 2)]) for i in range(len(instances))]  # distinct str objects
+
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return result, after - before
+
+    legacy, legacy_bytes = measure(lambda: [legacy_instance_dict(r, i) for r, i in zip(regions, instances)])
+    del legacy
+    records, record_bytes = measure(lambda: [Ec2Instance.from_api(r, i) for r, i in zip(regions, instances)])
+    # The batch shares field values with the records it was built from, so this counts only its own storage
+    batch, batch_bytes = measure(lambda: RecordBatch.from_records(Ec2Instance, records))
+    count = len(instances)
+    print(f"instances={count}")
+    print(f"legacy dicts       {legacy_bytes / count:8.0f} B/record  {legacy_bytes / 2**20:8.1f} MiB")
+    print(f"Ec2Instance tuples {record_bytes / count:8.0f} B/record  {record_bytes / 2**20:8.1f} MiB")
+    print(f"RecordBatch        {batch_bytes / count:8.0f} B/record  {batch_bytes / 2**20:8.1f} MiB  (column storage only)")
+
+def bench_inventory(args):
+    """Bulk ingest into the SQLite inventory and indexed lookup latency"""
+    from inventory import Inventory
+    from records import Ec2Instance
+
+    records = [Ec2Instance.from_api(FIXTURE_REGIONS[i % 4], instance)
+               for i, instance in enumerate(parsed_instances(args.instances))]
+    with tempfile.TemporaryDirectory() as directory:
+        inventory = Inventory(os.path.join(directory, 'inventory.db'))
+        start = time.perf_counter()
+        inventory.add_records(records, account='123456789012')
+        elapsed = time.perf_counter() - start
+        print(f"ingest {len(records)} records: {elapsed:.2f}s ({len(records) / elapsed:,.0f} records/s)")
+        lookups = [
+            ('public IP', {'ip': records[len(records) // 2].PublicIP or records[0].PublicIP}),
+            ('instance ID', {'resource_id': records[-1].InstanceId}),
+            ('tag team=team-3', {'tags': [('team', 'team-3')], 'limit': 100}),
+            ('region + type', {'region': 'us-east-2', 'resource_type': 'ec2:instance', 'limit': 100})
+        ]
+        for label, filters in lookups:
+            start = time.perf_counter()
+            results = inventory.query(**filters)
+            print(f"query {label:18} {len(results):5} results  {(time.perf_counter() - start) * 1000:7.2f} ms")
+        inventory.close()
+
+WIDE_SERVICES = [
+    ('ec2', 'instance/i-{:08x}'), ('ec2', 'volume/vol-{:08x}'), ('ec2', 'security-group/sg-{:08x}'),
+    ('rds', 'db:db-{}'), ('lambda', 'function:fn-{}'), ('dynamodb', 'table/table-{}'),
+    ('sqs', 'queue-{}'), ('sns', 'topic-{}'), ('kms', 'key/{:08x}'), ('secretsmanager', 'secret:s-{}'),
+    ('elasticloadbalancing', 'loadbalancer/app/lb-{}/abc'), ('eks', 'cluster/c-{}')
+]
+
+def ec2_instances_xml(instance_ids):
+    """Minimal DescribeInstances XML body for the given IDs"""
+    items = ''.join(f"<item><instanceId>{i}</instanceId><instanceType>t3.micro</instanceType>"
+                    f"<instanceState><name>running</name></instanceState></item>" for i in instance_ids)
+    return (f'<DescribeInstancesResponse xmlns="http://ec2.amazonaws.com/doc/2016-11-15/">'
+            f'<reservationSet><item><instancesSet>{items}</instancesSet></item></reservationSet>'
+            f'</DescribeInstancesResponse>').encode('utf-8')
+
+def wide_responder(resources_per_region, page_size=100):
+    """Tagging API fixture spreading resources over a dozen services, plus DescribeInstances"""
+    from urllib.parse import parse_qs
+
+    def respond(service_id, operation, request):
+        region = request.url.split('.')[1]
+        if operation == 'GetResources':
+            start = int(json.loads(request.body or b'{}').get('PaginationToken') or 0)
+            end = min(start + page_size, resources_per_region)
+            mappings = []
+            for i in range(start, end):
+                service, resource = WIDE_SERVICES[i % len(WIDE_SERVICES)]
+                mappings.append({'ResourceARN': f'arn:aws:{service}:{region}:123456789012:{resource.format(i)}',
+                                 'Tags': [{'Key': 'team', 'Value': f'team-{i % 7}'}]})
+            body = {'ResourceTagMappingList': mappings}
+            if end < resources_per_region:
+                body['PaginationToken'] = str(end)
+            return 200, body
+        if operation == 'DescribeInstances':
+            query = parse_qs(request.body.decode('utf-8') if isinstance(request.body, bytes) else request.body)
+            ids = [values[0] for key, values in query.items() if key.startswith('Filter.1.Value.')]
+            return 200, ec2_instances_xml(ids)
+        return 400, {'__type': 'UnknownOperationException', 'message': operation}
+    return respond
+
+def bench_wide(args):
+    """enum_all --wide call count on a stubbed 20-region account vs per-service probing"""
+    from output_sink import JsonlSink
+    from tagging_inventory import run_wide
+
+    pool = stub_pool(wide_responder(args.resources), args.latency)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull:
+        count, calls = run_wide(pool, FIXTURE_REGIONS, JsonlSink(devnull), ['ec2:instance'])
+    elapsed = time.perf_counter() - start
+    # enum_aws probes 21 regional operations per region; a real inventory pages each of them
+    per_service = 21 * len(FIXTURE_REGIONS) * max(1, args.resources // len(WIDE_SERVICES) // 100)
+    print(f"regions={len(FIXTURE_REGIONS)} resources/region={args.resources} services={len(WIDE_SERVICES)}")
+    print(f"--wide: {count} resources, ec2:instance described, {calls} API calls, {elapsed:.2f}s")
+    print(f"per-service describe sweep: at least {per_service} API calls for the same services")
+
+def config_items(region, per_type):
+    """Advanced query rows for per_type instances, databases, functions and buckets in a region"""
+    items = []
+    for i in range(per_type):
+        items += [
+            {'resourceId': f'i-{region}-{i}', 'resourceType': 'AWS::EC2::Instance', 'awsRegion': region,
+             'accountId': '123456789012', 'configuration': {'instanceType': 't3.micro', 'state': {'name': 'running'}}},
+            {'resourceId': f'db-{i}', 'resourceName': f'db-{region}-{i}', 'resourceType': 'AWS::RDS::DBInstance',
+             'awsRegion': region, 'accountId': '123456789012', 'configuration': {'engine': 'postgres'}},
+            {'resourceId': f'fn-{region}-{i}', 'resourceName': f'fn-{region}-{i}', 'resourceType': 'AWS::Lambda::Function',
+             'awsRegion': region, 'accountId': '123456789012', 'configuration': {'runtime': 'python3.12'}},
+            {'resourceId': f'bucket-{region}-{i}', 'resourceName': f'bucket-{region}-{i}', 'resourceType': 'AWS::S3::Bucket',
+             'awsRegion': region, 'accountId': '123456789012', 'configuration': {}}
+        ]
+    return items
+
+def config_responder(per_type, aggregator, page_size=100):
+    """AWS Config fixture: an all-region aggregator, or a recorder in every region"""
+    items = {region: config_items(region, per_type) for region in FIXTURE_REGIONS}
+    every_region = [item for region in FIXTURE_REGIONS for item in items[region]]
+
+    def page(rows, request):
+        start = int(json.loads(request.body or b'{}').get('NextToken') or 0)
+        body = {'Results': [json.dumps(row) for row in rows[start:start + page_size]]}
+        if start + page_size < len(rows):
+            body['NextToken'] = str(start + page_size)
+        return 200, body
+
+    def respond(service_id, operation, request):
+        region = request.url.split('.')[1]
+        if operation == 'DescribeConfigurationAggregators':
+            found = [{'ConfigurationAggregatorName': 'org',
+                      'OrganizationAggregationSource': {'RoleArn': 'arn', 'AllAwsRegions': True}}]
+            return 200, {'ConfigurationAggregators': found if aggregator else []}
+        if operation == 'GetAggregateDiscoveredResourceCounts':
+            types = {item['resourceType'] for item in items[json.loads(request.body)['Filters']['Region']]}
+            return 200, {'GroupedResourceCounts': [{'GroupName': t, 'ResourceCount': per_type} for t in sorted(types)],
+                         'TotalDiscoveredResources': per_type * len(types), 'GroupByKey': 'RESOURCE_TYPE'}
+        if operation == 'SelectAggregateResourceConfig':
+            expression = json.loads(request.body)['Expression']
+            return page([item for item in every_region if f"'{item['awsRegion']}'" in expression], request)
+        if operation == 'DescribeConfigurationRecorderStatus':
+            return 200, {'ConfigurationRecordersStatus': [{'name': 'default', 'recording': True}]}
+        if operation == 'DescribeConfigurationRecorders':
+            return 200, {'ConfigurationRecorders': [{'name': 'default', 'recordingGroup': {'allSupported': True}}]}
+        if operation == 'SelectResourceConfig':
+            return page(items[region], request)
+        return 400, {'__type': 'UnknownOperationException', 'message': operation}
+    return respond
+
+def bench_config(args):
+    """enum_all --config API calls and wall time via an aggregator and via per-region recorders"""
+    from config_inventory import collect_from_config
+
+    services = ['ec2', 'rds', 'lambda', 's3']
+    print(f"regions={len(FIXTURE_REGIONS)} resources per type per region={args.resources // 4} services={','.join(services)}")
+    for label, aggregator in (('aggregator', True), ('recorders', False)):
+        pool = stub_pool(config_responder(args.resources // 4, aggregator), args.latency)
+        start = time.perf_counter()
+        records, covered, report = collect_from_config(pool, FIXTURE_REGIONS, services, account='123456789012')
+        elapsed = time.perf_counter() - start
+        direct = report['config_calls'] + report['calls_saved']
+        print(f"{label:<10}: {len(records)} resources, {len(covered)} service/region pairs covered, "
+              f"{report['config_calls']} Config calls vs ~{direct} direct calls, {elapsed:.2f}s")
+
+def generic_responder(service_id, operation, request):
+    """Empty successful answer for any operation, plus the regions and identity enum_aws needs"""
+    if operation == 'DescribeRegions':
+        items = ''.join(f'<item><regionName>{region}</regionName></item>' for region in FIXTURE_REGIONS)
+        return 200, f'<DescribeRegionsResponse><regionInfo>{items}</regionInfo></DescribeRegionsResponse>'.encode()
+    if operation == 'GetCallerIdentity':
+        return 200, (b'<GetCallerIdentityResponse><GetCallerIdentityResult><UserId>AIDAFAKE</UserId>'
+                     b'<Account>123456789012</Account><Arn>arn:aws:iam::123456789012:user/bench</Arn>'
+                     b'</GetCallerIdentityResult></GetCallerIdentityResponse>')
+    content_type = request.headers.get('Content-Type', b'')
+    if 'json' in (content_type.decode() if isinstance(content_type, bytes) else content_type):
+        return 200, {}
+    return 200, f'<{operation}Response><{operation}Result></{operation}Result></{operation}Response>'.encode()
+
+def bench_replay(args):
+    """enum_aws --all-regions recorded against a stubbed AWS, then replayed from the cassette"""
+    import boto3
+    import contextlib
+    import io
+    from botocore import handlers
+    from botocore.awsrequest import AWSResponse
+    import cassette
+    import enum_aws
+
+    tool_args = ['--access-key', 'AKIAFAKE', '--secret-key', 'fake', '--all-regions']
+    env = dict(os.environ, AWS_DEFAULT_REGION='us-east-1')
+    env.pop('AWS_ACCESS_KEY_ID', None)
+    env.pop('AWS_SECRET_ACCESS_KEY', None)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'enum_aws.cassette.gz')
+        # enum_aws lists regions with the default credential chain
+        saved_env = dict(os.environ)
+        os.environ.update(AWS_DEFAULT_REGION='us-east-1', AWS_ACCESS_KEY_ID='AKIAFAKE', AWS_SECRET_ACCESS_KEY='fake')
+        try:
+            def before_send(request, event_name, **kwargs):
+                _, service_id, operation = event_name.split('.')
+                time.sleep(args.latency)
+                status, body = generic_responder(service_id, operation, request)
+                if isinstance(body, dict):
+                    body = json.dumps(body).encode('utf-8')
+                return AWSResponse(request.url, status, {}, _StubBody(body))
+
+            handlers.BUILTIN_HANDLERS.append(('before-send', before_send))
+            boto3.DEFAULT_SESSION = None
+            recorder = cassette.install(path, 'record')
+            recorded = io.StringIO()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(recorded):
+                enum_aws.main(tool_args)
+            record_time = time.perf_counter() - start
+            recorder.save()
+        finally:
+            handlers.BUILTIN_HANDLERS.remove(('before-send', before_send))
+            cassette.uninstall()
+            boto3.DEFAULT_SESSION = None
+            os.environ.clear()
+            os.environ.update(saved_env)
+
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            replayed = subprocess.run([sys.executable, os.path.join(HERE, 'enum_aws.py')] + tool_args + ['--replay', path],
+                                      capture_output=True, text=True, env=env, check=True)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"cassette: {len(recorder.lines)} calls, {os.path.getsize(path)} bytes compressed")
+        print(f"record (stubbed AWS, {args.latency * 1000:.0f} ms/call, in-process): {record_time:.2f}s")
+        print(f"replay (whole enum_aws.py process, no network or credentials): {best:.2f}s")
+        print(f"replayed report identical: {replayed.stdout == recorded.getvalue()}")
+
+def bench_budget(args):
+    """enum_aws --all-regions probes under --max-calls budgets on a stubbed 20-region account"""
+    import budget
+    from botocore import handlers
+    from botocore.awsrequest import AWSResponse
+    from enum_aws import PROBE_PRIORITY, check_service_permissions
+
+    def before_send(request, event_name, **kwargs):
+        _, service_id, operation = event_name.split('.')
+        time.sleep(args.latency)
+        status, body = generic_responder(service_id, operation, request)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        return AWSResponse(request.url, status, {}, _StubBody(body))
+
+    print(f"{'budget':>8} {'planned':>8} {'used':>5} {'skipped':>8} {'tier 0 covered':>15} {'seconds':>8}")
+    handlers.BUILTIN_HANDLERS.append(('before-send', before_send))
+    try:
+        for max_calls in (None, 200, 60):
+            call_budget = budget.install(budget.CallBudget(max_calls))
+            start = time.perf_counter()
+            permissions = check_service_permissions('AKIAFAKE', 'fake', True, regions=FIXTURE_REGIONS,
+                                                    budget=call_budget)
+            elapsed = time.perf_counter() - start
+            budget.uninstall()
+            tier0 = [label for label in permissions if PROBE_PRIORITY.get(label.split(' ')[0], 2) == 0]
+            covered = sum(1 for label in tier0 if 'Skipped (budget)' not in permissions[label])
+            print(f"{max_calls or 'none':>8} {call_budget.planned:>8} {call_budget.used:>5} "
+                  f"{sum(call_budget.skipped.values()):>8} {f'{covered}/{len(tier0)}':>15} {elapsed:>8.2f}")
+    finally:
+        handlers.BUILTIN_HANDLERS.remove(('before-send', before_send))
+        budget.uninstall()
+
+def denying_responder(denied, conditional, allowed_regions):
+    """generic_responder, but services in denied refuse every call for lack of an identity-based allow
+
+    Services in conditional refuse calls outside allowed_regions, as an SCP
+    with an aws:RequestedRegion condition would.
+    """
+    def deny(service_id, operation, request, message):
+        content_type = request.headers.get('Content-Type', b'')
+        if 'json' in (content_type.decode() if isinstance(content_type, bytes) else content_type):
+            return 400, {'__type': 'AccessDeniedException', 'message': message}
+        if service_id == 'ec2':
+            return 403, (f'<Response><Errors><Error><Code>UnauthorizedOperation</Code><Message>You are not '
+                         f'authorized to perform this operation. Encoded authorization failure message: '
+                         f'AbCdEf</Message></Error></Errors></Response>').encode()
+        return 403, (f'<ErrorResponse><Error><Type>Sender</Type><Code>AccessDenied</Code><Message>{message}'
+                     f'</Message></Error></ErrorResponse>').encode()
+
+    def respond(service_id, operation, request):
+        service = service_id.replace('-', '').lower()
+        region = request.url.split('.')[1] if request.url.count('.') > 2 else None
+        if service in denied:
+            return deny(service_id, operation, request, f"User: arn:aws:iam::123456789012:user/bench is not "
+                        f"authorized to perform: {service}:{operation} because no identity-based policy "
+                        f"allows the {service}:{operation} action")
+        if service in conditional and region not in allowed_regions:
+            return deny(service_id, operation, request, f"User: arn:aws:iam::123456789012:user/bench is not "
+                        f"authorized to perform: {service}:{operation} with an explicit deny in a service "
+                        f"control policy")
+        return generic_responder(service_id, operation, request)
+    return respond
+
+def bench_inference(args):
+    """enum_aws --all-regions API calls with canary-region inference vs --exhaustive on a mostly denied key"""
+    from collections import Counter
+    from botocore import handlers
+    from botocore.awsrequest import AWSResponse
+    from enum_aws import INFERRED_DENIAL, check_service_permissions
+
+    denied = {'ec2', 'dynamodb', 'rds', 'sns', 'kms', 'secretsmanager', 'ssm', 'ecs', 'autoscaling'}
+    conditional = {'sqs'}
+    responder = denying_responder(denied, conditional, FIXTURE_REGIONS[-2:])
+    calls = Counter()
+
+    def before_send(request, event_name, **kwargs):
+        _, service_id, operation = event_name.split('.')
+        calls[service_id] += 1
+        time.sleep(args.latency)
+        status, body = responder(service_id, operation, request)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        return AWSResponse(request.url, status, {}, _StubBody(body))
+
+    print(f"regions={len(FIXTURE_REGIONS)}, identity-denied services={len(denied)}, "
+          f"SCP-denied outside {len(FIXTURE_REGIONS[-2:])} regions: {', '.join(sorted(conditional))}")
+    handlers.BUILTIN_HANDLERS.append(('before-send', before_send))
+    try:
+        results = {}
+        for label, exhaustive in (('--exhaustive', True), ('canary inference', False)):
+            calls.clear()
+            start = time.perf_counter()
+            permissions = check_service_permissions('AKIAFAKE', 'fake', True, regions=FIXTURE_REGIONS,
+                                                    exhaustive=exhaustive)
+            elapsed = time.perf_counter() - start
+            inferred = sum(1 for actions in permissions.values() if actions == [INFERRED_DENIAL])
+            results[label] = {key: ['None'] if actions == [INFERRED_DENIAL] else actions
+                              for key, actions in permissions.items()}
+            print(f"{label:<17}: {sum(calls.values()):4d} calls, {elapsed:6.2f}s, {inferred} entries inferred")
+    finally:
+        handlers.BUILTIN_HANDLERS.remove(('before-send', before_send))
+    same = results['--exhaustive'] == results['canary inference']
+    print(f"Allowed actions identical: {same}")
+
+def bench_file_keys(args):
+    """enum_aws --file --all-regions on 4 accounts x 3 keys plus duplicate rows, per row vs grouped by account"""
+    import contextlib
+    import io
+    import re
+    from collections import Counter
+    from botocore import handlers
+    from botocore.awsrequest import AWSResponse
+    import credential_cache
+    import enum_aws
+    from aws_clients import DeadRegionCache
+
+    accounts = ['%012d' % (222222222222 + i) for i in range(4)]
+    keys = [f"AKIA{account}{n:04d}" for account in accounts for n in range(3)]
+    rows = [(key, 'fake') for key in keys] + [(key, 'fake') for key in keys[::4]]
+    opt_in_region = FIXTURE_REGIONS[-1]
+    calls = Counter()
+
+    def before_send(request, event_name, **kwargs):
+        _, service_id, operation = event_name.split('.')
+        calls[operation] += 1
+        time.sleep(args.latency)
+        if operation == 'GetCallerIdentity':
+            key = re.search(r'Credential=(\w+)/', request.headers.get('Authorization', b'').decode()).group(1)
+            account = key[4:16] if key[4:16] in accounts else accounts[0]
+            body = (f'<GetCallerIdentityResponse><GetCallerIdentityResult><UserId>AIDA{key[-4:]}</UserId>'
+                    f'<Account>{account}</Account><Arn>arn:aws:iam::{account}:user/key-{key[-4:]}</Arn>'
+                    f'</GetCallerIdentityResult></GetCallerIdentityResponse>').encode()
+            return AWSResponse(request.url, 200, {}, _StubBody(body))
+        if f'.{opt_in_region}.' in request.url:
+            body = (b'<Response><Errors><Error><Code>AuthFailure</Code><Message>AWS was not able to validate '
+                    b'the provided access credentials</Message></Error></Errors></Response>')
+            return AWSResponse(request.url, 401, {}, _StubBody(body))
+        status, body = generic_responder(service_id, operation, request)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        return AWSResponse(request.url, status, {}, _StubBody(body))
+
+    def limits():
+        return {'dead_regions': DeadRegionCache(ttl=0), 'exhaustive': True}
+
+    def per_row(path, journal):
+        for access_key, secret_key in rows:
+            enum_aws.process_credentials(access_key, secret_key, True, journal, limits())
+
+    def grouped(path, journal):
+        enum_aws.process_credential_file(path, True, journal, limits())
+
+    saved_env = dict(os.environ)
+    # The per-row path lists regions with the default credential chain
+    os.environ.update(AWS_DEFAULT_REGION='us-east-1', AWS_ACCESS_KEY_ID='AKIAFAKE', AWS_SECRET_ACCESS_KEY='fake')
+    handlers.BUILTIN_HANDLERS.append(('before-send', before_send))
+    print(f"accounts={len(accounts)}, keys={len(keys)}, rows={len(rows)}, regions={len(FIXTURE_REGIONS)} "
+          f"({opt_in_region} not enabled), {args.latency * 1000:.0f} ms/call, canary inference off")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'keys.csv')
+            with open(path, 'w') as f:
+                f.writelines(f"{access_key},{secret_key}\n" for access_key, secret_key in rows)
+            for label, run in (('one row at a time', per_row), ('grouped by account', grouped)):
+                calls.clear()
+                credential_cache._default_cache = None  # a fresh in-memory STS cache, as in a new process
+                journal = enum_aws.RunJournal('enum_aws', directory=tmp)
+                output = io.StringIO()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(output):
+                    run(path, journal)
+                elapsed = time.perf_counter() - start
+                journal.close()
+                summary = output.getvalue().strip().splitlines()[-1] if run is grouped else ''
+                print(f"{label:<19}: {sum(calls.values()):5d} calls ({calls['GetCallerIdentity']} identity, "
+                      f"{calls['DescribeRegions']} DescribeRegions), {elapsed:6.2f}s  {summary}")
+    finally:
+        handlers.BUILTIN_HANDLERS.remove(('before-send', before_send))
+        os.environ.clear()
+        os.environ.update(saved_env)
+
+def bench_progress(args):
+    """Per-call cost of the progress hooks on warm stubbed EC2 clients, and a reported enum_aws run"""
+    import contextlib
+    import io
+    import progress
+    from botocore import handlers
+    from botocore.awsrequest import AWSResponse
+    from enum_aws import check_service_permissions
+
+    # Two warm clients, one created before the hooks are installed and one after,
+    # called in alternating batches so drift in machine load hits both alike
+    plain = stub_pool(generic_responder).client('ec2', 'us-east-1')
+    tracker = progress.install(progress.RunProgress())
+    hooked = stub_pool(generic_responder).client('ec2', 'us-east-1')
+    progress.uninstall()
+    batch, rounds = 200, 15
+    best = {'no progress': None, 'progress hooks': None}
+    for _ in range(rounds):
+        for label, client in (('no progress', plain), ('progress hooks', hooked)):
+            start = time.perf_counter()
+            for _ in range(batch):
+                client.describe_regions()
+            per_call = (time.perf_counter() - start) / batch
+            best[label] = per_call if best[label] is None else min(best[label], per_call)
+    print(f"DescribeRegions on a warm client, best batch of {batch} over {rounds} rounds "
+          f"({tracker.calls} calls counted by the hooks)")
+    for label, per_call in best.items():
+        print(f"{label:<15}: {per_call * 1e6:7.1f} us/call  ({100 * (per_call / best['no progress'] - 1):+5.1f}%)")
+
+    def before_send(request, event_name, **kwargs):
+        _, service_id, operation = event_name.split('.')
+        status, body = generic_responder(service_id, operation, request)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        return AWSResponse(request.url, status, {}, _StubBody(body))
+
+    # The whole surface: enum_aws --all-regions with JSON progress lines every 0.5s
+    handlers.BUILTIN_HANDLERS.append(('before-send', before_send))
+    stderr = io.StringIO()
+    try:
+        reporter = progress.ProgressReporter(progress.install(progress.RunProgress()), 'json', 0.5)
+        with contextlib.redirect_stderr(stderr), reporter:
+            check_service_permissions('AKIAFAKE', 'fake', True, regions=FIXTURE_REGIONS)
+    finally:
+        handlers.BUILTIN_HANDLERS.remove(('before-send', before_send))
+        progress.uninstall()
+    lines = stderr.getvalue().splitlines()
+    print(f"enum_aws --all-regions ({len(FIXTURE_REGIONS)} regions): {len(lines)} progress lines, "
+          f"first: {lines[0]}")
+
+def eb_responder(apps_per_region, envs_per_app):
+    """Elastic Beanstalk fixture in query-protocol XML for every region"""
+    def wrap(operation, result):
+        return f'<{operation}Response><{operation}Result>{result}</{operation}Result></{operation}Response>'.encode()
+
+    def respond(service_id, operation, request):
+        body = request.body.decode() if isinstance(request.body, bytes) else request.body
+        if operation == 'DescribeApplications':
+            apps = ''.join(f'<member><ApplicationName>app-{i}</ApplicationName>'
+                           f'<DateCreated>2024-01-01T00:00:00Z</DateCreated></member>' for i in range(apps_per_region))
+            return 200, wrap(operation, f'<Applications>{apps}</Applications>')
+        if operation == 'DescribeEnvironments':
+            app = body.split('ApplicationName=')[1].split('&')[0]
+            envs = ''.join(f'<member><EnvironmentName>{app}-env-{i}</EnvironmentName><Status>Ready</Status>'
+                           f'<Health>Green</Health><CNAME>{app}-env-{i}.elasticbeanstalk.com</CNAME></member>'
+                           for i in range(envs_per_app))
+            return 200, wrap(operation, f'<Environments>{envs}</Environments>')
+        if operation == 'DescribeEnvironmentResources':
+            return 200, wrap(operation, '<EnvironmentResources><Instances><member><Id>i-1</Id></member>'
+                                        '</Instances></EnvironmentResources>')
+        if operation == 'DescribeConfigurationSettings':
+            return 200, wrap(operation, '<ConfigurationSettings><member><OptionSettings><member>'
+                                        '<Namespace>aws:autoscaling:launchconfiguration</Namespace>'
+                                        '<OptionName>InstanceType</OptionName><Value>t3.micro</Value></member>'
+                                        '</OptionSettings></member></ConfigurationSettings>')
+        return 400, b''
+    return respond
+
+def bench_resume(args):
+    """enum_elasticbean --all-regions interrupted at 90%, then resumed from its journal"""
+    import boto3
+    import contextlib
+    import io
+    from botocore import handlers
+    from botocore.awsrequest import AWSResponse
+    from botocore.exceptions import EndpointConnectionError
+    from enum_elasticbean import AWS_REGIONS, get_elasticbeanstalk_details
+    from journal import RunJournal
+
+    responder = eb_responder(3, 2)
+    fail_region = AWS_REGIONS[int(len(AWS_REGIONS) * 0.9)]
+    state = {'calls': 0, 'fail': True}
+
+    def before_send(request, event_name, **kwargs):
+        _, service_id, operation = event_name.split('.')
+        if state['fail'] and f'.{fail_region}.' in request.url:
+            raise EndpointConnectionError(endpoint_url=request.url)
+        state['calls'] += 1
+        time.sleep(args.latency)
+        status, body = responder(service_id, operation, request)
+        return AWSResponse(request.url, status, {}, _StubBody(body))
+
+    handlers.BUILTIN_HANDLERS.append(('before-send', before_send))
+    boto3.DEFAULT_SESSION = None
+    try:
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            journal = RunJournal('enum_elasticbean', directory=tmp)
+            start = time.perf_counter()
+            try:
+                get_elasticbeanstalk_details('AKIAFAKE', 'fake', AWS_REGIONS, journal)
+            except EndpointConnectionError:
+                pass
+            first_time = time.perf_counter() - start
+            journal.close()
+            first_calls, state['calls'], state['fail'] = state['calls'], 0, False
+
+            journal = RunJournal('enum_elasticbean', journal.run_id, directory=tmp)
+            start = time.perf_counter()
+            applications = get_elasticbeanstalk_details('AKIAFAKE', 'fake', AWS_REGIONS, journal)
+            resume_time = time.perf_counter() - start
+            journal.close()
+    finally:
+        handlers.BUILTIN_HANDLERS.remove(('before-send', before_send))
+        boto3.DEFAULT_SESSION = None
+    total = first_calls + state['calls']
+    print(f"regions={len(AWS_REGIONS)} apps/region=3 envs/app=2, network drops in {fail_region}")
+    print(f"interrupted run: {journal.reused} regions journaled, {first_calls} API calls, {first_time:.2f}s")
+    print(f"resume: {journal.executed} regions fetched, {state['calls']} API calls "
+          f"({state['calls'] / total:.0%} of the full run), {resume_time:.2f}s")
+    print(f"applications after resume: {sum(len(apps) for apps in applications.values())}")
+
+def bench_deadline(args):
+    """enum_ec2 and enum_aws --all-regions with one blackholed and one AuthFailure region"""
+    import boto3
+    import contextlib
+    import io
+    import socket
+    from botocore import handlers
+    from botocore.awsrequest import AWSResponse
+    from aws_clients import Deadline, DeadRegionCache
+    import enum_aws
+    import enum_ec2
+
+    # Accepts connections (via the listen backlog) and never answers
+    blackhole = socket.socket()
+    blackhole.bind(('127.0.0.1', 0))
+    blackhole.listen(64)
+    blackhole_url = 'http://127.0.0.1:%d/' % blackhole.getsockname()[1]
+    stalled, refused = 'ap-east-1', 'me-south-1'
+    auth_failure = (b'<Response><Errors><Error><Code>AuthFailure</Code><Message>AWS was not able to validate '
+                    b'the provided access credentials</Message></Error></Errors></Response>')
+    state = {'calls': 0, 'dead': 0}
+
+    def before_send(request, event_name, **kwargs):
+        _, service_id, operation = event_name.split('.')
+        state['calls'] += 1
+        if f'.{stalled}.' in request.url:
+            state['dead'] += 1
+            request.url = blackhole_url
+            return None  # let botocore send it and wait on the socket
+        time.sleep(args.latency)
+        if f'.{refused}.' in request.url:
+            state['dead'] += 1
+            return AWSResponse(request.url, 401, {}, _StubBody(auth_failure))
+        if operation == 'DescribeInstances':
+            return AWSResponse(request.url, 200, {}, _StubBody(ec2_instances_xml(['i-%08x' % i for i in range(5)])))
+        status, body = generic_responder(service_id, operation, request)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        return AWSResponse(request.url, status, {}, _StubBody(body))
+
+    saved_env = dict(os.environ)
+    os.environ.update(AWS_DEFAULT_REGION='us-east-1', AWS_ACCESS_KEY_ID='AKIAFAKE', AWS_SECRET_ACCESS_KEY='fake')
+    handlers.BUILTIN_HANDLERS.append(('before-send', before_send))
+    boto3.DEFAULT_SESSION = None
+    try:
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            cache_path = os.path.join(tmp, 'dead_regions.json')
+            runs = [
+                ('enum_ec2, default timeouts, --deadline 3', 'ec2', 3, 30),
+                ('enum_ec2, --read-timeout 1 --deadline 10', 'ec2', 10, 1),
+                ('enum_ec2, rerun with dead-region cache', 'ec2', 10, 1),
+                ('enum_aws, --read-timeout 1 --deadline 60', 'aws', 60, 1),
+                ('enum_aws, --read-timeout 1 --deadline 5', 'aws', 5, 1)
+            ]
+            results = []
+            for label, tool, deadline, read_timeout in runs:
+                if tool == 'aws' and os.path.exists(cache_path):
+                    os.remove(cache_path)
+                cache = DeadRegionCache(cache_path, ttl=3600)
+                state['calls'] = state['dead'] = 0
+                start = time.perf_counter()
+                if tool == 'ec2':
+                    instances, incomplete = enum_ec2.get_ec2_instances(
+                        'AKIAFAKE', 'fake', deadline=Deadline(deadline), dead_regions=cache,
+                        read_timeout=read_timeout, max_attempts=1)
+                    marked = f"{len(instances)} instances; incomplete: " + \
+                             ', '.join(f"{region} ({reason})" for region, reason in incomplete)
+                else:
+                    permissions = enum_aws.check_service_permissions(
+                        'AKIAFAKE', 'fake', True, deadline=Deadline(deadline), dead_regions=cache,
+                        read_timeout=read_timeout, max_attempts=1)
+                    skipped = sum(1 for actions in permissions.values() if actions[0].startswith('Skipped'))
+                    unfinished = sum(1 for actions in permissions.values() if actions[0].startswith('Incomplete'))
+                    marked = f"{len(permissions)} entries; {skipped} skipped as dead, {unfinished} incomplete (deadline)"
+                results.append((label, time.perf_counter() - start, state['calls'], state['dead'], marked))
+    finally:
+        handlers.BUILTIN_HANDLERS.remove(('before-send', before_send))
+        boto3.DEFAULT_SESSION = None
+        os.environ.clear()
+        os.environ.update(saved_env)
+        blackhole.close()
+    print(f"regions={len(FIXTURE_REGIONS)}, {stalled} blackholed, {refused} answers AuthFailure")
+    for label, elapsed, calls, dead, marked in results:
+        print(f"{label:<42}: {elapsed:5.2f}s, {calls:3d} API calls ({dead} to dead regions), {marked}")
+
+def org_responder(accounts, slow_account, slow_factor):
+    """Organizations, STS and EC2 fixture; the account is read from each request's access key"""
+    import re
+
+    def respond(service_id, operation, request):
+        key = re.search(r'Credential=(\w+)/', request.headers.get('Authorization', b'').decode()).group(1)
+        account = key[4:] if key.startswith('ASIA') else accounts[0]
+        time.sleep(0.0 if operation in ('ListAccounts', 'AssumeRole') else
+                   (slow_factor if account == slow_account else 1) * respond.latency)
+        if operation == 'ListAccounts':
+            return 200, {'Accounts': [{'Id': a, 'Name': f'account-{a}', 'Status': 'ACTIVE'} for a in accounts]}
+        if operation == 'AssumeRole':
+            body = request.body.decode() if isinstance(request.body, bytes) else request.body
+            member = body.split('%3A%3A')[1][:12]
+            return 200, (f'<AssumeRoleResponse><AssumeRoleResult><Credentials><AccessKeyId>ASIA{member}</AccessKeyId>'
+                         f'<SecretAccessKey>fake</SecretAccessKey><SessionToken>token</SessionToken>'
+                         f'<Expiration>2099-01-01T00:00:00Z</Expiration></Credentials></AssumeRoleResult>'
+                         f'</AssumeRoleResponse>').encode()
+        if operation == 'GetCallerIdentity':
+            return 200, (f'<GetCallerIdentityResponse><GetCallerIdentityResult><UserId>AIDAFAKE</UserId>'
+                         f'<Account>{account}</Account><Arn>arn:aws:iam::{account}:user/bench</Arn>'
+                         f'</GetCallerIdentityResult></GetCallerIdentityResponse>').encode()
+        if operation == 'DescribeInstances':
+            return 200, ec2_instances_xml([f'i-{account}{i}' for i in range(3)])
+        return generic_responder(service_id, operation, request)
+    respond.latency = 0.0
+    return respond
+
+def bench_org(args):
+    """org_audit across 24 stubbed accounts (one 3x slower), sequential vs concurrent"""
+    import boto3
+    import contextlib
+    import io
+    from botocore import handlers
+    from botocore.awsrequest import AWSResponse
+    from org_audit import audit_organization
+    from output_sink import JsonlSink
+
+    accounts = ['%012d' % (111111111111 + i) for i in range(24)]
+    responder = org_responder(accounts, accounts[5], 3)
+    responder.latency = args.latency
+
+    def before_send(request, event_name, **kwargs):
+        _, service_id, operation = event_name.split('.')
+        status, body = responder(service_id, operation, request)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        return AWSResponse(request.url, status, {}, _StubBody(body))
+
+    saved_env = dict(os.environ)
+    os.environ.update(AWS_DEFAULT_REGION='us-east-1')
+    handlers.BUILTIN_HANDLERS.append(('before-send', before_send))
+    boto3.DEFAULT_SESSION = None
+    results = []
+    try:
+        from aws_clients import ClientPool
+        for label, max_accounts in (('one account at a time', 1), ('--max-accounts 24', 24)):
+            pool = ClientPool(access_key='AKIAFAKE', secret_key='fake')
+            output = io.StringIO()
+            start, cpu = time.perf_counter(), time.process_time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                summaries = audit_organization(pool, JsonlSink(output), ['perms', 'ec2'], FIXTURE_REGIONS,
+                                               max_accounts=max_accounts, workers=8)
+            elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+            slowest = max(summary.get('Seconds', 0) for summary in summaries)
+            results.append((label, elapsed, cpu, slowest, len(output.getvalue().splitlines()), summaries))
+    finally:
+        handlers.BUILTIN_HANDLERS.remove(('before-send', before_send))
+        boto3.DEFAULT_SESSION = None
+        os.environ.clear()
+        os.environ.update(saved_env)
+    print(f"accounts={len(accounts)}, enumerators=perms,ec2, regions={len(FIXTURE_REGIONS)}, "
+          f"{args.latency * 1000:.0f} ms/call ({accounts[5]} at 3x)")
+    # boto3 client construction is CPU-bound, so the concurrent run cannot beat the process CPU time
+    for label, elapsed, cpu, slowest, lines, summaries in results:
+        failed = sum(1 for summary in summaries if summary['Status'] != 'ok')
+        print(f"{label:<22}: {elapsed:6.2f}s wall ({cpu:.2f}s CPU), slowest account {slowest:.2f}s, "
+              f"{lines} records, {failed} accounts not ok")
+
+def sts_responder(expires_in):
+    """GetCallerIdentity and AssumeRole answers; role credentials expire expires_in seconds from now"""
+    import datetime
+
+    def respond(service_id, operation, request):
+        if operation == 'AssumeRole':
+            expiration = (datetime.datetime.now(datetime.timezone.utc) +
+                          datetime.timedelta(seconds=expires_in)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            return 200, (f'<AssumeRoleResponse><AssumeRoleResult><Credentials><AccessKeyId>ASIAROLE</AccessKeyId>'
+                         f'<SecretAccessKey>fake</SecretAccessKey><SessionToken>token</SessionToken>'
+                         f'<Expiration>{expiration}</Expiration></Credentials></AssumeRoleResult>'
+                         f'</AssumeRoleResponse>').encode()
+        return generic_responder(service_id, operation, request)
+    return respond
+
+def bench_sts_cache(args):
+    """STS calls for 5 chained tool invocations, with and without the credential cache"""
+    from credential_cache import REFRESH_AHEAD, StsCache
+
+    invocations = 5
+    role_arn = 'arn:aws:iam::123456789012:role/audit'
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        for label, directory in (('no cache', None), ('disk cache', os.path.join(tmp, 'sts'))):
+            identity_calls = role_calls = 0
+            start = time.perf_counter()
+            for _ in range(invocations):
+                # A fresh cache object per invocation, as in a new process
+                cache = StsCache(directory)
+                pool = stub_pool(sts_responder(3600), args.latency)
+                cache.caller_identity(pool)
+                identity_calls += cache.sts_calls
+                cache.sts_calls = 0
+                cache.role_credentials(pool, role_arn, 'bench').get_frozen_credentials()
+                role_calls += cache.sts_calls
+                cache.close()
+            results.append((label, identity_calls, role_calls, time.perf_counter() - start, cache.fernet is not None))
+        modes = {os.stat(os.path.join(tmp, 'sts', name)).st_mode & 0o777 for name in os.listdir(os.path.join(tmp, 'sts'))}
+
+        # Role credentials expiring 2s after the background refresh point
+        cache = StsCache(os.path.join(tmp, 'refresh'))
+        pool = stub_pool(sts_responder(REFRESH_AHEAD + 2), args.latency)
+        credentials = cache.role_credentials(pool, role_arn, 'bench')
+        cache.sts_calls = 0
+        deadline = time.time() + 10
+        while cache.sts_calls == 0 and time.time() < deadline:
+            credentials.get_frozen_credentials()
+            time.sleep(0.1)
+        refreshed = cache.sts_calls
+        cache.close()
+
+    print(f"{invocations} chained invocations, each calling GetCallerIdentity and AssumeRole, "
+          f"{args.latency * 1000:.0f} ms/call")
+    for label, identity_calls, role_calls, elapsed, encrypted in results:
+        print(f"{label:<10}: {identity_calls} GetCallerIdentity + {role_calls} AssumeRole calls, {elapsed:.2f}s")
+    if not results[-1][4]:
+        print("cryptography is not installed: role credentials are cached in memory only, never written to disk")
+    print(f"cache file modes: {', '.join(oct(mode) for mode in sorted(modes))}")
+    print(f"background refresh: {refreshed} AssumeRole call(s) made off the calling thread before expiry")
+
+class _FirstWrite:
+    """Discard output, remembering when the first byte was written"""
+
+    def __init__(self):
+        self.first = None
+
+    def write(self, data):
+        if self.first is None and data.strip():
+            self.first = time.perf_counter()
+        return len(data)
+
+    def flush(self):
+        pass
+
+def bench_table_stream(args):
+    """Time to first row and peak memory of a full rich Table vs live_table.StreamingTable"""
+    import tracemalloc
+    from rich.console import Console
+    from rich.table import Table
+    from enum_ec2 import instance_columns, instance_row
+    from live_table import StreamingTable
+    from output_sink import JsonlSink
+    from records import Ec2Instance
+
+    records = [Ec2Instance.from_api(FIXTURE_REGIONS[i % len(FIXTURE_REGIONS)], instance)
+               for i, instance in enumerate(parsed_instances(args.instances))]
+
+    def full_table(console):
+        table = Table(title="AWS EC2 Instances Across All Regions")
+        for header, options in instance_columns():
+            table.add_column(header, **options)
+        for record in records:
+            table.add_row(*instance_row(record))
+        console.print(table)
+
+    def streaming(console):
+        with StreamingTable("AWS EC2 Instances Across All Regions", instance_columns(), max_rows=0,
+                            console=console) as table:
+            for record in records:
+                table.add_row(*instance_row(record))
+
+    def jsonl(console):
+        sink = JsonlSink(console.file)
+        for record in records:
+            sink.write(record)
+
+    print(f"instances={len(records)}, output discarded, 160 columns")
+    for label, render in (('rich Table', full_table), ('StreamingTable', streaming), ('JSONL', jsonl)):
+        output = _FirstWrite()
+        console = Console(file=output, width=160, force_terminal=False)
+        start = time.perf_counter()
+        render(console)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        render(Console(file=_FirstWrite(), width=160, force_terminal=False))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{label:<15}: first row after {output.first - start:6.3f}s, total {elapsed:6.2f}s, "
+              f"peak {peak / 2**20:7.1f} MiB")
+
+def bench_snapshot_diff(args):
+    """Diff two 100k-resource snapshots with a streaming merge vs loading both as JSON documents"""
+    import tracemalloc
+    from records import Ec2Instance, to_dict
+    from snapshot import Snapshot, SnapshotWriter, diff_snapshots
+
+    count = 100000
+    base = [Ec2Instance.from_api(FIXTURE_REGIONS[i % len(FIXTURE_REGIONS)], instance)
+            for i, instance in enumerate(parsed_instances(count))]
+    # Next day: 1% new public IPs, 0.5% terminated, 0.5% launched
+    changed = [record._replace(PublicIP=f'3.0.{i // 256 % 256}.{i % 256}') if i % 100 == 0 else record
+               for i, record in enumerate(base) if i % 200 != 1]
+    changed += [record._replace(InstanceId=record.InstanceId + '-new') for record in base[:count // 200]]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        start = time.perf_counter()
+        for name, records in (('old', base), ('new', changed)):
+            path = os.path.join(tmp, f'{name}.snap.gz')
+            with SnapshotWriter(path, 'enum_ec2', '123456789012') as writer:
+                writer.add_records(records)
+            paths.append(path)
+        written = (time.perf_counter() - start) / 2
+        documents = []
+        for name, records in (('old', base), ('new', changed)):
+            path = os.path.join(tmp, f'{name}.json')
+            with open(path, 'w') as f:
+                json.dump([to_dict(record) for record in records], f, default=str)
+            documents.append(path)
+        del base, changed
+
+        def streaming():
+            counts = {}
+            with Snapshot(paths[0]) as old, Snapshot(paths[1]) as new:
+                for change, uid, resource, fields in diff_snapshots(old, new):
+                    counts[change] = counts.get(change, 0) + 1
+            return counts
+
+        def whole_documents():
+            old, new = ({record['InstanceId']: record for record in json.load(open(path))} for path in documents)
+            return {'added': len(new.keys() - old.keys()), 'removed': len(old.keys() - new.keys()),
+                    'modified': sum(1 for key in old.keys() & new.keys() if old[key] != new[key])}
+
+        print(f"resources={count}, snapshot {os.path.getsize(paths[0]) / 2**20:.1f} MiB gzip "
+              f"(JSON document {os.path.getsize(documents[0]) / 2**20:.1f} MiB), written in {written:.2f}s")
+        for label, diff in (('snapshot merge', streaming), ('load both JSON', whole_documents)):
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                diff()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            tracemalloc.start()
+            counts = diff()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{label:<15}: {best:.3f}s, peak {peak / 2**20:6.1f} MiB, "
+                  f"{counts['added']} added, {counts['removed']} removed, {counts['modified']} modified")
+
+def artifactory_server(repositories=5000, builds=2000, storage_cost=0.5):
+    """Local stand-in for Artifactory; returns (server, stats) with bytes and requests served
+
+    Endpoints send an ETag or Last-Modified like a real instance, except
+    /api/build which sends no validators. /api/storageinfo sleeps
+    storage_cost seconds for every full response, like its server-side scan.
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    bodies = {
+        '/api/system/version': {'version': '7.77.3', 'revision': '77703900'},
+        '/api/repositories': [{'key': f'repo-{i}', 'type': 'LOCAL', 'packageType': 'maven',
+                               'url': f'https://artifactory.example.com/artifactory/repo-{i}'}
+                              for i in range(repositories)],
+        '/api/storageinfo': {'binariesSummary': {'binariesCount': '1,204,551'},
+                             'repositoriesSummaryList': [{'repoKey': f'repo-{i}', 'usedSpace': f'{i} GB',
+                                                          'filesCount': i * 10} for i in range(repositories)]},
+        '/api/security/users': [{'name': f'user-{i}', 'realm': 'internal'} for i in range(500)],
+        '/api/security/groups': [{'name': f'group-{i}'} for i in range(100)],
+        '/api/security/permissions': [{'name': f'permission-{i}'} for i in range(300)],
+        '/api/build': {'builds': [{'uri': f'/build-{i}', 'lastStarted': '2024-01-01T00:00:00.000Z'}
+                                  for i in range(builds)]},
+        '/api/search/aql': {'results': [{'repo': 'repo-0', 'path': 'a', 'name': 'b.jar'}]}
+    }
+    bodies = {path: json.dumps(body).encode('utf-8') for path, body in bodies.items()}
+    last_modified = 'Mon, 01 Jan 2024 00:00:00 GMT'
+    stats = {'bytes': 0, 'requests': 0, 'not_modified': 0, 'storage_scans': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def respond(self):
+            path = self.path.split('/artifactory', 1)[-1]
+            body = bodies.get(path)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            if self.command == 'POST':
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            validators = {}
+            if path == '/api/storageinfo':
+                validators['Last-Modified'] = last_modified
+            elif path != '/api/build':
+                validators['ETag'] = etag
+            not_modified = (('ETag' in validators and self.headers.get('If-None-Match') == etag) or
+                            ('Last-Modified' in validators and self.headers.get('If-Modified-Since') == last_modified))
+            with lock:
+                stats['requests'] += 1
+                if not_modified:
+                    stats['not_modified'] += 1
+                else:
+                    stats['bytes'] += len(body)
+                    if path == '/api/storageinfo':
+                        stats['storage_scans'] += 1
+            if not_modified:
+                self.send_response(304)
+                for name, value in validators.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+            if path == '/api/storageinfo':
+                time.sleep(storage_cost)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in validators.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = respond
+        do_POST = respond
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+def bench_http_cache(args):
+    """Bytes and time of enum_artifactory runs against a local server, without and with the HTTP cache"""
+    import contextlib
+    from enum_artifactory import probe_artifactory_endpoints
+    from http_cache import HttpCache
+
+    server, stats = artifactory_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/artifactory"
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [('no cache', None, False), ('cold cache', HttpCache(tmp), False),
+                ('warm cache', HttpCache(tmp), False), ('warm, --refresh', HttpCache(tmp), True)]
+        print(f"{'run':<16} {'requests':>8} {'304s':>5} {'KiB sent':>9} {'storage scans':>14} {'seconds':>8}")
+        for label, cache, refresh in runs:
+            before = dict(stats)
+            start = time.perf_counter()
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                probe_artifactory_endpoints(url, 'admin', 'token', cache, refresh)
+            elapsed = time.perf_counter() - start
+            delta = {key: stats[key] - before[key] for key in stats}
+            print(f"{label:<16} {delta['requests']:>8} {delta['not_modified']:>5} {delta['bytes'] / 1024:>9.1f} "
+                  f"{delta['storage_scans']:>14} {elapsed:>8.2f}")
+        modes = {oct(os.stat(os.path.join(tmp, name)).st_mode & 0o777) for name in os.listdir(tmp)}
+    server.shutdown()
+    print(f"cache file modes: {', '.join(sorted(modes))}")
+
+def full_instance(instance):
+    """A fixture instance with the rest of what DescribeInstances returns for a typical VPC instance"""
+    i = int(instance['InstanceId'][2:], 16)
+    interface = {
+        'Association': {'IpOwnerId': 'amazon', 'PublicDnsName': f'ec2-{i}.compute-1.amazonaws.com',
+                        'PublicIp': instance.get('PublicIpAddress')},
+        'Attachment': {'AttachTime': '2024-01-01T00:00:00+00:00', 'AttachmentId': f'eni-attach-{i:08x}',
+                       'DeleteOnTermination': True, 'DeviceIndex': 0, 'Status': 'attached', 'NetworkCardIndex': 0},
+        'Description': '', 'Groups': instance['SecurityGroups'], 'Ipv6Addresses': [],
+        'MacAddress': f'0e:{i & 255:02x}:{(i >> 8) & 255:02x}:00:00:01', 'NetworkInterfaceId': f'eni-{i:08x}',
+        'OwnerId': '123456789012', 'PrivateDnsName': f'ip-{i}.ec2.internal',
+        'PrivateIpAddress': instance['PrivateIpAddress'],
+        'PrivateIpAddresses': [{'Primary': True, 'PrivateDnsName': f'ip-{i}.ec2.internal',
+                                'PrivateIpAddress': instance['PrivateIpAddress']}],
+        'SourceDestCheck': True, 'Status': 'in-use', 'SubnetId': instance['SubnetId'], 'VpcId': instance['VpcId'],
+        'InterfaceType': 'interface'
+    }
+    instance = dict(instance)
+    instance['BlockDeviceMappings'] = [dict(mapping, Ebs=dict(mapping['Ebs'], AttachTime='2024-01-01T00:00:00+00:00',
+                                                              DeleteOnTermination=True, Status='attached'))
+                                       for mapping in instance['BlockDeviceMappings']]
+    instance.update({
+        'AmiLaunchIndex': 0, 'LaunchTime': '2024-01-01T00:00:00+00:00', 'KeyName': 'deploy',
+        'Monitoring': {'State': 'disabled'}, 'Placement': {'AvailabilityZone': 'us-east-1a', 'GroupName': '',
+                                                           'Tenancy': 'default'},
+        'PrivateDnsName': f'ip-{i}.ec2.internal', 'ProductCodes': [],
+        'PublicDnsName': f'ec2-{i}.compute-1.amazonaws.com', 'StateTransitionReason': '',
+        'Architecture': 'x86_64', 'ClientToken': f'token-{i:016x}', 'EbsOptimized': False, 'EnaSupport': True,
+        'Hypervisor': 'xen', 'NetworkInterfaces': [interface], 'RootDeviceName': '/dev/xvda',
+        'RootDeviceType': 'ebs', 'SourceDestCheck': True, 'VirtualizationType': 'hvm',
+        'CpuOptions': {'CoreCount': 1, 'ThreadsPerCore': 2},
+        'CapacityReservationSpecification': {'CapacityReservationPreference': 'open'},
+        'HibernationOptions': {'Configured': False}, 'EnclaveOptions': {'Enabled': False},
+        'PlatformDetails': 'Linux/UNIX', 'UsageOperation': 'RunInstances',
+        'UsageOperationUpdateTime': '2024-01-01T00:00:00+00:00',
+        'PrivateDnsNameOptions': {'HostnameType': 'ip-name', 'EnableResourceNameDnsARecord': False,
+                                  'EnableResourceNameDnsAAAARecord': False},
+        'MaintenanceOptions': {'AutoRecovery': 'default'}, 'CurrentInstanceBootMode': 'legacy-bios'
+    })
+    instance['MetadataOptions'] = dict(instance['MetadataOptions'], State='applied', HttpPutResponseHopLimit=2,
+                                       HttpProtocolIpv6='disabled', InstanceMetadataTags='disabled')
+    return instance
+
+class ParsingEC2(FakeEC2):
+    """FakeEC2 whose pages are parsed afresh on every call, as botocore hands them over"""
+
+    def paginate(self, **kwargs):
+        for page in super().paginate(**kwargs):
+            yield json.loads(json.dumps(page))
+
+class _Unprojected:
+    """Stands in for a FieldSpec and keeps items whole, as enum_ec2 did before projection.py"""
+
+    @staticmethod
+    def project(item):
+        return item
+
+def bench_projection(args):
+    """Peak memory of an enum_ec2 --detailed describe_instances sweep with and without field projection"""
+    import gc
+    import tracemalloc
+    import enum_ec2
+
+    data = ec2_fixture(args.instances, groups=300, amis=40)
+    for reservation in data['Reservations']:
+        reservation['Instances'] = [full_instance(instance) for instance in reservation['Instances']]
+    reservation_bytes = len(json.dumps(data['Reservations'][0]))
+
+    class Pool:
+        def client(self, service, region=None):
+            return ParsingEC2(data)
+
+    def sweep():
+        enum_ec2.AMI_CACHE.clear()
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        instances, calls = enum_ec2.get_region_instances(Pool(), 'us-east-1', detailed=True)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return len(instances), peak, elapsed
+
+    projected = (enum_ec2.DETAIL_FIELDS, enum_ec2.GROUP_FIELDS, enum_ec2.VOLUME_FIELDS)
+    enum_ec2.DETAIL_FIELDS = enum_ec2.GROUP_FIELDS = enum_ec2.VOLUME_FIELDS = _Unprojected()
+    try:
+        count, whole_peak, whole_time = sweep()
+    finally:
+        enum_ec2.DETAIL_FIELDS, enum_ec2.GROUP_FIELDS, enum_ec2.VOLUME_FIELDS = projected
+    count, projected_peak, projected_time = sweep()
+
+    # What each instance costs while it waits for enrichment
+    sample = json.dumps([reservation['Instances'][0] for reservation in data['Reservations'][:1000]])
+    tracemalloc.start()
+    parsed = json.loads(sample)
+    whole_bytes = tracemalloc.get_traced_memory()[0]
+    kept = [enum_ec2.DETAIL_FIELDS.project(instance) for instance in parsed]
+    kept_bytes = tracemalloc.get_traced_memory()[0] - whole_bytes
+    tracemalloc.stop()
+    del parsed, kept
+
+    print(f"instances={count} (~{reservation_bytes / 1024:.1f} KiB JSON each), 1000 per page, timings under tracemalloc")
+    print(f"held per instance until enrichment: {whole_bytes / 1000 / 1024:.1f} KiB whole, "
+          f"{kept_bytes / 1000 / 1024:.1f} KiB projected")
+    print(f"whole responses kept  peak {whole_peak / 2**20:7.1f} MiB  {whole_time:6.2f}s")
+    print(f"projected per page    peak {projected_peak / 2**20:7.1f} MiB  {projected_time:6.2f}s  "
+          f"({whole_peak / projected_peak:.1f}x less)")
+
+def exposure_fixture(instances, rules, rules_per_group=10, seed=7):
+    """One region: security groups with CIDR and group-reference rules, and instances in 1-3 groups each"""
+    import random
+    rng = random.Random(seed)
+    group_count = rules // rules_per_group
+    group_ids = [f'sg-{g:08x}' for g in range(group_count)]
+    common_ports = [22, 80, 443, 3306, 5432, 6379, 8080, 9200]
+    groups = []
+    for g, group_id in enumerate(group_ids):
+        permissions = []
+        for r in range(rules_per_group):
+            port = rng.choice(common_ports) if r % 3 else rng.randrange(1024, 65535)
+            permission = {'IpProtocol': 'tcp', 'FromPort': port, 'ToPort': port + (r % 4) * 10,
+                          'IpRanges': [], 'Ipv6Ranges': [], 'UserIdGroupPairs': []}
+            kind = rng.random()
+            if kind < 0.02:
+                permission['IpRanges'].append({'CidrIp': '0.0.0.0/0'})
+            elif kind < 0.03:
+                permission['Ipv6Ranges'].append({'CidrIpv6': '::/0'})
+            elif kind < 0.25:
+                permission['UserIdGroupPairs'].append({'GroupId': rng.choice(group_ids)})
+            elif kind < 0.4:
+                permission['IpRanges'].append({'CidrIp': f'{rng.randrange(1, 223)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}/32'})
+            else:
+                permission['IpRanges'].append({'CidrIp': f'10.{rng.randrange(256)}.{rng.randrange(256)}.0/{rng.choice([16, 20, 24])}'})
+            if kind > 0.995:
+                permission['IpProtocol'] = '-1'
+            permissions.append(permission)
+        groups.append({'GroupId': group_id, 'GroupName': f'group-{g}', 'IpPermissions': permissions})
+    fleet = []
+    for i in range(instances):
+        members = [{'GroupId': rng.choice(group_ids)} for _ in range(1 + i % 3)]
+        fleet.append({
+            'InstanceId': f'i-{i:08x}',
+            'PrivateIpAddress': f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}',
+            'PublicIpAddress': f'54.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}' if i % 3 == 0 else None,
+            'SecurityGroups': members,
+            'NetworkInterfaces': [{'Groups': members, 'Ipv6Addresses': [{'Ipv6Address': f'2600:1f18::{i:x}'}]
+                                   if i % 5 == 0 else []}],
+            'Tags': [{'Key': 'Name', 'Value': f'host-{i}'}]
+        })
+    return fleet, groups
+
+def naive_exposure(instances, groups, source_text):
+    """Direct exposure by joining every instance against every rule, as a reference for exposure.py"""
+    import ipaddress
+    from exposure import instance_groups, merge_ports, port_range, reachable_address
+    source = ipaddress.ip_network(source_text)
+    rules = []
+    for group in groups:
+        for permission in group['IpPermissions']:
+            for cidr in [r['CidrIp'] for r in permission['IpRanges']] + [r['CidrIpv6'] for r in permission['Ipv6Ranges']]:
+                rules.append((group['GroupId'], ipaddress.ip_network(cidr, strict=False), port_range(permission)))
+    exposed = {}
+    for instance in instances:
+        member_of = set(instance_groups(instance))
+        ranges = [ports for group_id, network, ports in rules
+                  if group_id in member_of and network.version == source.version and source.subnet_of(network)]
+        if ranges and reachable_address(instance, source):
+            exposed[instance['InstanceId']] = merge_ports(ranges)
+    return exposed
+
+def bench_exposure(args):
+    """exposure.py on one region with --instances instances and 5x as many rules, vs a naive instance x rule join"""
+    from exposure import analyze_region, format_ports
+
+    instances, groups = exposure_fixture(args.instances, args.instances * 5)
+    start = time.perf_counter()
+    findings, rules = analyze_region('us-east-1', instances, groups)
+    indexed_time = time.perf_counter() - start
+    direct = sum(1 for finding in findings if finding['Exposure'] == 'direct')
+    lateral = len(findings) - direct
+    deepest = max((finding['Hops'] for finding in findings), default=0)
+
+    sample = instances[:max(1, len(instances) // 50)]
+    start = time.perf_counter()
+    naive = naive_exposure(sample, groups, '0.0.0.0/0')
+    naive_time = (time.perf_counter() - start) * len(instances) / len(sample)
+    sampled = {instance['InstanceId'] for instance in sample}
+    indexed = {finding['InstanceId']: finding['Ports'] for finding in findings
+               if finding['Source'] == '0.0.0.0/0' and finding['Exposure'] == 'direct' and finding['InstanceId'] in sampled}
+    agree = indexed == {instance_id: format_ports(ranges) for instance_id, ranges in naive.items()}
+
+    print(f"instances={len(instances)} groups={len(groups)} rules={rules}")
+    print(f"indexed   {indexed_time:8.2f}s  0.0.0.0/0 and ::/0, {direct} direct and {lateral} lateral "
+          f"exposures (up to {deepest} hops)")
+    print(f"naive     {naive_time:8.2f}s  0.0.0.0/0 direct only, extrapolated from {len(sample)} instances")
+    print(f"direct results on the sample match: {agree}")
+
+def ebs_responder(snapshots, volumes, public_every=5000):
+    """EC2 fixture for enum_ebs: instances, volumes (half of them attached) and paginated snapshots"""
+    from urllib.parse import parse_qs
+    namespace = 'xmlns="http://ec2.amazonaws.com/doc/2016-11-15/"'
+
+    def respond(service_id, operation, request):
+        query = parse_qs(request.body.decode('utf-8') if isinstance(request.body, bytes) else request.body)
+        if operation == 'DescribeInstances':
+            return 200, ec2_instances_xml([f'i-{i:08x}' for i in range(volumes // 2)])
+        if operation == 'DescribeVolumes':
+            items = ''.join(
+                f"<item><volumeId>vol-{v:08x}</volumeId><size>{8 + v % 500}</size><volumeType>{'gp3' if v % 4 else 'io2'}"
+                f"</volumeType><status>{'in-use' if v % 2 == 0 else 'available'}</status><encrypted>"
+                f"{'true' if v % 3 else 'false'}</encrypted><availabilityZone>us-east-1a</availabilityZone>"
+                + (f"<attachmentSet><item><instanceId>i-{v // 2:08x}</instanceId></item></attachmentSet>" if v % 2 == 0 else '')
+                + "</item>" for v in range(volumes))
+            return 200, f'<DescribeVolumesResponse {namespace}><volumeSet>{items}</volumeSet></DescribeVolumesResponse>'.encode()
+        if operation == 'DescribeSnapshots':
+            if 'RestorableBy.1' in query:
+                ids = range(0, snapshots, public_every)
+                start, end = 0, 0
+            else:
+                start = int(query.get('NextToken', ['0'])[0])
+                end = min(snapshots, start + int(query.get('MaxResults', ['1000'])[0]))
+                ids = range(start, end)
+            items = ''.join(
+                f"<item><snapshotId>snap-{s:08x}</snapshotId><volumeId>vol-{(s * 7) % (volumes * 2):08x}</volumeId>"
+                f"<status>completed</status><startTime>2024-01-01T00:00:00.000Z</startTime><volumeSize>{8 + s % 500}"
+                f"</volumeSize><ownerId>123456789012</ownerId><description>Created by CreateImage(i-{s:08x}) for "
+                f"ami-{s:08x}</description><encrypted>{'true' if s % 10 else 'false'}</encrypted>"
+                f"<storageTier>standard</storageTier></item>" for s in ids)
+            token = f'<nextToken>{end}</nextToken>' if end and end < snapshots else ''
+            return 200, f'<DescribeSnapshotsResponse {namespace}><snapshotSet>{items}</snapshotSet>{token}</DescribeSnapshotsResponse>'.encode()
+        if operation == 'DescribeSnapshotAttribute':
+            snapshot = int(query['SnapshotId'][0][5:], 16)
+            shared = '<item><userId>210987654321</userId></item>' if snapshot % 1000 == 1 else ''
+            return 200, (f'<DescribeSnapshotAttributeResponse {namespace}><snapshotId>{query["SnapshotId"][0]}</snapshotId>'
+                         f'<createVolumePermission>{shared}</createVolumePermission></DescribeSnapshotAttributeResponse>').encode()
+        return 400, b''
+    return respond
+
+def bench_ebs(args):
+    """Peak memory of enum_ebs on one region as snapshots grow, streamed to JSONL vs collected in a list"""
+    import gc
+    import tracemalloc
+    from enum_ebs import collect_region
+    from output_sink import JsonlSink
+
+    def run(snapshots, emit):
+        pool = stub_pool(ebs_responder(snapshots, volumes=2000))
+        pool.client('ec2', 'us-east-1')  # client creation is not what is measured
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        totals = collect_region(pool, 'us-east-1', emit)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return totals, peak, elapsed
+
+    print(f"volumes=2000, snapshots paged 1000 at a time, timings under tracemalloc")
+    with open(os.devnull, 'w') as devnull:
+        sink = JsonlSink(devnull)
+        for snapshots in (args.snapshots // 10, args.snapshots):
+            totals, peak, elapsed = run(snapshots, sink.write)
+            size = sum(size for (kind, *_), (_, size) in totals.groups.items() if kind == 'snapshot')
+            print(f"streamed   snapshots={snapshots:7d}  peak {peak / 2**20:7.1f} MiB  {elapsed:6.2f}s  "
+                  f"{size} GiB, flags: {dict(totals.flags)}")
+    collected = []
+    _, peak, elapsed = run(args.snapshots, collected.append)
+    print(f"collected  snapshots={args.snapshots:7d}  peak {peak / 2**20:7.1f} MiB  {elapsed:6.2f}s  (all records kept)")
+
+def bench_shard(args):
+    """org_audit over a replayed 48-account workload, in one process vs sharded across worker processes"""
+    import boto3
+    import contextlib
+    import io
+    from botocore import handlers
+    from botocore.awsrequest import AWSResponse
+    import cassette
+    from aws_clients import ClientPool
+    from org_audit import audit_organization
+    from output_sink import JsonlSink
+
+    accounts = ['%012d' % (111111111111 + i) for i in range(48)]
+    responder = org_responder(accounts, accounts[5], 1)
+
+    def before_send(request, event_name, **kwargs):
+        _, service_id, operation = event_name.split('.')
+        status, body = responder(service_id, operation, request)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        return AWSResponse(request.url, status, {}, _StubBody(body))
+
+    def audit(processes):
+        pool = ClientPool(access_key='AKIAFAKE', secret_key='fake')
+        output = io.StringIO()
+        start, cpu, workers_cpu = time.perf_counter(), time.process_time(), os.times()
+        with contextlib.redirect_stdout(io.StringIO()):
+            summaries = audit_organization(pool, JsonlSink(output), ['perms', 'ec2'], FIXTURE_REGIONS,
+                                           max_accounts=4, workers=8, processes=processes)
+        workers_cpu = [after - before for before, after in zip(workers_cpu, os.times())]
+        failed = sum(1 for summary in summaries if summary['Status'] != 'ok')
+        return (time.perf_counter() - start, time.process_time() - cpu, workers_cpu[2] + workers_cpu[3],
+                len(output.getvalue().splitlines()), failed)
+
+    saved_env = dict(os.environ)
+    # Spawned workers inherit the environment, not the parent's botocore handlers
+    os.environ.update(AWS_DEFAULT_REGION='us-east-1')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'org.cassette.gz')
+        handlers.BUILTIN_HANDLERS.append(('before-send', before_send))
+        boto3.DEFAULT_SESSION = None
+        try:
+            recorder = cassette.install(path, 'record')
+            audit(1)
+            recorder.save()
+        finally:
+            handlers.BUILTIN_HANDLERS.remove(('before-send', before_send))
+            cassette.uninstall()
+
+        cores = os.cpu_count() or 1
+        print(f"accounts={len(accounts)}, enumerators=perms,ec2, regions={len(FIXTURE_REGIONS)}, replayed, "
+              f"{cores} CPU core(s)")
+        baseline = None
+        try:
+            cassette.install(path, 'replay')
+            for processes in sorted({1, 2, 4, cores}):
+                elapsed, cpu, workers_cpu, lines, failed = audit(processes)
+                baseline = baseline or elapsed
+                label = 'in process' if processes == 1 else f"--processes {processes}"
+                print(f"{label:<14}: {elapsed:6.2f}s wall ({cpu:.2f}s parent CPU, {workers_cpu:.2f}s worker CPU), "
+                      f"{baseline / elapsed:4.2f}x, {lines} records, {failed} accounts not ok")
+        finally:
+            cassette.uninstall()
+            boto3.DEFAULT_SESSION = None
+            os.environ.clear()
+            os.environ.update(saved_env)
+    if cores < 4:
+        print(f"Only {cores} core(s) here: sharding cannot beat one process on this machine")
+
+def paged_responder(per_region, page_size=100):
+    """DynamoDB, SNS, SQS and KMS fixture: per_region tables, topics, queues and keys, page_size per page
+
+    Each service pages with its own tokens (LastEvaluatedTableName,
+    NextToken, NextMarker) so the collector's model-derived paging is what
+    is exercised. Pages served are counted per operation in .pages.
+    """
+    import threading
+    from urllib.parse import parse_qs
+    pages = {}
+    lock = threading.Lock()
+
+    def respond(service_id, operation, request):
+        region = request.url.split('.')[1]
+        with lock:
+            pages[operation] = pages.get(operation, 0) + 1
+        if operation == 'ListTopics':
+            token = parse_qs(request.body.decode() if isinstance(request.body, bytes) else request.body or '')
+            start = int(token.get('NextToken', ['0'])[0])
+        else:
+            params = json.loads(request.body or b'{}')
+            marker = params.get('ExclusiveStartTableName') or params.get('NextToken') or params.get('Marker')
+            start = int(marker.rsplit('-', 1)[1]) + (operation == 'ListTables') if marker else 0
+        end = min(start + page_size, per_region)
+        more = end < per_region
+        if operation == 'ListTables':
+            body = {'TableNames': [f'table-{i}' for i in range(start, end)]}
+            if more:
+                body['LastEvaluatedTableName'] = f'table-{end - 1}'
+            return 200, body
+        if operation == 'ListQueues':
+            body = {'QueueUrls': [f'https://sqs.{region}.amazonaws.com/123456789012/queue-{i}' for i in range(start, end)]}
+            if more:
+                body['NextToken'] = f'token-{end}'
+            return 200, body
+        if operation == 'ListKeys':
+            body = {'Keys': [{'KeyId': f'key-{i}', 'KeyArn': f'arn:aws:kms:{region}:123456789012:key/key-{i}'}
+                             for i in range(start, end)], 'Truncated': more}
+            if more:
+                body['NextMarker'] = f'marker-{end}'
+            return 200, body
+        if operation == 'ListTopics':
+            members = ''.join(f'<member><TopicArn>arn:aws:sns:{region}:123456789012:topic-{i}</TopicArn></member>'
+                              for i in range(start, end))
+            token = f'<NextToken>{end}</NextToken>' if more else ''
+            return 200, (f'<ListTopicsResponse><ListTopicsResult><Topics>{members}</Topics>{token}'
+                         f'</ListTopicsResult></ListTopicsResponse>').encode()
+        return 400, {'__type': 'UnknownOperationException', 'message': operation}
+    respond.pages = pages
+    return respond
+
+def bench_collector(args):
+    """collector.py on four inventories added as one COLLECTIONS entry each, one region at a time vs concurrently"""
+    import collector
+    from output_sink import JsonlSink
+
+    types = ['dynamodb:table', 'sns:topic', 'sqs:queue', 'kms:key']
+    per_region = args.resources // 4
+    expected = per_region * len(types) * len(FIXTURE_REGIONS)
+    print(f"regions={len(FIXTURE_REGIONS)} types={','.join(types)} items/type/region={per_region} page size=100 "
+          f"latency={args.latency * 1000:.0f}ms")
+    for label, workers in (('one at a time', 1), ('concurrent', 32)):
+        responder = paged_responder(per_region)
+        pool = stub_pool(responder, args.latency)
+        collectors = collector.build_collectors(pool, {t: collector.COLLECTIONS[t] for t in types}, FIXTURE_REGIONS[0])
+        with open(os.devnull, 'w') as devnull:
+            start = time.perf_counter()
+            total, counts = collector.run_collectors(pool, collectors, FIXTURE_REGIONS, JsonlSink(devnull), workers)
+            elapsed = time.perf_counter() - start
+        print(f"{label:<14} workers={workers:2d}  {elapsed:7.2f}s  {total} records ({expected} expected) "
+              f"in {sum(responder.pages.values())} pages: {counts}")
+
+SCENARIOS = {
+    'importtime': bench_importtime,
+    'k8s': bench_k8s,
+    'ec2-detailed': bench_ec2_detailed,
+    'records-memory': bench_records_memory,
+    'inventory': bench_inventory,
+    'wide': bench_wide,
+    'config': bench_config,
+    'replay': bench_replay,
+    'resume': bench_resume,
+    'deadline': bench_deadline,
+    'org': bench_org,
+    'sts-cache': bench_sts_cache,
+    'table-stream': bench_table_stream,
+    'snapshot-diff': bench_snapshot_diff,
+    'http-cache': bench_http_cache,
+    'budget': bench_budget,
+    'projection': bench_projection,
+    'exposure': bench_exposure,
+    'ebs': bench_ebs,
+    'shard': bench_shard,
+    'inference': bench_inference,
+    'file-keys': bench_file_keys,
+    'progress': bench_progress,
+    'collector': bench_collector
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks for the enumeration tools (no AWS access needed)')
+    parser.add_argument('scenario', choices=list(SCENARIOS) + ['all'], help='Benchmark to run')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions per measurement (best is reported)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated API round trip in seconds for stubbed scenarios')
+    parser.add_argument('--clusters', type=int, default=3, help='EKS clusters per region (k8s)')
+    parser.add_argument('--secrets', type=int, default=250, help='Secrets per region (k8s)')
+    parser.add_argument('--instances', type=int, default=10000, help='EC2 instances in the synthetic region')
+    parser.add_argument('--resources', type=int, default=1200, help='Resources per region (wide, config)')
+    parser.add_argument('--snapshots', type=int, default=100000, help='EBS snapshots in the synthetic region (ebs)')
+    args = parser.parse_args(argv)
+    # Keep the tools' STS cache out of the user's home; sts-cache uses its own directories
+    os.environ.setdefault('AWSENUM_STS_CACHE', 'off')
+
+    for name, func in SCENARIOS.items():
+        if args.scenario in (name, 'all'):
+            print(f"== {name}: {func.__doc__}")
+            func(args)
+            print()
+
+if __name__ == "__main__":
+    main()
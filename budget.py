@@ -0,0 +1,139 @@
+import threading
+from collections import Counter
+
+# A call budget caps the AWS API calls a run may make, in total and per
+# service. It hooks every botocore session created after install(), like
+# cassette.py: each call reserves one unit in before-call, and a call the
+# budget cannot cover raises BudgetExceeded before anything is signed or
+# sent. Tools catch it and report what they skipped, so a run that hits
+# the cap still ends with partial results. Retries of a call are not
+# counted separately; --max-attempts bounds them.
+
+ACTIVE = None
+
+class BudgetExceeded(Exception):
+    """Raised in place of an API call the budget cannot cover"""
+
+class CallBudget:
+    """Counts API calls per (service, operation) and refuses them beyond the caps
+
+    max_calls None means no overall cap; service_caps maps a botocore
+    service name (ec2, iam, ...) to its own cap.
+    """
+
+    def __init__(self, max_calls=None, service_caps=None):
+        self.max_calls = max_calls
+        self.service_caps = service_caps or {}
+        self.calls = Counter()
+        self.services = Counter()
+        self.skipped = Counter()
+        self.used = 0
+        self.planned = 0
+        self._lock = threading.Lock()
+
+    def remaining(self, service=None):
+        """Calls still allowed overall, or for service; None when uncapped"""
+        limits = []
+        if self.max_calls is not None:
+            limits.append(self.max_calls - self.used)
+        if service in self.service_caps:
+            limits.append(self.service_caps[service] - self.services[service])
+        return max(0, min(limits)) if limits else None
+
+    def reserve(self, service, operation):
+        """Count a call if the budget covers it; False (and counted as skipped) if not"""
+        with self._lock:
+            if self.remaining(service) == 0:
+                self.skipped[(service, operation)] += 1
+                return False
+            self.used += 1
+            self.services[service] += 1
+            self.calls[(service, operation)] += 1
+            return True
+
+    def plan(self, count):
+        """Record calls a tool expects to make, for the report"""
+        with self._lock:
+            self.planned += count
+
+    def skip(self, service, operation, count=1):
+        """Record calls a tool chose not to make because of the budget"""
+        with self._lock:
+            self.skipped[(service, operation)] += count
+
+    @property
+    def exhausted(self):
+        return bool(self.skipped)
+
+    def _before_call(self, model, **kwargs):
+        service = model.service_model.service_name
+        if not self.reserve(service, model.name):
+            raise BudgetExceeded(f"Call budget exhausted, skipping {service}:{model.name}")
+
+    def handlers(self):
+        return [('before-call', self._before_call)]
+
+def install(budget):
+    """Enforce budget on every botocore session created from now on"""
+    from botocore import handlers
+    global ACTIVE
+    ACTIVE = budget
+    handlers.BUILTIN_HANDLERS.extend(budget.handlers())
+    return budget
+
+def uninstall():
+    from botocore import handlers
+    global ACTIVE
+    if ACTIVE is None:
+        return
+    for handler in ACTIVE.handlers():
+        if handler in handlers.BUILTIN_HANDLERS:
+            handlers.BUILTIN_HANDLERS.remove(handler)
+    ACTIVE = None
+
+def parse_service_caps(values):
+    caps = {}
+    for value in values or []:
+        service, sep, limit = value.partition('=')
+        if not sep or not limit.isdigit():
+            raise ValueError(f"Invalid --service-cap {value!r}, expected SERVICE=N")
+        caps[service] = int(limit)
+    return caps
+
+def add_budget_arguments(parser):
+    parser.add_argument('--max-calls', type=int, help='Stop making AWS API calls after this many; results stay partial')
+    parser.add_argument('--service-cap', action='append', metavar='SERVICE=N',
+                        help='Cap the API calls to one service, e.g. ec2=50 (repeatable)')
+
+def budget_from_args(parser, args):
+    """Install the budget given on the command line, or return None"""
+    if args.max_calls is None and not args.service_cap:
+        return None
+    try:
+        return install(CallBudget(args.max_calls, parse_service_caps(args.service_cap)))
+    except ValueError as e:
+        parser.error(str(e))
+
+def display_budget(budget, console=None):
+    """Calls made per (service, operation) and calls skipped, on stderr"""
+    from rich.console import Console
+    from rich.table import Table
+    console = console or Console(stderr=True)
+
+    limit = budget.max_calls if budget.max_calls is not None else 'no limit'
+    caps = ', '.join(f"{service}={cap}" for service, cap in sorted(budget.service_caps.items()))
+    planned = f", {budget.planned} planned" if budget.planned else ''
+    console.print(f"\n[bold]API call budget:[/bold] {budget.used} used of {limit}{planned}" +
+                  (f" (caps: {caps})" if caps else ''))
+    table = Table(title="API Calls")
+    table.add_column("Service", style="cyan")
+    table.add_column("Operation", style="magenta")
+    table.add_column("Calls", justify="right", style="green")
+    table.add_column("Skipped", justify="right", style="red")
+    for service, operation in sorted(budget.calls.keys() | budget.skipped.keys()):
+        table.add_row(service, operation, str(budget.calls[(service, operation)]),
+                      str(budget.skipped[(service, operation)] or ''))
+    console.print(table)
+    if budget.exhausted:
+        console.print(f"[yellow]Budget exhausted: {sum(budget.skipped.values())} calls skipped, "
+                      f"results are partial[/yellow]")
@@ -0,0 +1,219 @@
+import atexit
+import base64
+import datetime
+import gzip
+import io
+import json
+import os
+import threading
+
+# Cassettes hold every botocore call (and Artifactory HTTP request) a tool
+# made as gzip-compressed JSON lines. Calls are keyed by service, region,
+# operation and request parameters, so concurrent tools replay correctly
+# regardless of ordering. Request headers and the caller's credentials are
+# never stored; responses are stored as-is except for the secret halves of
+# temporary credentials (STS AssumeRole and the like), and secret request
+# parameters are blanked in the keys, the same way on record and replay.
+# The file is created 0600 like the other files under ~/.awsenum.
+
+ACTIVE = None
+
+# Response members holding secret credential material, at any depth
+SECRET_RESPONSE_KEYS = {'SecretAccessKey', 'SessionToken', 'secretAccessKey', 'sessionToken'}
+
+# Request parameters kept out of the interaction keys
+SECRET_PARAMS = {'ExternalId', 'SerialNumber', 'TokenCode', 'SAMLAssertion', 'WebIdentityToken'}
+
+REDACTED = 'REDACTED'
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    return str(value)
+
+def _decode(obj):
+    if '__datetime__' in obj:
+        return datetime.datetime.fromisoformat(obj['__datetime__'])
+    if '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+def _dumps(value):
+    return json.dumps(value, default=_encode, sort_keys=True, separators=(',', ':'))
+
+def _key(*parts):
+    return '|'.join(str(part) for part in parts)
+
+def _redact(value, keys):
+    """A copy of value with every member named in keys replaced by REDACTED"""
+    if isinstance(value, dict):
+        return {name: REDACTED if name in keys else _redact(item, keys) for name, item in value.items()}
+    if isinstance(value, list):
+        return [_redact(item, keys) for item in value]
+    return value
+
+class Cassette:
+    """Record or replay botocore calls and Artifactory HTTP requests
+
+    mode is 'record' or 'replay'. Recording hooks every botocore session
+    created after install() and writes the cassette on save(); replaying
+    answers calls from the cassette in the before-call hook, so no request
+    is signed or sent.
+    """
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+        self.interactions = {}
+        self.lines = []
+        self.misses = 0
+        self._lock = threading.Lock()
+        if mode == 'replay':
+            self.load()
+
+    def load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                key, status, error, response = json.loads(line)
+                self.interactions.setdefault(key, []).append((status, error, response))
+        # Repeated identical calls replay in recorded order, then repeat the last answer
+        self.interactions = {key: [0, entries] for key, entries in self.interactions.items()}
+
+    def save(self):
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)  # an existing cassette keeps its mode otherwise
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8', compresslevel=6) as f:
+            for line in self.lines:
+                f.write(line)
+                f.write('\n')
+
+    def _store(self, key, status, error, response):
+        line = json.dumps([key, status, error, response], separators=(',', ':'))
+        with self._lock:
+            self.lines.append(line)
+
+    def _next(self, key):
+        with self._lock:
+            entry = self.interactions.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            position, entries = entry
+            entry[0] = min(position + 1, len(entries) - 1)
+            return entries[position]
+
+    # botocore hooks
+
+    def _before_parameter_build(self, params, model, context, **kwargs):
+        context['cassette_key'] = _key(model.service_model.service_name, context.get('client_region'),
+                                       model.name, _dumps(_redact(params, SECRET_PARAMS)))
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        from botocore.response import StreamingBody
+        recorded = parsed
+        for name, value in parsed.items():
+            if isinstance(value, StreamingBody):
+                # Read the body once for the cassette and hand the caller a fresh stream
+                data = value.read()
+                parsed[name] = StreamingBody(io.BytesIO(data), len(data))
+                recorded = dict(recorded, **{name: data})
+        self._store(context['cassette_key'], http_response.status_code, None,
+                    _dumps(_redact(recorded, SECRET_RESPONSE_KEYS)))
+
+    def _after_call_error(self, exception, context, **kwargs):
+        self._store(context['cassette_key'], None, str(exception), None)
+
+    def _before_call(self, model, context, **kwargs):
+        from botocore.awsrequest import AWSResponse
+        from botocore.exceptions import HTTPClientError
+        recorded = self._next(context['cassette_key'])
+        if recorded is None:
+            # Surface as a ClientError so tools treat it like any failed call
+            message = f"No recorded response in the cassette for {model.name} ({context.get('client_region') or 'global'})"
+            return AWSResponse('', 404, {}, None), {'Error': {'Code': 'CassetteMiss', 'Message': message},
+                                                    'ResponseMetadata': {}}
+        status, error, response = recorded
+        if error is not None:
+            raise HTTPClientError(error=error)
+        return AWSResponse('', status, {}, None), json.loads(response, object_hook=_decode)
+
+    def handlers(self):
+        handlers = [('before-parameter-build', self._before_parameter_build)]
+        if self.mode == 'record':
+            handlers += [('after-call', self._after_call), ('after-call-error', self._after_call_error)]
+        else:
+            handlers.append(('before-call', self._before_call))
+        return handlers
+
+    # requests
+
+    def http_request(self, method, url, **kwargs):
+        import requests
+        key = _key('http', None, method, _dumps({'url': url, 'data': kwargs.get('data')}))
+        if self.mode == 'replay':
+            recorded = self._next(key)
+            if recorded is None:
+                raise requests.exceptions.ConnectionError(f"No recorded response in the cassette for {method} {url}")
+            status, error, response = recorded
+            if error is not None:
+                raise requests.exceptions.ConnectionError(error)
+            body = json.loads(response)
+            replayed = requests.models.Response()
+            replayed.status_code = status
+            replayed.url = url
+            replayed.headers = requests.structures.CaseInsensitiveDict(body['headers'])
+            replayed._content = base64.b64decode(body['content'])
+            return replayed
+        try:
+            response = requests.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self._store(key, None, str(e), None)
+            raise
+        self._store(key, response.status_code, None, _dumps({
+            'headers': dict(response.headers),
+            'content': base64.b64encode(response.content).decode('ascii')
+        }))
+        return response
+
+def install(path, mode):
+    """Record or replay every botocore session created from now on"""
+    from botocore import handlers
+    global ACTIVE
+    ACTIVE = Cassette(path, mode)
+    handlers.BUILTIN_HANDLERS.extend(ACTIVE.handlers())
+    if mode == 'record':
+        atexit.register(ACTIVE.save)
+    return ACTIVE
+
+def uninstall():
+    """Stop recording or replaying for sessions created from now on"""
+    from botocore import handlers
+    global ACTIVE
+    if ACTIVE is None:
+        return
+    for handler in ACTIVE.handlers():
+        if handler in handlers.BUILTIN_HANDLERS:
+            handlers.BUILTIN_HANDLERS.remove(handler)
+    atexit.unregister(ACTIVE.save)
+    ACTIVE = None
+
+def http_request(method, url, **kwargs):
+    """requests.request, recorded or replayed when a cassette is installed"""
+    if ACTIVE is not None:
+        return ACTIVE.http_request(method, url, **kwargs)
+    import requests
+    return requests.request(method, url, **kwargs)
+
+def add_cassette_arguments(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record', metavar='FILE', help='Record every AWS/HTTP response into a compressed cassette')
+    group.add_argument('--replay', metavar='FILE', help='Serve responses from a recorded cassette instead of the network')
+
+def install_from_args(args):
+    if args.record:
+        return install(args.record, 'record')
+    if args.replay:
+        return install(args.replay, 'replay')
+    return None
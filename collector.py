@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+from typing import NamedTuple
+
+from aws_clients import (GLOBAL_SERVICES, ClientPool, Deadline, DeadlineExceeded, DeadRegionCache,
+                         add_timeout_arguments, client_config, decode_base64_key, is_dead_region_error,
+                         run_concurrently)
+from budget import BudgetExceeded, add_budget_arguments, budget_from_args, display_budget
+from cassette import add_cassette_arguments, install_from_args
+from enum_aws import SERVICE_PROBES
+from inventory import DEFAULT_INVENTORY, Inventory, InventorySink
+from output_sink import TeeSink, open_sink
+from progress import add_progress_arguments, plan_units, progress_from_args, tracked
+from projection import FieldSpec, lookup, split_fields
+
+# Inventory of the operations enum_aws probes, one COLLECTIONS entry per
+# resource type. Everything else comes from botocore's service model: the
+# paginator and the key holding the items, or for operations without a
+# paginator the list member of the output shape and the NextToken/Marker
+# member input and output share (none: one call). The item shape names the
+# identifier, name and ARN members, guessed from the resource type unless
+# the entry names them, and its scalar members are the default fields.
+# Each (resource type, region) pair is one task for run_concurrently. A
+# task pages through its region and turns items into records as each page
+# is read, so no page outlives its records; the records are written to the
+# sink on the main thread as each task completes, as enum_all does, since
+# sinks such as InventorySink hold a connection only their own thread may
+# use.
+
+# Item members kept by default when a Collection names no fields
+SCALAR_TYPES = {'string', 'integer', 'long', 'boolean', 'timestamp', 'double', 'float'}
+
+# Members carrying the next page's position, for operations without a paginator
+TOKEN_MEMBERS = ['NextToken', 'nextToken', 'Marker', 'NextMarker']
+
+# Probe names that are not the operation they stand for
+PROBE_OPERATIONS = {
+    ('elasticbeanstalk', 'ListApplications'): 'DescribeApplications'
+}
+
+class Collection(NamedTuple):
+    """A read-only operation listing one resource type
+
+    items is the dotted path to the resources when it is not the
+    operation's result key (e.g. Reservations.Instances). id, name and arn
+    name item members when the guess from the resource type is wrong.
+    fields replaces the item's scalar members; params go to every call.
+    """
+    service: str
+    operation: str
+    items: str = None
+    id: str = None
+    name: str = None
+    arn: str = None
+    fields: tuple = None
+    params: dict = None
+
+COLLECTIONS = {
+    's3:bucket': Collection('s3', 'ListBuckets'),
+    'iam:user': Collection('iam', 'ListUsers'),
+    'route53:hostedzone': Collection('route53', 'ListHostedZones'),
+    'cloudfront:distribution': Collection('cloudfront', 'ListDistributions',
+                                          fields=('DomainName', 'Status', 'Enabled', 'WebACLId')),
+    'ec2:instance': Collection('ec2', 'DescribeInstances', items='Reservations.Instances',
+                               fields=('InstanceType', 'State.Name', 'PublicIpAddress', 'PrivateIpAddress',
+                                       'VpcId', 'LaunchTime')),
+    'ec2:volume': Collection('ec2', 'DescribeVolumes'),
+    'lambda:function': Collection('lambda', 'ListFunctions'),
+    'dynamodb:table': Collection('dynamodb', 'ListTables'),
+    'rds:db': Collection('rds', 'DescribeDBInstances', id='DBInstanceIdentifier', arn='DBInstanceArn',
+                         fields=('Engine', 'EngineVersion', 'DBInstanceClass', 'DBInstanceStatus', 'Endpoint.Address',
+                                 'PubliclyAccessible', 'StorageEncrypted')),
+    'sns:topic': Collection('sns', 'ListTopics'),
+    'sqs:queue': Collection('sqs', 'ListQueues'),
+    'ecs:cluster': Collection('ecs', 'ListClusters'),
+    'eks:cluster': Collection('eks', 'ListClusters'),
+    'elasticbeanstalk:application': Collection('elasticbeanstalk', 'DescribeApplications'),
+    'autoscaling:autoscalinggroup': Collection('autoscaling', 'DescribeAutoScalingGroups'),
+    'elb:loadbalancer': Collection('elb', 'DescribeLoadBalancers'),
+    'elbv2:loadbalancer': Collection('elbv2', 'DescribeLoadBalancers'),
+    'kms:key': Collection('kms', 'ListKeys'),
+    'secretsmanager:secret': Collection('secretsmanager', 'ListSecrets'),
+    'ssm:document': Collection('ssm', 'ListDocuments'),
+    'stepfunctions:statemachine': Collection('stepfunctions', 'ListStateMachines'),
+    'glue:database': Collection('glue', 'GetDatabases'),
+    'athena:workgroup': Collection('athena', 'ListWorkGroups'),
+    'redshift:cluster': Collection('redshift', 'DescribeClusters',
+                                   fields=('NodeType', 'NumberOfNodes', 'ClusterStatus', 'Endpoint.Address',
+                                           'PubliclyAccessible', 'Encrypted', 'VpcId')),
+    'cloudformation:stack': Collection('cloudformation', 'ListStacks')
+}
+
+def probe_collection(text):
+    """(resource type, Collection) for a SERVICE:OPERATION of the enum_aws probe list"""
+    service, _, operation = text.partition(':')
+    if operation not in SERVICE_PROBES.get(service, []):
+        raise ValueError(f"Not in the enum_aws probe list: {text}")
+    operation = PROBE_OPERATIONS.get((service, operation), operation)
+    # ListStateMachines -> statemachine, the noun the identity members are guessed from
+    noun = operation
+    for verb in ('List', 'Describe', 'Get'):
+        if noun.startswith(verb):
+            noun = noun[len(verb):]
+    noun = noun[:-1] if noun.endswith('s') else noun
+    return f"{service}:{noun.lower()}", Collection(service, operation)
+
+def item_shape(shape, path):
+    """Shape of the items at a dotted path of an output shape; lists are walked implicitly"""
+    for part in path.split('.'):
+        while shape.type_name == 'list':
+            shape = shape.member
+        if shape.type_name != 'structure' or part not in shape.members:
+            return None
+        shape = shape.members[part]
+    while shape.type_name == 'list':
+        shape = shape.member
+    return shape
+
+def identity_members(resource_type, shape, collection):
+    """(id, name, arn) member names of an item shape, None where there is none
+
+    Items that are not structures (table names, queue URLs, cluster ARNs)
+    are their own identifier.
+    """
+    if shape is None or shape.type_name != 'structure':
+        return None, None, None
+    members = {name.lower(): name for name in shape.members}
+    noun = resource_type.split(':', 1)[1].replace('-', '').lower()
+
+    def find(*candidates):
+        return next((members[candidate] for candidate in candidates if candidate in members), None)
+
+    id_member = (collection.id or find(noun + 'id', noun + 'identifier', noun + 'name', 'id', 'name')
+                 or next((name for name in shape.members if name.endswith(('Id', 'Identifier', 'Name', 'Arn', 'ARN'))),
+                         None))
+    name_member = collection.name or find(noun + 'name', 'name')
+    arn_member = collection.arn or find(noun + 'arn', 'arn')
+    return id_member, name_member if name_member != id_member else None, arn_member
+
+class Collector:
+    """A Collection resolved against its service model
+
+    client is any client of the collection's service; only its model is read.
+    """
+
+    def __init__(self, resource_type, collection, client, fields=None):
+        from botocore import xform_name
+        model = client.meta.service_model
+        if collection.operation not in model.operation_names:
+            raise ValueError(f"{collection.service} has no operation {collection.operation}")
+        operation = model.operation_model(collection.operation)
+        self.resource_type = resource_type
+        self.collection = collection
+        self.method = xform_name(collection.operation)
+        self.paginated = client.can_paginate(self.method)
+        self.token = None
+        if self.paginated:
+            result_key = client.get_paginator(self.method).result_keys[0].expression
+        else:
+            output = operation.output_shape.members if operation.output_shape else {}
+            inputs = operation.input_shape.members if operation.input_shape else {}
+            result_key = next((name for name, member in output.items() if member.type_name == 'list'), None)
+            self.token = next((name for name in TOKEN_MEMBERS if name in inputs and name in output), None)
+        self.items = collection.items or result_key
+        if self.items is None:
+            raise ValueError(f"{collection.service} {collection.operation} returns no list of resources")
+        shape = item_shape(operation.output_shape, self.items)
+        self.id, self.name, self.arn = identity_members(resource_type, shape, collection)
+        if fields is None:
+            identity = (self.id, self.name, self.arn)
+            fields = collection.fields or [name for name, member in getattr(shape, 'members', {}).items()
+                                           if member.type_name in SCALAR_TYPES and name not in identity]
+        self.fields = FieldSpec(fields)
+
+    def pages(self, client):
+        params = dict(self.collection.params or {})
+        if self.paginated:
+            yield from client.get_paginator(self.method).paginate(**params)
+            return
+        call = getattr(client, self.method)
+        while True:
+            page = call(**params)
+            yield page
+            token = page.get(self.token) if self.token else None
+            if not token:
+                return
+            params[self.token] = token
+
+    def record(self, region, item):
+        """Normalized record of one item: resource type, region, identity members, then fields"""
+        if not isinstance(item, dict):
+            return {'ResourceType': self.resource_type, 'Region': region, 'ResourceId': item, 'Name': None,
+                    'Arn': item if str(item).startswith('arn:') else None}
+        return {
+            'ResourceType': self.resource_type,
+            'Region': region,
+            'ResourceId': item.get(self.id) if self.id else None,
+            'Name': item.get(self.name) if self.name else None,
+            'Arn': item.get(self.arn) if self.arn else None,
+            **self.fields.values(item)
+        }
+
+    def collect(self, pool, region):
+        """Records of every item on every page in a region"""
+        client = pool.client(self.collection.service, region)
+        return [self.record(region, item) for page in self.pages(client) for item in lookup(page, self.items) or []]
+
+def build_collectors(pool, collections, region, fields=None):
+    """{resource type: Collector} for {resource type: Collection}, read from a client per service"""
+    return {resource_type: Collector(resource_type, collection,
+                                     pool.client(collection.service,
+                                                 None if collection.service in GLOBAL_SERVICES else region),
+                                     fields)
+            for resource_type, collection in collections.items()}
+
+def run_collectors(pool, collectors, regions, sink, max_workers=32, deadline=None, dead_regions=None,
+                   dead_region_key=None):
+    """Run every (resource type, region) pair concurrently and write its records to the sink as it completes
+
+    Global services run once, with region None. Returns the number of
+    records written and the {resource type: count} of each.
+    """
+    if dead_regions is not None:
+        dead_region_key = dead_region_key or pool.access_key_id()
+    tasks = {}
+    for resource_type, collector in collectors.items():
+        service = collector.collection.service
+        for region in [None] if service in GLOBAL_SERVICES else regions:
+            reason = dead_regions.reason(dead_region_key, region, service) if dead_regions and region else None
+            if reason:
+                sink.error(service, region, f"skipped: {reason}")
+                continue
+            tasks[(resource_type, region)] = lambda c=collector, r=region: c.collect(pool, r)
+
+    counts = dict.fromkeys(collectors, 0)
+    plan_units(len(tasks))
+    for (resource_type, region), records, error in tracked(run_concurrently(tasks, max_workers, deadline)):
+        if error is None:
+            for record in records:
+                sink.write(record)
+            counts[resource_type] += len(records)
+            continue
+        service = collectors[resource_type].collection.service
+        if isinstance(error, DeadlineExceeded):
+            message = 'deadline reached'
+        elif isinstance(error, BudgetExceeded):
+            message = 'call budget exhausted'
+        elif region and dead_regions and is_dead_region_error(error):
+            message = dead_regions.mark_dead(dead_region_key, region, error, service)
+        else:
+            message = str(error)
+        sink.error(service, region, message)
+    return sum(counts.values()), counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inventory any resource type enum_aws probes, across regions')
+    parser.add_argument('--profile', help='AWS profile name to use')
+    parser.add_argument('--access-key', help='AWS Access Key (plain or base64 encoded)')
+    parser.add_argument('--secret-key', help='AWS Secret Key (plain or base64 encoded)')
+    parser.add_argument('--region', action='append', help='Region to collect (repeatable, default: all enabled regions)')
+    parser.add_argument('--types', help='Comma-separated resource types to collect (default: all of %s)' %
+                        ','.join(COLLECTIONS))
+    parser.add_argument('--operation', action='append', default=[], metavar='SERVICE:OPERATION',
+                        help='Also collect an operation of the enum_aws probe list that has no resource type, '
+                        'e.g. cloudwatch:ListMetrics (repeatable)')
+    parser.add_argument('--fields', help='Comma-separated item fields to keep instead of the defaults, dotted for '
+                        'nested ones (e.g. State.Name)')
+    parser.add_argument('--format', choices=['table', 'jsonl'], default='table', help='Output format')
+    parser.add_argument('--output', help='Write JSONL output to this file instead of stdout')
+    parser.add_argument('--workers', type=int, default=32, help='Maximum concurrent (resource type, region) tasks')
+    parser.add_argument('--inventory', nargs='?', const=DEFAULT_INVENTORY, metavar='DB',
+                        help=f'Also store results in the local inventory (default DB: {DEFAULT_INVENTORY})')
+    add_timeout_arguments(parser)
+    add_budget_arguments(parser)
+    add_cassette_arguments(parser)
+    add_progress_arguments(parser)
+    args = parser.parse_args(argv)
+    from botocore.exceptions import ClientError, NoCredentialsError
+    install_from_args(args)
+    budget = budget_from_args(parser, args)
+
+    if bool(args.access_key) != bool(args.secret_key):
+        parser.error("--access-key and --secret-key must be given together")
+
+    collections = {}
+    for resource_type in split_fields(args.types) if args.types or args.operation else COLLECTIONS:
+        if resource_type not in COLLECTIONS:
+            parser.error(f"Unknown resource type: {resource_type} (available: {', '.join(COLLECTIONS)})")
+        collections[resource_type] = COLLECTIONS[resource_type]
+    try:
+        collections.update(probe_collection(text) for text in args.operation)
+    except ValueError as e:
+        parser.error(str(e))
+
+    deadline = Deadline(args.deadline)
+    access_key = decode_base64_key(args.access_key) if args.access_key else None
+    pool = ClientPool(
+        access_key=access_key,
+        secret_key=decode_base64_key(args.secret_key) if args.secret_key else None,
+        profile=args.profile,
+        config=client_config(args.connect_timeout, args.read_timeout, args.max_attempts, deadline),
+        deadline=deadline
+    )
+    dead_regions = DeadRegionCache(ttl=args.dead_region_ttl)
+
+    try:
+        regions = args.region or pool.get_all_regions()
+        account = pool.get_account_id() if args.inventory else None
+    except (ClientError, NoCredentialsError, BudgetExceeded) as e:
+        print(f"Error listing regions: {e}", file=sys.stderr)
+        return 1
+    try:
+        collectors = build_collectors(pool, collections, regions[0], split_fields(args.fields) or None)
+    except ValueError as e:
+        parser.error(str(e))
+
+    sink = open_sink(args.format, args.output, title='AWS Resources')
+    if args.inventory:
+        sink = TeeSink(sink, InventorySink(Inventory(args.inventory), account))
+    reporter = progress_from_args(args)
+    with sink:
+        try:
+            if reporter is not None:
+                reporter.start()
+            total, counts = run_collectors(pool, collectors, regions, sink, args.workers, deadline, dead_regions,
+                                           access_key)
+        finally:
+            if reporter is not None:
+                reporter.stop()
+    print(f"Collected {total} resources: " + ', '.join(f"{count} {resource_type}"
+                                                       for resource_type, count in counts.items()), file=sys.stderr)
+    if budget is not None:
+        display_budget(budget)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import json
+import math
+
+from aws_clients import CallCounter, run_concurrently
+
+# enum_all services that AWS Config can answer, by Config resource type
+CONFIG_TYPES = {
+    'ec2': 'AWS::EC2::Instance',
+    'rds': 'AWS::RDS::DBInstance',
+    'lambda': 'AWS::Lambda::Function',
+    's3': 'AWS::S3::Bucket'
+}
+
+SELECT_FIELDS = [
+    'resourceId', 'resourceName', 'resourceType', 'awsRegion', 'accountId', 'resourceCreationTime',
+    'configuration.instanceType', 'configuration.state.name', 'configuration.publicIpAddress',
+    'configuration.engine', 'configuration.dBInstanceStatus', 'configuration.endpoint.address',
+    'configuration.runtime', 'configuration.lastModified'
+]
+
+# Items per page of the direct describe/list calls, to estimate what Config saved
+DIRECT_PAGE_SIZES = {
+    'ec2': 1000,
+    'rds': 100,
+    'lambda': 50
+}
+
+def build_query(services, regions=None, account=None):
+    """Advanced query selecting the enum_all fields for the given services
+
+    account limits it to one account's resources, which an organization
+    aggregator otherwise mixes with every member account's.
+    """
+    types = ', '.join(f"'{CONFIG_TYPES[service]}'" for service in services)
+    query = f"SELECT {', '.join(SELECT_FIELDS)} WHERE resourceType IN ({types})"
+    if regions:
+        query += " AND awsRegion IN (%s)" % ', '.join(f"'{region}'" for region in regions)
+    if account:
+        query += f" AND accountId = '{account}'"
+    return query
+
+def config_record(item):
+    """Turn an advanced query result into the same record enum_all's collectors emit"""
+    configuration = item.get('configuration', {})
+    resource_type = item.get('resourceType')
+    record = {'Region': item.get('awsRegion'), 'Account': item.get('accountId')}
+    if resource_type == 'AWS::EC2::Instance':
+        record.update({
+            'ResourceType': 'ec2:instance',
+            'InstanceId': item.get('resourceId'),
+            'State': configuration.get('state', {}).get('name'),
+            'Type': configuration.get('instanceType'),
+            'PublicIp': configuration.get('publicIpAddress')
+        })
+    elif resource_type == 'AWS::RDS::DBInstance':
+        # resourceId is the dbi- resource ID; the identifier is the resource name
+        record.update({
+            'ResourceType': 'rds:db',
+            'DBInstanceId': item.get('resourceName'),
+            'Engine': configuration.get('engine'),
+            'Status': configuration.get('dBInstanceStatus'),
+            'Endpoint': configuration.get('endpoint', {}).get('address')
+        })
+    elif resource_type == 'AWS::Lambda::Function':
+        record.update({
+            'ResourceType': 'lambda:function',
+            'FunctionName': item.get('resourceName'),
+            'Runtime': configuration.get('runtime'),
+            'LastModified': configuration.get('lastModified')
+        })
+    else:
+        record.update({
+            'ResourceType': 's3:bucket',
+            'Name': item.get('resourceName'),
+            'CreationDate': item.get('resourceCreationTime')
+        })
+    return record
+
+def select(client, operation, counter, **kwargs):
+    """Run a paginated advanced query and return the parsed result rows"""
+    rows = []
+    for page in client.get_paginator(operation).paginate(**kwargs):
+        counter.add()
+        rows.extend(json.loads(result) for result in page.get('Results', []))
+    return rows
+
+def find_aggregator(pool, region, counter, account, name=None):
+    """Return (aggregator name, account's regions or None for all) or None if no aggregator includes account
+
+    Only the sources naming account count towards its regions; an
+    organization source is taken as including it, which the per-region
+    resource counts then confirm.
+    """
+    config = pool.client('config', region)
+    kwargs = {'ConfigurationAggregatorNames': [name]} if name else {}
+    for page in config.get_paginator('describe_configuration_aggregators').paginate(**kwargs):
+        counter.add()
+        for aggregator in page.get('ConfigurationAggregators', []):
+            sources = [source for source in aggregator.get('AccountAggregationSources', [])
+                       if account in source.get('AccountIds', [])]
+            if aggregator.get('OrganizationAggregationSource'):
+                sources.append(aggregator['OrganizationAggregationSource'])
+            if not sources:
+                continue
+            if any(source.get('AllAwsRegions') for source in sources):
+                return aggregator['ConfigurationAggregatorName'], None
+            regions = {region for source in sources for region in source.get('AwsRegions', [])}
+            return aggregator['ConfigurationAggregatorName'], regions
+    return None
+
+def aggregated_coverage(config, name, account, region, counter):
+    """enum_all services the aggregator holds resources of for account in region
+
+    Types with no aggregated resources are left to the direct collectors,
+    since an empty count can also mean the member's recorder skips them.
+    """
+    kwargs = {'ConfigurationAggregatorName': name, 'GroupByKey': 'RESOURCE_TYPE',
+              'Filters': {'AccountId': account, 'Region': region}}
+    counted = set()
+    while True:
+        counter.add()
+        response = config.get_aggregate_discovered_resource_counts(**kwargs)
+        counted |= {group['GroupName'] for group in response.get('GroupedResourceCounts', [])
+                    if group.get('ResourceCount')}
+        if not response.get('NextToken'):
+            break
+        kwargs['NextToken'] = response['NextToken']
+    return {service for service, config_type in CONFIG_TYPES.items() if config_type in counted}
+
+def recorder_coverage(pool, region, counter):
+    """enum_all services the region's Config recorder is currently recording"""
+    config = pool.client('config', region)
+    counter.add()
+    statuses = config.describe_configuration_recorder_status()['ConfigurationRecordersStatus']
+    if not any(status.get('recording') for status in statuses):
+        return set()
+    counter.add()
+    recorded = set()
+    for recorder in config.describe_configuration_recorders()['ConfigurationRecorders']:
+        group = recorder.get('recordingGroup', {})
+        strategy = group.get('recordingStrategy', {}).get('useOnly')
+        if group.get('allSupported') or strategy == 'ALL_SUPPORTED_RESOURCE_TYPES':
+            recorded |= set(CONFIG_TYPES.values())
+        elif strategy == 'EXCLUSION_BY_RESOURCE_TYPES':
+            excluded = set(group.get('exclusionByResourceTypes', {}).get('resourceTypes', []))
+            recorded |= set(CONFIG_TYPES.values()) - excluded
+        else:
+            recorded |= set(group.get('resourceTypes', []))
+    return {service for service, config_type in CONFIG_TYPES.items() if config_type in recorded}
+
+def service_region(record):
+    """The enum_all (service, region) task a record belongs to"""
+    service = record['ResourceType'].split(':')[0]
+    return (service, None) if service == 's3' else (service, record['Region'])
+
+def estimate_direct_calls(covered, records):
+    """API calls the direct collectors would have needed for the covered (service, region) pairs"""
+    counts = {}
+    for record in records:
+        key = service_region(record)
+        counts[key] = counts.get(key, 0) + 1
+    calls = 0
+    for service, region in covered:
+        count = counts.get((service, region), 0)
+        if service == 's3':
+            calls += 1 + count  # list_buckets plus one get_bucket_location per bucket
+        else:
+            calls += max(1, math.ceil(count / DIRECT_PAGE_SIZES[service]))
+    return calls
+
+def collect_from_config(pool, regions, services, aggregator=None, aggregator_region=None, max_workers=32,
+                        account=None, enabled_regions=None):
+    """Answer as much of an enum_all sweep as possible from AWS Config advanced query
+
+    Uses a configuration aggregator in aggregator_region that includes
+    account (select_aggregate_resource_config paginated per region, in
+    parallel), otherwise each region's own recorder. A service/region is
+    only covered when the aggregator holds resources of that type for
+    account there, or the region's recorder records it; everything else
+    is left to the direct collectors. Queries are limited to account. The direct S3 collector lists every bucket of the account,
+    so S3 is only answered by Config when it covers every enabled region
+    (enabled_regions, default: the swept regions). Returns (records,
+    covered (service, region) pairs with region None for S3, report dict).
+    """
+    from botocore.exceptions import ClientError
+    counter = CallCounter()
+    enabled = set(enabled_regions if enabled_regions is not None else regions)
+    services = [service for service in services if service in CONFIG_TYPES]
+    report = {'path': 'direct', 'config_calls': 0, 'calls_saved': 0}
+    if not services:
+        return [], set(), report
+
+    home = aggregator_region or pool.session.region_name or 'us-east-1'
+    found = None
+    if account:
+        try:
+            found = find_aggregator(pool, home, counter, account, aggregator)
+        except ClientError as e:
+            if aggregator:
+                raise
+            # No permission to look for aggregators; try the regional recorders
+            report['error'] = str(e)
+
+    if found:
+        name, aggregated_regions = found
+        config = pool.client('config', home)
+        swept = [region for region in regions if aggregated_regions is None or region in aggregated_regions]
+        tasks = {region: (lambda r=region: aggregated_coverage(config, name, account, r, counter)) for region in swept}
+
+        def select_region(region, region_services):
+            return select(config, 'select_aggregate_resource_config', counter, ConfigurationAggregatorName=name,
+                          Expression=build_query(region_services, [region], account))
+    else:
+        tasks = {region: (lambda r=region: recorder_coverage(pool, r, counter)) for region in regions}
+
+        def select_region(region, region_services):
+            config = pool.client('config', region)
+            return select(config, 'select_resource_config', counter, Expression=build_query(region_services, account=account))
+
+    recording = {region: recorded for region, recorded, error in run_concurrently(tasks, max_workers)
+                 if error is None and recorded}
+    s3_everywhere = 's3' in services and enabled <= set(recording) and all(
+        's3' in recorded for recorded in recording.values())
+
+    def query(region):
+        region_services = [service for service in services if service in recording[region]
+                           and (service != 's3' or s3_everywhere)]
+        return select_region(region, region_services) if region_services else []
+
+    # One query per region so the pages of each region are fetched in parallel
+    tasks = {region: (lambda r=region: query(r)) for region in recording}
+    covered = set()
+    records = []
+    failed = False
+    for region, items, error in run_concurrently(tasks, max_workers):
+        if error is not None:
+            failed = True  # the direct collectors cover this region instead
+            report['error'] = str(error)
+            continue
+        records.extend(config_record(item) for item in items)
+        covered |= {(service, region) for service in recording[region] if service != 's3' and service in services}
+    if s3_everywhere and not failed:
+        covered.add(('s3', None))
+    if recording:
+        report['path'] = f"aggregator {name}" if found else f"recorders in {len(recording)}/{len(regions)} regions"
+
+    # Keep only what the direct collectors will skip, so nothing is reported twice
+    records = [record for record in records if service_region(record) in covered]
+    report['config_calls'] = counter.count
+    report['calls_saved'] = estimate_direct_calls(covered, records) - counter.count
+    if not covered:
+        report['path'] = 'direct'
+    return records, covered, report
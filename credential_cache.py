@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Caller identities and assumed-role credentials are cached on disk so
+# chained invocations (wrapper scripts, enum_all.sh, org audits) make no
+# STS calls after the first. Files are created 0600 in a 0700 directory.
+# Temporary credentials are only written to disk encrypted with Fernet,
+# which needs the optional `cryptography` package; without it they are
+# cached in memory for the current process only. The Fernet key comes from
+# AWSENUM_CACHE_KEY or, failing that, a 0600 key file next to the cache.
+# AWSENUM_STS_CACHE points the cache elsewhere, or disables it with "off".
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.awsenum', 'sts')
+
+# Long-term keys can be deactivated at any time, so their identity is only trusted this long
+IDENTITY_TTL = 3600
+
+# botocore refreshes credentials with less than 15 minutes left, so never serve those
+MIN_REMAINING = 960
+
+# Background refresh runs this long before expiry, ahead of botocore's own refresh
+REFRESH_AHEAD = 1260
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def _fernet(directory):
+    """Fernet instance for the cache, or None when cryptography is not installed"""
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        return None
+    key = os.environ.get('AWSENUM_CACHE_KEY')
+    if not key:
+        path = os.path.join(directory, '.key')
+        if not os.path.exists(path):
+            # Processes starting together (org_audit workers) may race to create the key: each
+            # writes a complete key to its own file and links it into place, and the losers
+            # read the winner's
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+            fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(Fernet.generate_key())
+            try:
+                os.link(temporary, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(temporary)
+        with open(path, 'rb') as f:
+            key = f.read().strip()
+    return Fernet(key)
+
+def _frozen_credentials(pool):
+    """A ClientPool's resolved credentials; NoCredentialsError like a botocore call when there are none"""
+    credentials = pool.session.get_credentials()
+    if credentials is None:
+        from botocore.exceptions import NoCredentialsError
+        raise NoCredentialsError()
+    return credentials.get_frozen_credentials()
+
+class StsCache:
+    """Disk-backed cache of caller identities and assumed-role credentials
+
+    Entries are keyed by a hash of the credentials or role that produced
+    them, so a cached identity is never served for a different secret key.
+    directory None keeps everything in memory.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        self.memory = {}
+        self.sts_calls = 0
+        self.refreshers = {}
+        self._lock = threading.Lock()
+        self.fernet = None
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            self.fernet = _fernet(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key, min_remaining=0):
+        """Cached value for key, or None if missing or expiring within min_remaining seconds"""
+        entry = self.memory.get(key)
+        if entry is None and self.directory:
+            try:
+                with open(self._path(key)) as f:
+                    stored = json.load(f)
+                data = stored['data']
+                if stored.get('encrypted'):
+                    if self.fernet is None:
+                        return None
+                    data = json.loads(self.fernet.decrypt(data.encode('ascii')))
+                entry = self.memory[key] = (stored['expires'], data)
+            except Exception:
+                return None  # missing, corrupt, or encrypted with another key
+        if entry is None or entry[0] - time.time() <= min_remaining:
+            return None
+        return entry[1]
+
+    def put(self, key, value, expires, secret=False):
+        """Cache value until expires; secret values only reach disk encrypted"""
+        with self._lock:
+            self.memory[key] = (expires, value)
+        if not self.directory or (secret and self.fernet is None):
+            return
+        stored = {'expires': expires, 'encrypted': self.fernet is not None, 'data': value}
+        if self.fernet is not None:
+            stored['data'] = self.fernet.encrypt(json.dumps(value).encode('utf-8')).decode('ascii')
+        path = self._path(key)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(stored, f)
+        os.replace(temporary, path)
+
+    def caller_identity(self, pool):
+        """UserId, Account and Arn of a ClientPool's credentials, from the cache when possible"""
+        credentials = _frozen_credentials(pool)
+        key = f"identity:{credentials.access_key}:{credentials.secret_key}:{credentials.token}"
+        identity = self.get(key)
+        if identity is None:
+            with self._lock:
+                self.sts_calls += 1
+            response = pool.client('sts').get_caller_identity()
+            identity = {'UserId': response['UserId'], 'Account': response['Account'], 'Arn': response['Arn']}
+            self.put(key, identity, time.time() + IDENTITY_TTL)
+        return identity
+
+    def assume_role(self, pool, role_arn, session_name, external_id=None, duration=3600, force=False):
+        """Credential metadata for role_arn in botocore's refresh format, from the cache when possible"""
+        source = _frozen_credentials(pool).access_key
+        key = f"role:{source}:{role_arn}:{session_name}:{external_id}"
+        metadata = None if force else self.get(key, MIN_REMAINING)
+        if metadata is None:
+            kwargs = {'ExternalId': external_id} if external_id else {}
+            with self._lock:
+                self.sts_calls += 1
+            credentials = pool.client('sts').assume_role(
+                RoleArn=role_arn, RoleSessionName=session_name, DurationSeconds=duration, **kwargs)['Credentials']
+            metadata = {
+                'access_key': credentials['AccessKeyId'],
+                'secret_key': credentials['SecretAccessKey'],
+                'token': credentials['SessionToken'],
+                'expiry_time': credentials['Expiration'].isoformat()
+            }
+            self.put(key, metadata, credentials['Expiration'].timestamp(), secret=True)
+        return metadata
+
+    def role_credentials(self, pool, role_arn, session_name, external_id=None, duration=3600):
+        """botocore RefreshableCredentials for role_arn, kept fresh by a background thread
+
+        The thread re-assumes the role REFRESH_AHEAD seconds before expiry,
+        so long runs never block on STS; botocore then picks up the new
+        credentials from the cache.
+        """
+        from botocore.credentials import RefreshableCredentials
+
+        def fetch():
+            return self.assume_role(pool, role_arn, session_name, external_id, duration)
+
+        metadata = fetch()
+        self._schedule_refresh(role_arn, metadata,
+                               lambda: self.assume_role(pool, role_arn, session_name, external_id, duration,
+                                                        force=True))
+        return RefreshableCredentials.create_from_metadata(metadata, fetch, 'assume-role')
+
+    def _schedule_refresh(self, name, metadata, refresh):
+        from datetime import datetime
+        delay = datetime.fromisoformat(metadata['expiry_time']).timestamp() - time.time() - REFRESH_AHEAD
+
+        def run():
+            try:
+                self._schedule_refresh(name, refresh(), refresh)
+            except Exception:
+                pass  # botocore's own refresh still covers the credentials
+
+        timer = threading.Timer(min(max(0.0, delay), threading.TIMEOUT_MAX), run)
+        timer.daemon = True
+        with self._lock:
+            previous = self.refreshers.get(name)
+            if previous is not None:
+                previous.cancel()
+            self.refreshers[name] = timer
+        timer.start()
+
+    def close(self):
+        with self._lock:
+            for timer in self.refreshers.values():
+                timer.cancel()
+            self.refreshers = {}
+
+def default_cache():
+    """The process-wide cache, configured from AWSENUM_STS_CACHE"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            setting = os.environ.get('AWSENUM_STS_CACHE', DEFAULT_CACHE_DIR)
+            _default_cache = StsCache(None if setting == 'off' else setting)
+        return _default_cache
+
+def active_cache():
+    """default_cache(), or a throwaway in-memory cache while a cassette is recording or replaying
+
+    Bypassing the disk cache under a cassette keeps every STS call in the
+    cassette, so it replays on machines that never saw the credentials.
+    """
+    import cassette
+    if cassette.ACTIVE is not None:
+        return StsCache(None)
+    return default_cache()
+
+def caller_identity(pool):
+    """Cached sts.get_caller_identity for a ClientPool"""
+    return active_cache().caller_identity(pool)
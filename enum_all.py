@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+from aws_clients import ClientPool, decode_base64_key, run_concurrently
+from budget import BudgetExceeded, add_budget_arguments, budget_from_args, display_budget
+from cassette import add_cassette_arguments, install_from_args
+from config_inventory import CONFIG_TYPES, collect_from_config
+from inventory import DEFAULT_INVENTORY, Inventory, InventorySink
+from output_sink import TeeSink, open_sink
+from projection import FieldSpec, lookup, project_pages, split_fields
+from tagging_inventory import DESCRIBERS, run_wide
+
+# Response fields each collector reads. Items are projected to them page by
+# page (see projection.py); --fields replaces them, and the records then
+# hold the chosen fields instead of the collector's own.
+EC2_FIELDS = FieldSpec(['InstanceId', 'State.Name', 'InstanceType', 'PublicIpAddress'])
+RDS_FIELDS = FieldSpec(['DBInstanceIdentifier', 'Engine', 'DBInstanceStatus', 'Endpoint.Address'])
+REDIS_FIELDS = FieldSpec(['CacheClusterId', 'Engine', 'CacheClusterStatus', 'CacheNodeType',
+                          'ConfigurationEndpoint.Address', 'CacheNodes.Endpoint.Address'])
+LAMBDA_FIELDS = FieldSpec(['FunctionName', 'Runtime', 'LastModified'])
+S3_FIELDS = FieldSpec(['Name', 'CreationDate'])
+
+def paginate(client, operation, result_key, fields=None, **kwargs):
+    """Yield every item at result_key (dotted, e.g. Reservations.Instances) across all pages
+
+    Items are projected to fields (a FieldSpec) when given, else yielded as-is.
+    """
+    pages = client.get_paginator(operation).paginate(**kwargs)
+    if fields is None:
+        return (item for page in pages for item in lookup(page, result_key) or [])
+    return project_pages(pages, result_key, fields)
+
+def fields_record(resource_type, region, item, fields):
+    """A record of the --fields values of one item"""
+    return {'ResourceType': resource_type, 'Region': region, **fields.values(item)}
+
+def collect_ec2_instances(pool, region, fields=None):
+    """Same fields as list_ec2_instances.sh"""
+    ec2 = pool.client('ec2', region)
+    for instance in paginate(ec2, 'describe_instances', 'Reservations.Instances', fields or EC2_FIELDS):
+        if fields:
+            yield fields_record('ec2:instance', region, instance, fields)
+            continue
+        yield {
+            'ResourceType': 'ec2:instance',
+            'Region': region,
+            'InstanceId': instance.get('InstanceId'),
+            'State': instance.get('State', {}).get('Name'),
+            'Type': instance.get('InstanceType'),
+            'PublicIp': instance.get('PublicIpAddress')
+        }
+
+def collect_rds_instances(pool, region, fields=None):
+    """Same fields as list_rds_instances.sh"""
+    rds = pool.client('rds', region)
+    for db in paginate(rds, 'describe_db_instances', 'DBInstances', fields or RDS_FIELDS):
+        if fields:
+            yield fields_record('rds:db', region, db, fields)
+            continue
+        yield {
+            'ResourceType': 'rds:db',
+            'Region': region,
+            'DBInstanceId': db.get('DBInstanceIdentifier'),
+            'Engine': db.get('Engine'),
+            'Status': db.get('DBInstanceStatus'),
+            'Endpoint': db.get('Endpoint', {}).get('Address')
+        }
+
+def collect_redis_clusters(pool, region, fields=None):
+    """Same fields as list_elasticache_redis.sh"""
+    elasticache = pool.client('elasticache', region)
+    # Engine is needed to pick out the Redis clusters whatever the fields
+    for cluster in paginate(elasticache, 'describe_cache_clusters', 'CacheClusters',
+                            fields + ['Engine'] if fields else REDIS_FIELDS, ShowCacheNodeInfo=True):
+        if cluster.get('Engine') != 'redis':
+            continue
+        if fields:
+            yield fields_record('elasticache:cluster', region, cluster, fields)
+            continue
+        # Single-node clusters only expose their address on the node itself
+        endpoint = cluster.get('ConfigurationEndpoint') or next(
+            (node.get('Endpoint') for node in cluster.get('CacheNodes', []) if node.get('Endpoint')), {})
+        yield {
+            'ResourceType': 'elasticache:cluster',
+            'Region': region,
+            'ClusterId': cluster.get('CacheClusterId'),
+            'Engine': cluster.get('Engine'),
+            'Status': cluster.get('CacheClusterStatus'),
+            'NodeType': cluster.get('CacheNodeType'),
+            'Endpoint': endpoint.get('Address')
+        }
+
+def collect_lambda_functions(pool, region, fields=None):
+    """Same fields as list_lambda_functions.sh"""
+    lambda_client = pool.client('lambda', region)
+    for function in paginate(lambda_client, 'list_functions', 'Functions', fields or LAMBDA_FIELDS):
+        if fields:
+            yield fields_record('lambda:function', region, function, fields)
+            continue
+        yield {
+            'ResourceType': 'lambda:function',
+            'Region': region,
+            'FunctionName': function.get('FunctionName'),
+            'Runtime': function.get('Runtime'),
+            'LastModified': function.get('LastModified')
+        }
+
+def collect_s3_buckets(pool, region=None, max_workers=16, fields=None):
+    """Same fields as list_s3_buckets.sh, listed once instead of once per region"""
+    s3 = pool.client('s3')
+    # Name is needed to locate each bucket whatever the fields
+    spec = fields + ['Name'] if fields else S3_FIELDS
+    buckets = [spec.project(bucket) for bucket in s3.list_buckets()['Buckets']]
+
+    def bucket_location(name):
+        location = s3.get_bucket_location(Bucket=name)['LocationConstraint']
+        return location or 'us-east-1'
+
+    tasks = {bucket['Name']: (lambda name=bucket['Name']: bucket_location(name)) for bucket in buckets}
+    locations = {name: (location if error is None else 'Unknown')
+                 for name, location, error in run_concurrently(tasks, max_workers)}
+    for bucket in buckets:
+        if fields:
+            yield fields_record('s3:bucket', locations.get(bucket['Name'], 'Unknown'), bucket, fields)
+            continue
+        yield {
+            'ResourceType': 's3:bucket',
+            'Region': locations.get(bucket['Name'], 'Unknown'),
+            'Name': bucket['Name'],
+            'CreationDate': bucket['CreationDate']
+        }
+
+REGIONAL_COLLECTORS = {
+    'ec2': collect_ec2_instances,
+    'rds': collect_rds_instances,
+    'elasticache': collect_redis_clusters,
+    'lambda': collect_lambda_functions
+}
+
+GLOBAL_COLLECTORS = {
+    's3': collect_s3_buckets
+}
+
+def parse_fields(value):
+    """--fields as {service: FieldSpec}; fields without a service: prefix apply to every service"""
+    services = list(REGIONAL_COLLECTORS) + list(GLOBAL_COLLECTORS)
+    common = []
+    specific = {}
+    for field in split_fields(value):
+        service, sep, path = field.partition(':')
+        if not sep:
+            common.append(field)
+        elif service in services:
+            specific.setdefault(service, []).append(path)
+        else:
+            raise ValueError(f"Unknown service in --fields: {service}")
+    return {service: FieldSpec(common + specific.get(service, []))
+            for service in services if common or service in specific}
+
+def run_sweep(pool, regions, sink, services=None, max_workers=32, skip=(), fields=None):
+    """Run every (region, service) collector concurrently and stream records to the sink
+
+    Global services run once for the whole sweep. (service, region) pairs
+    in skip, region None for global services, were answered elsewhere and
+    are not collected. fields ({service: FieldSpec}, see parse_fields)
+    replaces a collector's own fields. Returns the number of records written.
+    """
+    services = services or list(REGIONAL_COLLECTORS) + list(GLOBAL_COLLECTORS)
+    fields = fields or {}
+
+    def drain(collector, region, service_fields):
+        # Materialize inside the worker so pagination happens off the main thread
+        return list(collector(pool, region, fields=service_fields))
+
+    tasks = {}
+    for service in services:
+        if service in GLOBAL_COLLECTORS:
+            if (service, None) not in skip:
+                tasks[(service, None)] = lambda c=GLOBAL_COLLECTORS[service], f=fields.get(service): drain(c, None, f)
+        elif service in REGIONAL_COLLECTORS:
+            for region in regions:
+                if (service, region) not in skip:
+                    tasks[(service, region)] = (lambda c=REGIONAL_COLLECTORS[service], r=region, f=fields.get(service):
+                                                drain(c, r, f))
+
+    count = 0
+    for (service, region), records, error in run_concurrently(tasks, max_workers):
+        if error is not None:
+            sink.error(service, region, str(error))
+            continue
+        for record in records:
+            sink.write(record)
+        count += len(records)
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Enumerate EC2, S3, RDS, ElastiCache and Lambda across regions in one process')
+    parser.add_argument('--profile', help='AWS profile name to use')
+    parser.add_argument('--access-key', help='AWS Access Key (plain or base64 encoded)')
+    parser.add_argument('--secret-key', help='AWS Secret Key (plain or base64 encoded)')
+    parser.add_argument('--region', action='append', help='Region to sweep (repeatable, default: all enabled regions)')
+    parser.add_argument('--services', help='Comma-separated services to sweep (default: %s)' %
+                        ','.join(list(REGIONAL_COLLECTORS) + list(GLOBAL_COLLECTORS)))
+    parser.add_argument('--format', choices=['table', 'jsonl'], default='table', help='Output format')
+    parser.add_argument('--output', help='Write JSONL output to this file instead of stdout')
+    parser.add_argument('--workers', type=int, default=32, help='Maximum concurrent API tasks')
+    parser.add_argument('--fields', help='Comma-separated response fields to keep per resource instead of the default '
+                        'columns, dotted for nested ones (e.g. Placement.AvailabilityZone); prefix with service: '
+                        'to apply a field to one service only')
+    parser.add_argument('--wide', action='store_true',
+                        help='List every tagged resource of every service via the Resource Groups Tagging API')
+    parser.add_argument('--describe', help='With --wide, comma-separated resource types to describe (available: %s)' %
+                        ','.join(DESCRIBERS))
+    parser.add_argument('--config', action='store_true',
+                        help='Answer %s from AWS Config advanced query where a recorder or aggregator covers them' %
+                        ','.join(CONFIG_TYPES))
+    parser.add_argument('--aggregator', help='With --config, Config aggregator to query (default: first one found)')
+    parser.add_argument('--config-region', help='With --config, region holding the aggregator (default: session region or us-east-1)')
+    parser.add_argument('--inventory', nargs='?', const=DEFAULT_INVENTORY, metavar='DB',
+                        help=f'Also store results in the local inventory (default DB: {DEFAULT_INVENTORY})')
+    add_budget_arguments(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args(argv)
+    from botocore.exceptions import ClientError, NoCredentialsError
+    install_from_args(args)
+    budget = budget_from_args(parser, args)
+
+    if bool(args.access_key) != bool(args.secret_key):
+        parser.error("--access-key and --secret-key must be given together")
+
+    pool = ClientPool(
+        access_key=decode_base64_key(args.access_key) if args.access_key else None,
+        secret_key=decode_base64_key(args.secret_key) if args.secret_key else None,
+        profile=args.profile
+    )
+    services = args.services.split(',') if args.services else None
+    if args.fields and args.wide:
+        parser.error("--fields applies to the direct sweep and --config fallback, not to --wide")
+    try:
+        fields = parse_fields(args.fields)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        regions = args.region or pool.get_all_regions()
+        account = pool.get_account_id() if args.inventory or args.config else None
+        # --config only skips the direct S3 listing when Config covers every enabled region
+        enabled_regions = pool.get_all_regions() if args.config and args.region else regions
+    except (ClientError, NoCredentialsError, BudgetExceeded) as e:
+        print(f"Error listing regions: {e}", file=sys.stderr)
+        return 1
+
+    sink = open_sink(args.format, args.output, title='AWS Resources Across All Regions')
+    if args.inventory:
+        sink = TeeSink(sink, InventorySink(Inventory(args.inventory), account))
+    with sink:
+        if args.wide:
+            describe_types = args.describe.split(',') if args.describe else []
+            try:
+                count, calls = run_wide(pool, regions, sink, describe_types, args.workers)
+            except ValueError as e:
+                parser.error(str(e))
+            print(f"Wide inventory: {count} resources in {calls} API calls", file=sys.stderr)
+        elif args.config:
+            sweep_services = services or list(REGIONAL_COLLECTORS) + list(GLOBAL_COLLECTORS)
+            try:
+                records, covered, report = collect_from_config(
+                    pool, regions, sweep_services, args.aggregator, args.config_region, args.workers,
+                    account, enabled_regions)
+            except ClientError as e:
+                print(f"Error querying aggregator {args.aggregator}: {e}", file=sys.stderr)
+                return 1
+            for record in records:
+                sink.write(record)
+            fallback = run_sweep(pool, regions, sink, sweep_services, args.workers, skip=covered, fields=fields)
+            print(f"Config path: {report['path']}, {len(records)} resources in {report['config_calls']} API calls; "
+                  f"direct describe calls for the rest ({fallback} resources); "
+                  f"~{report['calls_saved']} API calls saved (estimated)", file=sys.stderr)
+            if report.get('error'):
+                print(f"Config: {report['error']}", file=sys.stderr)
+        else:
+            run_sweep(pool, regions, sink, services, args.workers, fields=fields)
+    if budget is not None:
+        display_budget(budget)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
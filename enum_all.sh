@@ -1,22 +1,7 @@
 #!/bin/bash
 
-# Main script to enumerate AWS resources across all regions
+# Enumerate AWS resources across all regions.
+# The sweep now runs in-process in enum_all.py; this wrapper keeps the old
+# entry point working. Pass --profile, --region, --format jsonl, etc.
 
-# Get all AWS regions
-REGIONS=$(aws ec2 describe-regions --query "Regions[].RegionName" --output text --profile account_903894642427)
-
-echo "Starting enumeration of AWS resources across all regions..."
-echo "---------------------------------------------------------"
-
-# Loop through each region and call individual service scripts
-for REGION in $REGIONS; do
-  echo "Processing region: $REGION"
-  ./list_ec2_instances.sh "$REGION"
-  ./list_s3_buckets.sh "$REGION"
-  ./list_rds_instances.sh "$REGION"
-  ./list_elasticache_redis.sh "$REGION"
-  ./list_lambda_functions.sh "$REGION"
-  echo "---------------------------------------------------------"
-done
-
-echo "Enumeration complete!"
+exec python3 "$(dirname "$0")/enum_all.py" "$@"
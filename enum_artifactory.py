@@ -1,11 +1,9 @@
-import requests
 import argparse
-from rich.console import Console
-from rich.table import Table
-from rich import box
-import json
 
-def probe_artifactory_endpoints(artifactory_url, username, jwt):
+from cassette import add_cassette_arguments, http_request, install_from_args
+from http_cache import default_cache
+
+def probe_artifactory_endpoints(artifactory_url, username, jwt, cache=None, refresh=False):
     """
     Dynamically probe Artifactory API endpoints and display sample data in rich text tables
     
@@ -13,22 +11,30 @@ def probe_artifactory_endpoints(artifactory_url, username, jwt):
         artifactory_url (str): Base URL of the Artifactory instance
         username (str): Artifactory username
         jwt (str): JWT token for authentication
+        cache (http_cache.HttpCache): Conditional-request cache for GET endpoints, or None
+        refresh (bool): Ignore endpoint TTLs and revalidate every cached response
     """
+    import requests
+    from rich.console import Console
+    from rich.table import Table
+    from rich import box
     # Set up headers with JWT authentication
     headers = {
         "Authorization": f"Bearer {jwt}",
         "Content-Type": "application/json"
     }
     
-    # Define common Artifactory API endpoints (based on JFrog REST API docs)
+    # Define common Artifactory API endpoints (based on JFrog REST API docs).
+    # ttl: seconds a cached response is served without asking the server;
+    # after that it is revalidated with its ETag/Last-Modified, if any.
     endpoints = {
-        "System Version": {"path": "/api/system/version", "method": "GET"},
+        "System Version": {"path": "/api/system/version", "method": "GET", "ttl": 3600},
         "Repositories": {"path": "/api/repositories", "method": "GET"},
-        "Storage Summary": {"path": "/api/storageinfo", "method": "GET"},
+        "Storage Summary": {"path": "/api/storageinfo", "method": "GET", "ttl": 3600},  # Expensive on the server
         "Users": {"path": "/api/security/users", "method": "GET"},  # Requires admin
         "Groups": {"path": "/api/security/groups", "method": "GET"},  # Requires admin
         "Permissions": {"path": "/api/security/permissions", "method": "GET"},  # Requires admin
-        "Builds": {"path": "/api/build", "method": "GET"},
+        "Builds": {"path": "/api/build", "method": "GET", "ttl": 600},  # Sends no validators
         "AQL Search (Sample)": {
             "path": "/api/search/aql",
             "method": "POST",
@@ -46,11 +52,14 @@ def probe_artifactory_endpoints(artifactory_url, username, jwt):
             data = config.get("data", None)
             
             # Make the API request
-            if method == "GET":
-                response = requests.get(url, headers=headers, timeout=10)
+            if method == "GET" and cache is not None:
+                ttl = 0 if refresh else config.get("ttl", 0)
+                response = cache.request("GET", url, headers=headers, ttl=ttl, timeout=10)
+            elif method == "GET":
+                response = http_request("GET", url, headers=headers, timeout=10)
             elif method == "POST":
                 headers["Content-Type"] = "text/plain"  # AQL uses plain text
-                response = requests.post(url, headers=headers, data=data, timeout=10)
+                response = http_request("POST", url, headers=headers, data=data, timeout=10)
             
             # Check if request was successful
             response.raise_for_status()
@@ -98,19 +107,29 @@ def probe_artifactory_endpoints(artifactory_url, username, jwt):
         except ValueError as e:
             console.print(f"[red]Error parsing response for {endpoint_name} ({config['path']}): {str(e)}[/red]")
             console.print("")
+    
+    if cache is not None:
+        console.print(f"[dim]HTTP cache: {cache.hits} served from disk, {cache.revalidated} revalidated, "
+                      f"{cache.fetched} fetched, {cache.bytes_received / 1024:.1f} KiB received[/dim]")
 
-def main():
+def main(argv=None):
     # Set up argument parser
     parser = argparse.ArgumentParser(description="Probe all Artifactory API endpoints and display sample data")
     parser.add_argument("--url", required=True, help="Artifactory instance URL (e.g., https://your-artifactory.jfrog.io/artifactory)")
     parser.add_argument("--username", required=True, help="Artifactory username")
     parser.add_argument("--jwt", required=True, help="JWT token for authentication")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use or update the HTTP response cache")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Revalidate every cached response instead of trusting endpoint TTLs")
+    add_cassette_arguments(parser)
     
     # Parse arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    install_from_args(args)
     
     print("Probing Artifactory API endpoints...")
-    probe_artifactory_endpoints(args.url, args.username, args.jwt)
+    cache = None if args.no_cache else default_cache()
+    probe_artifactory_endpoints(args.url, args.username, args.jwt, cache, args.refresh)
 
 if __name__ == "__main__":
     # Install required packages:
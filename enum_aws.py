@@ -1,10 +1,13 @@
-import boto3
 import base64
-from botocore.exceptions import ClientError
-from rich.console import Console
-from rich.table import Table
 import argparse
 import csv
+from cassette import add_cassette_arguments, install_from_args
+from credential_cache import caller_identity
+from journal import RunJournal, add_journal_arguments, run_unit
+from budget import BudgetExceeded, add_budget_arguments, budget_from_args, display_budget
+from progress import add_progress_arguments, plan_units, progress_from_args, tracked
+from aws_clients import (DEAD_REGION_CODES, ClientPool, Deadline, DeadlineExceeded, DeadRegionCache,
+                         add_timeout_arguments, client_config, is_dead_region_error, new_session)
 
 def decode_base64_key(encoded_key):
     """Decode base64 encoded key if necessary and return both versions"""
@@ -14,151 +17,280 @@ def decode_base64_key(encoded_key):
     except:
         return encoded_key, encoded_key  # Return original as both if not base64 encoded
 
-def get_user_id(access_key, secret_key):
-    """Get AWS user ID using the provided credentials"""
-    try:
-        sts_client = boto3.client(
-            'sts',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key
-        )
-        identity = sts_client.get_caller_identity()
+def get_user_id(access_key, secret_key, journal=None):
+    """Get AWS user ID using the provided credentials (cached across runs, see credential_cache)
+
+    Only successful lookups are journaled, so a resume retries a failed one.
+    """
+    from botocore.exceptions import ClientError
+    def lookup():
+        identity = caller_identity(ClientPool(access_key, secret_key))
         return identity['UserId'], identity['Arn']
+    try:
+        user_id, arn = run_unit(journal, [access_key, 'sts', None, 'GetCallerIdentity'], lookup)
+        return user_id, arn
     except ClientError as e:
         return None, f"Error: {str(e)}"
 
-def get_all_regions():
-    """Get list of all available AWS regions"""
+def get_all_regions(access_key=None, secret_key=None):
+    """Get list of all available AWS regions, with the given keys or the default credential chain"""
+    if access_key:
+        return ClientPool(access_key, secret_key).get_all_regions()
+    import boto3
     ec2_client = boto3.client('ec2')
     regions = [region['RegionName'] for region in ec2_client.describe_regions()['Regions']]
     return regions
 
-def check_service_permissions(access_key, secret_key, all_regions=False):
-    """Check basic permissions for AWS services across regions if specified"""
+def call_action(client, service, action):
+    """Make the cheapest call that exercises a probed action"""
+    if service == 's3' and action == 'ListBuckets':
+        client.list_buckets()
+    elif service == 'iam' and action == 'ListUsers':
+        client.list_users(MaxItems=1)
+    elif service == 'route53' and action == 'ListHostedZones':
+        client.list_hosted_zones(MaxItems='1')
+    elif service == 'cloudfront' and action == 'ListDistributions':
+        client.list_distributions(MaxItems='1')
+    elif service == 'ec2' and action == 'DescribeInstances':
+        client.describe_instances(MaxResults=5)
+    elif service == 'ec2' and action == 'DescribeVolumes':
+        client.describe_volumes(MaxResults=5)
+    elif service == 'lambda' and action == 'ListFunctions':
+        client.list_functions(MaxItems=1)
+    elif service == 'dynamodb' and action == 'ListTables':
+        client.list_tables(Limit=1)
+    elif service == 'rds' and action == 'DescribeDBInstances':
+        client.describe_db_instances()
+    elif service == 'sns' and action == 'ListTopics':
+        client.list_topics()
+    elif service == 'sqs' and action == 'ListQueues':
+        client.list_queues()
+    elif service == 'ecs' and action == 'ListClusters':
+        client.list_clusters()
+    elif service == 'eks' and action == 'ListClusters':
+        client.list_clusters()
+    elif service == 'elasticbeanstalk' and action == 'ListApplications':
+        client.describe_applications()
+    elif service == 'cloudwatch' and action == 'ListMetrics':
+        client.list_metrics()
+    elif service == 'autoscaling' and action == 'DescribeAutoScalingGroups':
+        client.describe_auto_scaling_groups(MaxRecords=1)
+    elif service == 'elb' and action == 'DescribeLoadBalancers':
+        client.describe_load_balancers(PageSize=1)
+    elif service == 'elbv2' and action == 'DescribeLoadBalancers':
+        client.describe_load_balancers(PageSize=1)
+    elif service == 'kms' and action == 'ListKeys':
+        client.list_keys(Limit=1)
+    elif service == 'secretsmanager' and action == 'ListSecrets':
+        client.list_secrets(MaxResults=1)
+    elif service == 'ssm' and action == 'ListDocuments':
+        client.list_documents(MaxResults=1)
+    elif service == 'stepfunctions' and action == 'ListStateMachines':
+        client.list_state_machines(maxResults=1)
+    elif service == 'glue' and action == 'GetDatabases':
+        client.get_databases()
+    elif service == 'athena' and action == 'ListWorkGroups':
+        client.list_work_groups()
+    elif service == 'redshift' and action == 'DescribeClusters':
+        client.describe_clusters(MaxRecords=20)
+    elif service == 'cloudformation' and action == 'ListStacks':
+        client.list_stacks()
+
+# Read-only actions probed per service; collector.py inventories the same operations
+SERVICE_PROBES = {
+    's3': ['ListBuckets'],
+    'iam': ['ListUsers'],
+    'route53': ['ListHostedZones'],
+    'cloudfront': ['ListDistributions'],
+    'ec2': ['DescribeInstances', 'DescribeVolumes'],
+    'lambda': ['ListFunctions'],
+    'dynamodb': ['ListTables'],
+    'rds': ['DescribeDBInstances'],
+    'sns': ['ListTopics'],
+    'sqs': ['ListQueues'],
+    'ecs': ['ListClusters'],
+    'eks': ['ListClusters'],
+    'elasticbeanstalk': ['ListApplications'],
+    'cloudwatch': ['ListMetrics'],
+    'autoscaling': ['DescribeAutoScalingGroups'],
+    'elb': ['DescribeLoadBalancers'],
+    'elbv2': ['DescribeLoadBalancers'],
+    'kms': ['ListKeys'],
+    'secretsmanager': ['ListSecrets'],
+    'ssm': ['ListDocuments'],
+    'stepfunctions': ['ListStateMachines'],
+    'glue': ['GetDatabases'],
+    'athena': ['ListWorkGroups'],
+    'redshift': ['DescribeClusters'],
+    'cloudformation': ['ListStacks']
+}
+
+# Probe order under a call budget: lower tiers first, each across all regions
+PROBE_PRIORITY = {
+    'iam': 0, 's3': 0, 'secretsmanager': 0, 'kms': 0, 'ssm': 0, 'lambda': 0, 'ec2': 0,
+    'rds': 1, 'dynamodb': 1, 'eks': 1, 'ecs': 1, 'cloudformation': 1, 'redshift': 1, 'glue': 1,
+    'elasticbeanstalk': 1, 'route53': 1, 'cloudfront': 1
+}
+
+# Across regions, each regional service is probed in a canary region
+# first (the session's default region when it is probed). Identity
+# policies apply in every region, so an action the canary refuses for
+# lack of an identity-based allow is reported as "Denied (inferred)"
+# everywhere else without a call. Denies that can hinge on the region
+# (SCPs, permissions boundaries, session and resource policies, and
+# explicit denies, which usually carry a condition) are probed in every
+# region, as are actions the canary allows. --exhaustive probes every
+# region regardless.
+
+# Error codes services use to refuse an action for lack of permission
+ACCESS_DENIED_CODES = {'AccessDenied', 'AccessDeniedException', 'UnauthorizedOperation', 'UnauthorizedAccess',
+                       'AuthorizationError', 'AuthorizationErrorException', 'NotAuthorized'}
+
+# Phrases in a denial message marking a deny that may not hold in every region
+CONDITIONAL_DENY_HINTS = ('service control policy', 'permissions boundary', 'session policy',
+                          'resource-based policy', 'endpoint policy', 'explicit deny', 'region')
+
+INFERRED_DENIAL = 'Denied (inferred)'
+
+def denial_scope(error):
+    """'identity' for a denial that holds in every region, 'conditional' for one that may not, None if not a denial
+
+    Opaque denials (EC2's encoded UnauthorizedOperation) count as identity denials.
+    """
+    details = error.response.get('Error', {})
+    if details.get('Code') not in ACCESS_DENIED_CODES:
+        return None
+    message = (details.get('Message') or '').lower()
+    if any(hint in message for hint in CONDITIONAL_DENY_HINTS):
+        return 'conditional'
+    return 'identity'
+
+def probe_units(regions):
+    """(service, region, label) of each service probed in a sweep of regions ([None]: the default region)"""
+    global_services = ['s3', 'iam', 'route53', 'cloudfront']
+    return [(service, region, f"{service} ({region})" if region else service) for service in SERVICE_PROBES
+            for region in ([None] if service in global_services else regions)]
+
+def check_service_permissions(access_key, secret_key, all_regions=False, journal=None, deadline=None,
+                              dead_regions=None, connect_timeout=5, read_timeout=30, max_attempts=3,
+                              session_token=None, regions=None, budget=None, exhaustive=False,
+                              dead_region_key=None):
+    """Check basic permissions for AWS services across regions if specified
+
+    A region answering with an auth failure or connect timeout is marked
+    dead in dead_regions (a DeadRegionCache) and its remaining probes are
+    skipped; a read timeout only skips that service in the region.
+    Probes not started before the deadline are reported as incomplete.
+    With all_regions, a regions list skips the DescribeRegions lookup.
+    With a budget (budget.CallBudget), probes run in PROBE_PRIORITY order
+    and those it cannot cover are reported as "Skipped (budget)".
+    Unless exhaustive, identity denials seen in the canary region are
+    inferred for the other regions (see above). Dead regions are recorded
+    under dead_region_key (default: the access key), so keys of one
+    account can share them.
+    """
+    from botocore.exceptions import BotoCoreError, ClientError
     permissions = {}
     
-    services_to_test = {
-        's3': ['ListBuckets'],
-        'iam': ['ListUsers'],
-        'route53': ['ListHostedZones'],
-        'cloudfront': ['ListDistributions'],
-        'ec2': ['DescribeInstances', 'DescribeVolumes'],
-        'lambda': ['ListFunctions'],
-        'dynamodb': ['ListTables'],
-        'rds': ['DescribeDBInstances'],
-        'sns': ['ListTopics'],
-        'sqs': ['ListQueues'],
-        'ecs': ['ListClusters'],
-        'eks': ['ListClusters'],
-        'elasticbeanstalk': ['ListApplications'],
-        'cloudwatch': ['ListMetrics'],
-        'autoscaling': ['DescribeAutoScalingGroups'],
-        'elb': ['DescribeLoadBalancers'],
-        'elbv2': ['DescribeLoadBalancers'],
-        'kms': ['ListKeys'],
-        'secretsmanager': ['ListSecrets'],
-        'ssm': ['ListDocuments'],
-        'stepfunctions': ['ListStateMachines'],
-        'glue': ['GetDatabases'],
-        'athena': ['ListWorkGroups'],
-        'redshift': ['DescribeClusters'],
-        'cloudformation': ['ListStacks']
-    }
+    if not all_regions:
+        regions = [None]
+    elif regions is None:
+        try:
+            regions = run_unit(journal, [access_key, 'ec2', None, 'DescribeRegions'], get_all_regions)
+        except BudgetExceeded:
+            regions = [None]  # no budget left to list regions: probe the default region only
+    # A session of our own: the default one is shared and not safe to create clients from concurrently
+    session = new_session(access_key, secret_key, session_token=session_token)
+    if deadline is not None:
+        session.events.register('before-send', deadline.before_send)
+    clients = {}
+    canary = None
+    if not exhaustive and len(regions) > 1:
+        canary = session.region_name if session.region_name in regions else regions[0]
+        regions = [canary] + [region for region in regions if region != canary]
+    identity_denied = set()  # (service, action) refused by identity policies in the canary region
+
+    def probe(service, region, action):
+        """True if the action is allowed, else its denial_scope or False; clients are only created once a call is needed"""
+        client = clients.get((service, region))
+        if client is None:
+            client = clients[(service, region)] = session.client(
+                service,
+                region_name=region,
+                config=client_config(connect_timeout, read_timeout, max_attempts, deadline)
+            )
+        try:
+            call_action(client, service, action)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in DEAD_REGION_CODES:
+                raise  # the whole region is unusable, not just this action
+            return denial_scope(e) or False
     
-    regions = get_all_regions() if all_regions else [None]
+    units = probe_units(regions)
+    plan = list(units)
+    if budget is not None:
+        budget.plan(sum(len(SERVICE_PROBES[service]) for service, _, _ in plan))
+        # When the budget may not cover the whole plan, the most valuable probes go first
+        region_order = {region: index for index, region in enumerate(regions)}
+        plan.sort(key=lambda unit: (PROBE_PRIORITY.get(unit[0], 2), region_order.get(unit[1], 0)))
     
-    for service, actions in services_to_test.items():
-        service_permissions = {}
-        global_services = ['s3', 'iam', 'route53', 'cloudfront']
-        if service in global_services:
-            regions = [None]
+    plan_units(len(plan))
+    for service, region, label in tracked(plan):
+        actions = SERVICE_PROBES[service]
+        reason = dead_regions.reason(dead_region_key or access_key, region, service) if dead_regions and region else None
+        if reason:
+            permissions[label] = [f"Skipped ({reason})"]
+            continue
+        if deadline and deadline.expired():
+            permissions[label] = ["Incomplete (deadline)"]
+            continue
+        try:
+            allowed_actions = []
+            inferred = 0
+            for index, action in enumerate(actions):
+                if region != canary and (service, action) in identity_denied:
+                    inferred += 1
+                    continue
+                if budget is not None and budget.remaining(service) == 0:
+                    for skipped in actions[index:]:
+                        budget.skip(service, skipped)
+                    allowed_actions.append("Skipped (budget)")
+                    break
+                unit = [access_key, service, region, action]
+                try:
+                    result = run_unit(journal, unit, lambda: probe(service, region, action))
+                except BudgetExceeded:
+                    allowed_actions.append("Skipped (budget)")
+                    break
+                if result is True:
+                    allowed_actions.append(action)
+                elif result == 'identity' and region is not None and region == canary:
+                    identity_denied.add((service, action))
             
-        for region in regions:
-            try:
-                client = boto3.client(
-                    service,
-                    aws_access_key_id=access_key,
-                    aws_secret_access_key=secret_key,
-                    region_name=region
-                )
-                
-                allowed_actions = []
-                for action in actions:
-                    try:
-                        if service == 's3' and action == 'ListBuckets':
-                            client.list_buckets()
-                        elif service == 'iam' and action == 'ListUsers':
-                            client.list_users(MaxItems=1)
-                        elif service == 'route53' and action == 'ListHostedZones':
-                            client.list_hosted_zones(MaxItems='1')
-                        elif service == 'cloudfront' and action == 'ListDistributions':
-                            client.list_distributions(MaxItems='1')
-                        elif service == 'ec2' and action == 'DescribeInstances':
-                            client.describe_instances(MaxResults=5)
-                        elif service == 'ec2' and action == 'DescribeVolumes':
-                            client.describe_volumes(MaxResults=5)
-                        elif service == 'lambda' and action == 'ListFunctions':
-                            client.list_functions(MaxItems=1)
-                        elif service == 'dynamodb' and action == 'ListTables':
-                            client.list_tables(Limit=1)
-                        elif service == 'rds' and action == 'DescribeDBInstances':
-                            client.describe_db_instances()
-                        elif service == 'sns' and action == 'ListTopics':
-                            client.list_topics()
-                        elif service == 'sqs' and action == 'ListQueues':
-                            client.list_queues()
-                        elif service == 'ecs' and action == 'ListClusters':
-                            client.list_clusters()
-                        elif service == 'eks' and action == 'ListClusters':
-                            client.list_clusters()
-                        elif service == 'elasticbeanstalk' and action == 'ListApplications':
-                            client.describe_applications()
-                        elif service == 'cloudwatch' and action == 'ListMetrics':
-                            client.list_metrics()
-                        elif service == 'autoscaling' and action == 'DescribeAutoScalingGroups':
-                            client.describe_auto_scaling_groups(MaxRecords=1)
-                        elif service == 'elb' and action == 'DescribeLoadBalancers':
-                            client.describe_load_balancers(PageSize=1)
-                        elif service == 'elbv2' and action == 'DescribeLoadBalancers':
-                            client.describe_load_balancers(PageSize=1)
-                        elif service == 'kms' and action == 'ListKeys':
-                            client.list_keys(Limit=1)
-                        elif service == 'secretsmanager' and action == 'ListSecrets':
-                            client.list_secrets(MaxResults=1)
-                        elif service == 'ssm' and action == 'ListDocuments':
-                            client.list_documents(MaxResults=1)
-                        elif service == 'stepfunctions' and action == 'ListStateMachines':
-                            client.list_state_machines(maxResults=1)
-                        elif service == 'glue' and action == 'GetDatabases':
-                            client.get_databases()
-                        elif service == 'athena' and action == 'ListWorkGroups':
-                            client.list_work_groups()
-                        elif service == 'redshift' and action == 'DescribeClusters':
-                            client.describe_clusters(MaxRecords=20)
-                        elif service == 'cloudformation' and action == 'ListStacks':
-                            client.list_stacks()
-                        
-                        allowed_actions.append(action)
-                    except ClientError:
-                        continue
-                
-                if region:
-                    service_permissions[f"{service} ({region})"] = allowed_actions if allowed_actions else ["None"]
-                else:
-                    service_permissions[service] = allowed_actions if allowed_actions else ["None"]
-            except ClientError:
-                if region:
-                    service_permissions[f"{service} ({region})"] = ["Access Denied"]
-                else:
-                    service_permissions[service] = ["Access Denied"]
-        
-        permissions.update(service_permissions)
+            if allowed_actions:
+                permissions[label] = allowed_actions
+            else:
+                permissions[label] = [INFERRED_DENIAL] if inferred == len(actions) else ["None"]
+        except DeadlineExceeded:
+            permissions[label] = ["Incomplete (deadline)"]
+        except (ClientError, BotoCoreError) as e:
+            if region and dead_regions and is_dead_region_error(e):
+                permissions[label] = [f"Skipped ({dead_regions.mark_dead(dead_region_key or access_key, region, e, service)})"]
+            elif isinstance(e, ClientError):
+                permissions[label] = ["Access Denied"]
+            else:
+                # A timeout or connection error on this probe; keep the rest of the sweep
+                permissions[label] = [f"Incomplete ({type(e).__name__})"]
     
-    return permissions
+    # Report in service order, whatever order the probes ran in
+    return {label: permissions[label] for _, _, label in units}
 
 def display_results(user_id, arn, permissions, access_key_decoded, access_key_encoded, 
                    secret_key_decoded, secret_key_encoded):
     """Display results in a rich table format including encoded/decoded keys"""
+    from rich.console import Console
+    from rich.table import Table
     console = Console()
     
     # Display user info
@@ -179,49 +311,168 @@ def display_results(user_id, arn, permissions, access_key_decoded, access_key_en
     table.add_row("", "")  # Empty row for separation
     
     # Add service permissions
+    inferred = 0
     for service_region, actions in permissions.items():
-        table.add_row(service_region.upper(), ", ".join(actions))
+        if actions == [INFERRED_DENIAL]:
+            inferred += 1
+            table.add_row(service_region.upper(), f"[dim]{INFERRED_DENIAL}[/dim]")
+        else:
+            table.add_row(service_region.upper(), ", ".join(actions))
     
     console.print(table)
+    if inferred:
+        console.print(f"[dim]{inferred} service/region entries inferred from the canary region's identity denial, "
+                      f"without calling them (--exhaustive probes every region)[/dim]")
 
-def process_credentials(access_key_input, secret_key_input, all_regions):
+def process_credentials(access_key_input, secret_key_input, all_regions, journal=None, limits=None):
     """Process a single set of credentials"""
+    from rich.console import Console
     # Get both decoded and encoded versions
     access_key_decoded, access_key_encoded = decode_base64_key(access_key_input.strip())
     secret_key_decoded, secret_key_encoded = decode_base64_key(secret_key_input.strip())
     
-    user_id, arn = get_user_id(access_key_decoded, secret_key_decoded)
-    
     console = Console()
+    try:
+        user_id, arn = get_user_id(access_key_decoded, secret_key_decoded, journal)
+    except BudgetExceeded as e:
+        console.print(f"\n[bold yellow]Skipping {access_key_decoded[:6]}...: {e}[/bold yellow]")
+        return
+    
     if user_id:
         console.print(f"\n[bold blue]Processing credentials: {access_key_decoded[:6]}...[/bold blue]")
-        permissions = check_service_permissions(access_key_decoded, secret_key_decoded, all_regions)
+        permissions = check_service_permissions(access_key_decoded, secret_key_decoded, all_regions, journal,
+                                                **(limits or {}))
         display_results(user_id, arn, permissions, 
                        access_key_decoded, access_key_encoded,
                        secret_key_decoded, secret_key_encoded)
     else:
         console.print(f"\n[bold red]Failed to authenticate with {access_key_decoded[:6]}...: {arn}[/bold red]")
 
-def main():
-    parser = argparse.ArgumentParser(description='AWS Key Enumeration Tool')
-    group = parser.add_mutually_exclusive_group(required=True)
-    group.add_argument('--access-key', help='AWS Access Key (plain or base64 encoded)')
-    group.add_argument('--file', help='File containing comma-separated access_key,secret_key pairs')
-    parser.add_argument('--secret-key', help='AWS Secret Key (plain or base64 encoded)')
-    parser.add_argument('--all-regions', action='store_true', help='Check permissions across all regions')
-    args = parser.parse_args()
-    
+# A --file run deduplicates rows by access key, calls GetCallerIdentity
+# once per key and groups the keys by account. The region list and dead
+# regions are account-wide, so they are fetched and recorded once per
+# account and shared by its keys; only the permission probes, which depend
+# on the principal, are repeated for every key.
+
+class AccountKeys:
+    """Keys of one account in a --file run and the account-wide results they share"""
+
+    def __init__(self, account_id):
+        self.account_id = account_id
+        self.keys = []  # (access key, secret key, encoded access key, encoded secret key, user ID, ARN)
+        self.regions = None
+        self.dead_regions = set()
+        self.calls_saved = 0
+
+def read_credential_file(path):
+    """Valid access_key,secret_key rows of a CSV file, and a count of duplicate rows per decoded access key"""
+    from collections import Counter
+    from rich.console import Console
+    rows = []
+    duplicates = Counter()
+    seen = set()
+    with open(path, 'r') as f:
+        for row in csv.reader(f):
+            if len(row) != 2:
+                Console().print(f"[bold red]Invalid format in file: {row}. Expected: access_key,secret_key[/bold red]")
+                continue
+            access_key = decode_base64_key(row[0].strip())[0]
+            if access_key in seen:
+                duplicates[access_key] += 1
+                continue
+            seen.add(access_key)
+            rows.append(row)
+    return rows, duplicates
+
+def process_credential_file(path, all_regions, journal=None, limits=None):
+    """Process every key of a CSV file, sharing account-wide results between keys of one account"""
+    from botocore.exceptions import ClientError
+    from rich.console import Console
+    console = Console()
+    limits = dict(limits or {})
+    dead_regions = limits.get('dead_regions')
+    rows, duplicates = read_credential_file(path)
+
+    accounts = {}
+    for access_key_input, secret_key_input in rows:
+        access_key_decoded, access_key_encoded = decode_base64_key(access_key_input.strip())
+        secret_key_decoded, secret_key_encoded = decode_base64_key(secret_key_input.strip())
+        try:
+            user_id, arn = get_user_id(access_key_decoded, secret_key_decoded, journal)
+        except BudgetExceeded as e:
+            console.print(f"\n[bold yellow]Skipping {access_key_decoded[:6]}...: {e}[/bold yellow]")
+            continue
+        if not user_id:
+            console.print(f"\n[bold red]Failed to authenticate with {access_key_decoded[:6]}...: {arn}[/bold red]")
+            continue
+        account_id = arn.split(':')[4]
+        accounts.setdefault(account_id, AccountKeys(account_id)).keys.append(
+            (access_key_decoded, secret_key_decoded, access_key_encoded, secret_key_encoded, user_id, arn))
+
+    for account in accounts.values():
+        for index, (access_key, secret_key, access_key_encoded, secret_key_encoded, user_id, arn) in enumerate(
+                account.keys):
+            if all_regions and account.regions is None:
+                try:
+                    account.regions = run_unit(journal, [access_key, 'ec2', None, 'DescribeRegions'],
+                                               lambda: get_all_regions(access_key, secret_key))
+                except (ClientError, BudgetExceeded):
+                    pass  # check_service_permissions falls back to its own lookup
+            elif all_regions:
+                account.calls_saved += 1  # DescribeRegions
+            # Without sharing, each key would spend a failing call on every region already found dead
+            account.calls_saved += len(account.dead_regions) if index else 0
+
+            console.print(f"\n[bold blue]Processing credentials: {access_key[:6]}... "
+                          f"(account {account.account_id})[/bold blue]")
+            permissions = check_service_permissions(access_key, secret_key, all_regions, journal,
+                                                    regions=account.regions, dead_region_key=account.account_id,
+                                                    **limits)
+            if dead_regions is not None:
+                account.dead_regions = {region for region in account.regions or []
+                                        if dead_regions.reason(account.account_id, region)}
+            # Each duplicate row is skipped outright: its GetCallerIdentity, DescribeRegions and every probe
+            probes = sum(len(SERVICE_PROBES[service]) for service, _, _ in probe_units(account.regions or [None]))
+            account.calls_saved += duplicates[access_key] * (1 + (1 if all_regions else 0) + probes)
+            display_results(user_id, arn, permissions, access_key, access_key_encoded,
+                            secret_key, secret_key_encoded)
+    display_accounts(accounts, duplicates)
+
+def display_accounts(accounts, duplicates):
+    """Keys per account in a --file run and the calls saved by sharing account-wide results"""
+    from rich.console import Console
+    from rich.table import Table
+    console = Console()
+
+    table = Table(title="Keys by Account")
+    table.add_column("Account", style="cyan")
+    table.add_column("Keys", justify="right", style="green")
+    table.add_column("Principals", style="magenta")
+    table.add_column("Calls Saved", justify="right", style="yellow")
+    for account in accounts.values():
+        principals = sorted({key[5] for key in account.keys})
+        table.add_row(account.account_id, str(len(account.keys)), "\n".join(principals), str(account.calls_saved))
+    console.print()
+    console.print(table)
+    console.print(f"{len(accounts)} accounts, {sum(len(account.keys) for account in accounts.values())} unique keys, "
+                  f"{sum(duplicates.values())} duplicate rows skipped, "
+                  f"{sum(account.calls_saved for account in accounts.values())} API calls saved")
+
+def run_credentials(args, journal, budget=None):
+    """Process the credentials given on the command line or in --file"""
+    from rich.console import Console
+    limits = {
+        'budget': budget,
+        'deadline': Deadline(args.deadline),
+        'dead_regions': DeadRegionCache(ttl=args.dead_region_ttl),
+        'connect_timeout': args.connect_timeout,
+        'read_timeout': args.read_timeout,
+        'max_attempts': args.max_attempts,
+        'exhaustive': args.exhaustive
+    }
     if args.file:
         try:
-            with open(args.file, 'r') as f:
-                csv_reader = csv.reader(f)
-                for row in csv_reader:
-                    if len(row) != 2:
-                        console = Console()
-                        console.print(f"[bold red]Invalid format in file: {row}. Expected: access_key,secret_key[/bold red]")
-                        continue
-                    access_key, secret_key = row
-                    process_credentials(access_key, secret_key, args.all_regions)
+            process_credential_file(args.file, args.all_regions, journal, limits)
         except FileNotFoundError:
             console = Console()
             console.print(f"[bold red]File not found: {args.file}[/bold red]")
@@ -229,9 +480,57 @@ def main():
             console = Console()
             console.print(f"[bold red]Error reading file: {str(e)}[/bold red]")
     else:
-        if not args.secret_key:
-            parser.error("--secret-key is required when using --access-key")
-        process_credentials(args.access_key, args.secret_key, args.all_regions)
+        process_credentials(args.access_key, args.secret_key, args.all_regions, journal, limits)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AWS Key Enumeration Tool')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--access-key', help='AWS Access Key (plain or base64 encoded)')
+    group.add_argument('--file', help='File containing comma-separated access_key,secret_key pairs')
+    parser.add_argument('--secret-key', help='AWS Secret Key (plain or base64 encoded)')
+    parser.add_argument('--all-regions', action='store_true', help='Check permissions across all regions')
+    parser.add_argument('--exhaustive', action='store_true',
+                        help='Probe every region even when the canary region shows an identity-policy denial')
+    add_timeout_arguments(parser)
+    add_budget_arguments(parser)
+    add_journal_arguments(parser)
+    add_cassette_arguments(parser)
+    add_progress_arguments(parser)
+    args = parser.parse_args(argv)
+    from botocore.exceptions import BotoCoreError
+    if args.access_key and not args.secret_key:
+        parser.error("--secret-key is required when using --access-key")
+    install_from_args(args)
+    budget = budget_from_args(parser, args)
+    reporter = progress_from_args(args)
+    from rich.console import Console
+    
+    try:
+        journal = RunJournal('enum_aws', args.resume)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    status = Console(stderr=True)
+    status.print(f"[dim]Run ID: {journal.run_id}[/dim]")
+    try:
+        if reporter is not None:
+            reporter.start()
+        run_credentials(args, journal, budget)
+    except (KeyboardInterrupt, BotoCoreError) as e:
+        status.print(f"\n[bold yellow]Run interrupted ({type(e).__name__}). "
+                     f"Resume with --resume {journal.run_id}[/bold yellow]")
+        return 1
+    finally:
+        if reporter is not None:
+            reporter.stop()
+        journal.close()
+        if budget is not None:
+            display_budget(budget, status)
+    if journal.resumed:
+        status.print(f"[dim]Resumed {journal.run_id}: {journal.reused} units from the journal, "
+                     f"{journal.executed} called[/dim]")
+    if budget is not None and budget.exhausted:
+        status.print(f"[dim]Resume with --resume {journal.run_id} and a new budget to probe what was skipped[/dim]")
+    return 0
 
 if __name__ == "__main__":
     main()
@@ -1,11 +1,10 @@
-import boto3
 import base64
-from botocore.exceptions import ClientError
-from rich.console import Console
-from rich.table import Table
 import argparse
-import curses
-import json
+from cassette import add_cassette_arguments, install_from_args
+
+from aws_clients import ClientPool
+from credential_cache import caller_identity
+from projection import FieldSpec, project_pages
 
 def decode_base64_key(encoded_key):
     """Decode base64 encoded key if necessary"""
@@ -15,22 +14,25 @@ def decode_base64_key(encoded_key):
         return encoded_key
 
 def get_user_id(access_key, secret_key):
-    """Get AWS user ID using the provided credentials"""
+    """Get AWS user ID using the provided credentials (cached across runs, see credential_cache)"""
+    from botocore.exceptions import ClientError
     try:
-        sts_client = boto3.client('sts', aws_access_key_id=access_key, aws_secret_access_key=secret_key)
-        identity = sts_client.get_caller_identity()
+        identity = caller_identity(ClientPool(access_key, secret_key))
         return identity['UserId'], identity['Arn']
     except ClientError as e:
         return None, f"Error: {str(e)}"
 
 def get_all_regions():
     """Get list of all available AWS regions"""
+    import boto3
     ec2_client = boto3.client('ec2')
     regions = [region['RegionName'] for region in ec2_client.describe_regions()['Regions']]
     return regions
 
 def check_service_permissions(access_key, secret_key, all_regions=False):
     """Check basic permissions for common AWS services"""
+    from botocore.exceptions import ClientError
+    import boto3
     permissions = {}
     services_to_test = {
         's3': ['ListBuckets'],
@@ -82,8 +84,18 @@ def check_service_permissions(access_key, secret_key, all_regions=False):
     
     return permissions
 
+# Instance fields shown for DescribeInstances; the rest of each reservation is not serialized
+INSTANCE_FIELDS = FieldSpec([
+    'InstanceId', 'InstanceType', 'State.Name', 'PublicIpAddress', 'PrivateIpAddress', 'LaunchTime',
+    'ImageId', 'VpcId', 'SubnetId', 'KeyName', 'IamInstanceProfile.Arn', 'SecurityGroups', 'Tags'
+])
+
 def perform_action(access_key, secret_key, service_region, action):
     """Perform the selected allowed action and return results"""
+    from botocore.exceptions import ClientError
+    import boto3
+    import json
+    from rich.console import Console
     console = Console()
     try:
         # Split service and region if region is present
@@ -101,7 +113,8 @@ def perform_action(access_key, secret_key, service_region, action):
             return json.dumps(result['Buckets'], indent=2, default=str)
         elif service == 'ec2' and action == 'DescribeInstances':
             result = client.describe_instances(MaxResults=5)
-            return json.dumps(result['Reservations'], indent=2, default=str)
+            instances = list(project_pages([result], 'Reservations.Instances', INSTANCE_FIELDS))
+            return json.dumps(instances, indent=2, default=str)
         elif service == 'iam' and action == 'ListUsers':
             result = client.list_users(MaxItems=10)
             return json.dumps(result['Users'], indent=2, default=str)
@@ -118,6 +131,7 @@ def perform_action(access_key, secret_key, service_region, action):
 
 def curses_menu(stdscr, permissions, access_key, secret_key):
     """Display interactive menu using curses"""
+    import curses
     curses.curs_set(0)  # Hide cursor
     current_row = 0
     
@@ -180,6 +194,9 @@ def curses_menu(stdscr, permissions, access_key, secret_key):
 
 def display_results(user_id, arn, permissions, access_key, secret_key):
     """Display results and launch menu"""
+    import curses
+    from rich.console import Console
+    from rich.table import Table
     console = Console()
     console.print(f"[bold green]User ID:[/bold green] {user_id}")
     console.print(f"[bold green]ARN:[/bold green] {arn}")
@@ -198,12 +215,15 @@ def display_results(user_id, arn, permissions, access_key, secret_key):
     # Launch curses menu
     curses.wrapper(curses_menu, permissions, access_key, secret_key)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='AWS Key Enumeration Tool')
     parser.add_argument('--access-key', required=True, help='AWS Access Key (plain or base64 encoded)')
     parser.add_argument('--secret-key', required=True, help='AWS Secret Key (plain or base64 encoded)')
     parser.add_argument('--all-regions', action='store_true', help='Check permissions across all regions')
-    args = parser.parse_args()
+    add_cassette_arguments(parser)
+    args = parser.parse_args(argv)
+    install_from_args(args)
+    from rich.console import Console
     
     access_key = decode_base64_key(args.access_key)
     secret_key = decode_base64_key(args.secret_key)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_clients import (ClientPool, Deadline, DeadlineExceeded, DeadRegionCache, add_timeout_arguments,
+                         client_config, decode_base64_key, is_dead_region_error, run_concurrently)
+from budget import BudgetExceeded, add_budget_arguments, budget_from_args, display_budget
+from cassette import add_cassette_arguments, install_from_args
+from live_table import StreamingTable, add_table_arguments
+from output_sink import JsonlSink
+from projection import FieldSpec, project_pages
+from records import EbsSnapshot, EbsVolume, display_value, tag_value
+
+# Read-only EBS inventory. Each region is listed by one worker: instances
+# and volumes first, into hash indexes by ID (a few fields per entry), then
+# the account's own snapshots one page at a time, each joined to its source
+# volume through the index. Records are handed to the output as each page
+# is read and only per-group totals are kept, so memory grows with the
+# number of volumes, not snapshots. Public snapshots come from one extra
+# listing (RestorableByUserIds=all) instead of a call per snapshot; the
+# accounts a snapshot is shared with need describe_snapshot_attribute per
+# snapshot, so --check-sharing runs those concurrently a page at a time.
+
+SNAPSHOT_PAGE_SIZE = 1000
+
+# Concurrent describe_snapshot_attribute calls per region with --check-sharing
+SHARING_WORKERS = 8
+
+INSTANCE_FIELDS = FieldSpec(['InstanceId', 'State.Name', 'Tags'])
+VOLUME_FIELDS = FieldSpec(['VolumeId', 'Size', 'VolumeType', 'State', 'Encrypted', 'AvailabilityZone', 'CreateTime',
+                           'Attachments.InstanceId'])
+SNAPSHOT_FIELDS = FieldSpec(['SnapshotId', 'VolumeId', 'VolumeSize', 'State', 'Encrypted', 'StorageTier', 'StartTime',
+                             'Description'])
+
+class StorageTotals:
+    """Count and GiB per (kind, region, type or tier, encrypted), plus flag counts"""
+
+    def __init__(self):
+        self.groups = defaultdict(lambda: [0, 0])
+        self.flags = defaultdict(int)
+
+    def add(self, kind, region, category, encrypted, size):
+        totals = self.groups[(kind, region, category or 'N/A', bool(encrypted))]
+        totals[0] += 1
+        totals[1] += size or 0
+
+    def flag(self, name, count=1):
+        self.flags[name] += count
+
+    def merge(self, other):
+        for key, (count, size) in other.groups.items():
+            self.groups[key][0] += count
+            self.groups[key][1] += size
+        for name, count in other.flags.items():
+            self.flags[name] += count
+
+def snapshot_flags(snapshot):
+    """Reasons a snapshot record deserves a look"""
+    flags = []
+    if snapshot.Public:
+        flags.append('public')
+    if snapshot.SharedWith:
+        flags.append(f"shared with {', '.join(snapshot.SharedWith)}")
+    if not snapshot.Encrypted:
+        flags.append('unencrypted')
+    return flags
+
+def shared_accounts(ec2, snapshot_ids):
+    """{snapshot id: (account, ...)} from createVolumePermission, checked concurrently
+
+    Snapshots whose attribute could not be read map to None.
+    """
+    from botocore.exceptions import ClientError
+
+    def permissions(snapshot_id):
+        try:
+            response = ec2.describe_snapshot_attribute(SnapshotId=snapshot_id, Attribute='createVolumePermission')
+        except (ClientError, BudgetExceeded):
+            return None
+        return tuple(sorted(permission.get('UserId') or permission.get('Group')
+                            for permission in response.get('CreateVolumePermissions', [])))
+
+    with ThreadPoolExecutor(max_workers=SHARING_WORKERS) as executor:
+        return dict(zip(snapshot_ids, executor.map(permissions, snapshot_ids)))
+
+def collect_region(pool, region, emit, check_sharing=False, stop=None):
+    """List one region's volumes and snapshots, calling emit(record) for each; returns StorageTotals
+
+    stop (a threading.Event) ends the listing at the next page.
+    """
+    ec2 = pool.client('ec2', region)
+    totals = StorageTotals()
+
+    instances = {}
+    for instance in project_pages(ec2.get_paginator('describe_instances').paginate(), 'Reservations.Instances',
+                                  INSTANCE_FIELDS):
+        instances[instance['InstanceId']] = (tag_value(instance.get('Tags'), 'Name'),
+                                             instance.get('State', {}).get('Name'))
+
+    # Source volume state and attached instance of each volume, for the snapshot join
+    volumes = {}
+    for volume in project_pages(ec2.get_paginator('describe_volumes').paginate(), 'Volumes', VOLUME_FIELDS):
+        instance_id = next((attachment['InstanceId'] for attachment in volume.get('Attachments', [])
+                            if attachment.get('InstanceId')), None)
+        volumes[volume['VolumeId']] = (volume.get('State'), instance_id)
+        attached = (instance_id,) + instances.get(instance_id, (None, None)) if instance_id else None
+        record = EbsVolume.from_api(region, volume, attached)
+        totals.add('volume', region, record.VolumeType, record.Encrypted, record.Size)
+        if record.State == 'available':
+            totals.flag('unattached volumes')
+        emit(record)
+    instances = None
+
+    public = {snapshot['SnapshotId'] for snapshot in project_pages(
+        ec2.get_paginator('describe_snapshots').paginate(OwnerIds=['self'], RestorableByUserIds=['all']),
+        'Snapshots', FieldSpec(['SnapshotId']))}
+
+    pages = ec2.get_paginator('describe_snapshots').paginate(
+        OwnerIds=['self'], PaginationConfig={'PageSize': SNAPSHOT_PAGE_SIZE})
+    for page in pages:
+        if stop is not None and stop.is_set():
+            break
+        snapshots = [SNAPSHOT_FIELDS.project(snapshot) for snapshot in page.get('Snapshots', [])]
+        shared = shared_accounts(ec2, [snapshot['SnapshotId'] for snapshot in snapshots]) if check_sharing else {}
+        for snapshot in snapshots:
+            record = EbsSnapshot.from_api(region, snapshot, volumes.get(snapshot.get('VolumeId')),
+                                          snapshot['SnapshotId'] in public, shared.get(snapshot['SnapshotId']))
+            totals.add('snapshot', region, record.StorageTier, record.Encrypted, record.VolumeSize)
+            if record.SourceVolumeState == 'deleted':
+                totals.flag('snapshots of deleted volumes')
+            if record.Public:
+                totals.flag('public snapshots')
+            if not record.Encrypted:
+                totals.flag('unencrypted snapshots')
+            if record.SharedWith:
+                totals.flag('shared snapshots')
+            if check_sharing and record.SharedWith is None:
+                totals.flag('snapshots with unreadable sharing')
+            emit(record)
+    return totals
+
+def display_totals(totals, console):
+    """Print GiB per region, type and encryption, then the flag counts"""
+    from rich.table import Table
+    table = Table(title="EBS Storage")
+    table.add_column("Kind", style="bold")
+    table.add_column("Region", style="cyan")
+    table.add_column("Type / Tier", style="magenta")
+    table.add_column("Encrypted", style="yellow")
+    table.add_column("Count", justify="right", style="green")
+    table.add_column("GiB", justify="right", style="green")
+    kinds = defaultdict(lambda: [0, 0])
+    for (kind, region, category, encrypted), (count, size) in sorted(totals.groups.items()):
+        table.add_row(kind, region, category, 'yes' if encrypted else '[red]no[/red]', str(count), str(size))
+        kinds[kind][0] += count
+        kinds[kind][1] += size
+    console.print(table)
+    console.print(', '.join(f"{count} {kind}s ({size} GiB)" for kind, (count, size) in sorted(kinds.items()))
+                  or "No volumes or snapshots found")
+    console.print("[dim]Snapshot GiB is the source volume size, not the billed incremental size[/dim]")
+    for name, count in sorted(totals.flags.items()):
+        console.print(f"[yellow]{count} {name}[/yellow]")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Read-only inventory of EBS volumes and snapshots across regions')
+    parser.add_argument('--profile', help='AWS profile name to use')
+    parser.add_argument('--access-key', help='AWS Access Key (plain or base64 encoded)')
+    parser.add_argument('--secret-key', help='AWS Secret Key (plain or base64 encoded)')
+    parser.add_argument('--region', action='append', help='Region to check (repeatable, default: all enabled regions)')
+    parser.add_argument('--check-sharing', action='store_true',
+                        help='Also list the accounts each snapshot is shared with (one API call per snapshot)')
+    parser.add_argument('--format', choices=['table', 'jsonl'], default='table',
+                        help='table: totals and flagged snapshots; jsonl: every volume and snapshot')
+    parser.add_argument('--output', help='Write JSONL output to this file instead of stdout')
+    parser.add_argument('--workers', type=int, default=16, help='Maximum regions listed concurrently')
+    add_timeout_arguments(parser)
+    add_budget_arguments(parser)
+    add_table_arguments(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args(argv)
+    from botocore.exceptions import ClientError, NoCredentialsError
+    install_from_args(args)
+    budget = budget_from_args(parser, args)
+    from rich.console import Console
+
+    if bool(args.access_key) != bool(args.secret_key):
+        parser.error("--access-key and --secret-key must be given together")
+
+    deadline = Deadline(args.deadline)
+    access_key = decode_base64_key(args.access_key) if args.access_key else None
+    pool = ClientPool(
+        access_key=access_key,
+        secret_key=decode_base64_key(args.secret_key) if args.secret_key else None,
+        profile=args.profile,
+        config=client_config(args.connect_timeout, args.read_timeout, args.max_attempts, deadline),
+        deadline=deadline
+    )
+    dead_regions = DeadRegionCache(ttl=args.dead_region_ttl)
+    dead_region_key = pool.access_key_id()
+    console = Console(stderr=args.format == 'jsonl')
+
+    try:
+        regions = args.region or pool.get_all_regions()
+    except (ClientError, NoCredentialsError, BudgetExceeded) as e:
+        console.print(f"[red]Error listing regions: {e}[/red]")
+        return 1
+
+    # Regions are listed concurrently and hand records over from their worker threads
+    lock = threading.Lock()
+    stop = threading.Event()
+    if args.format == 'jsonl':
+        output = JsonlSink(open(args.output, 'w') if args.output else sys.stdout)
+        emit = output.write
+    else:
+        columns = [
+            ("Region", {'style': "cyan"}),
+            ("Snapshot", {'style': "magenta"}),
+            ("Source Volume", {'style': "blue"}),
+            ("GiB", {'style': "green", 'justify': "right"}),
+            ("Started", {}),
+            ("Flags", {'style': "red"})
+        ]
+        output = StreamingTable("Flagged EBS Snapshots", columns, max_rows=args.max_rows, pager=args.pager,
+                                console=console, jsonl=True)
+
+        def emit(record):
+            if isinstance(record, EbsSnapshot):
+                flags = snapshot_flags(record)
+                if flags:
+                    source = f"{display_value(record.VolumeId)} ({record.SourceVolumeState})"
+                    with lock:
+                        output.add_row(record.Region, record.SnapshotId, source, display_value(record.VolumeSize),
+                                       display_value(record.StartTime), ', '.join(flags))
+
+    totals = StorageTotals()
+    tasks = {}
+    done = []
+    with output:
+        for region in regions:
+            reason = dead_regions.reason(dead_region_key, region, 'ec2')
+            if reason:
+                console.print(f"[yellow]Skipping region {region}: {reason}[/yellow]")
+            else:
+                tasks[region] = lambda r=region: collect_region(pool, r, emit, args.check_sharing, stop)
+        for region, result, error in run_concurrently(tasks, args.workers, deadline):
+            if error is None:
+                totals.merge(result)
+                done.append(region)
+                if args.format == 'table':
+                    output.update(f"{len(done)}/{len(tasks)} regions done (last: {region})")
+                continue
+            if isinstance(error, DeadlineExceeded):
+                message = 'deadline reached'
+            elif isinstance(error, BudgetExceeded):
+                message = 'call budget exhausted'
+            elif is_dead_region_error(error):
+                message = dead_regions.mark_dead(dead_region_key, region, error, 'ec2')
+            else:
+                message = str(error)
+            if args.format == 'jsonl':
+                output.error('ec2', region, message)
+            console.print(f"[yellow]Region {region} incomplete: {message}[/yellow]")
+        stop.set()
+    display_totals(totals, console)
+    if budget is not None:
+        display_budget(budget)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
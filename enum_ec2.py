@@ -1,126 +1,393 @@
 #!/usr/bin/env python3
 
-import boto3
 import argparse
-from rich.console import Console
-from rich.table import Table
-from botocore.exceptions import ClientError, NoCredentialsError
+from cassette import add_cassette_arguments, install_from_args
+
+from aws_clients import (ClientPool, Deadline, DeadlineExceeded, DeadRegionCache, add_timeout_arguments,
+                         client_config, is_dead_region_error, run_concurrently)
+from budget import BudgetExceeded, add_budget_arguments, budget_from_args, display_budget
+from inventory import DEFAULT_INVENTORY, Inventory
+from live_table import StreamingTable, add_table_arguments
+from progress import add_progress_arguments, plan_units, progress_from_args, tracked
+from projection import FieldSpec
+from records import Ec2Instance, Ec2InstanceDetails, display_value, intern
+from snapshot import add_snapshot_arguments, open_snapshot_writer
 
 def get_all_regions(ec2_client):
     """Get list of all available AWS regions"""
     response = ec2_client.describe_regions()
     return [region['RegionName'] for region in response['Regions']]
 
-def get_ec2_instances(access_key, secret_key):
-    """Fetch EC2 instances from all regions"""
+# AMI details by image ID. AMIs are immutable, so one lookup per run is
+# enough no matter how many instances or regions reference the image.
+AMI_CACHE = {}
+
+# Maximum values per describe_* filter
+ID_CHUNK_SIZE = 200
+
+# Fields enrich_instances reads from each raw instance and from the groups
+# and volumes it resolves (see projection.py); instances are held for the
+# whole region, so everything else is dropped page by page.
+DETAIL_FIELDS = FieldSpec([
+    'InstanceId', 'ImageId', 'VpcId', 'SubnetId', 'KeyName', 'IamInstanceProfile.Arn',
+    'MetadataOptions.HttpTokens', 'MetadataOptions.HttpEndpoint', 'SecurityGroups.GroupId',
+    'SecurityGroups.GroupName', 'BlockDeviceMappings.DeviceName', 'BlockDeviceMappings.Ebs.VolumeId'
+])
+GROUP_FIELDS = FieldSpec([
+    'GroupId', 'IpPermissions.IpProtocol', 'IpPermissions.FromPort', 'IpPermissions.ToPort',
+    'IpPermissions.IpRanges.CidrIp', 'IpPermissions.Ipv6Ranges.CidrIpv6'
+])
+VOLUME_FIELDS = FieldSpec(['VolumeId', 'Size', 'VolumeType', 'Encrypted'])
+
+def chunked(ids, size=ID_CHUNK_SIZE):
+    """Split a collection of IDs into sorted lists of at most size items"""
+    ids = sorted(ids)
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+def describe_by_ids(ec2, operation, result_key, filter_name, ids, fields=None):
+    """Resolve IDs with one filtered call per chunk and return (items, api_calls)
+
+    A filter is used instead of the *Ids parameter so a single deleted or
+    foreign ID does not fail the whole batch. With fields (a FieldSpec) only
+    those fields of each item are kept.
+    """
+    items = []
+    calls = 0
+    for chunk in chunked(ids):
+        filters = [{'Name': filter_name, 'Values': chunk}]
+        if ec2.can_paginate(operation):
+            pages = ec2.get_paginator(operation).paginate(Filters=filters)
+        else:
+            pages = [getattr(ec2, operation)(Filters=filters)]
+        for page in pages:
+            calls += 1
+            page_items = page.get(result_key, [])
+            items.extend(map(fields.project, page_items) if fields else page_items)
+    return items, calls
+
+def public_ingress_ports(security_group):
+    """Port ranges a security group opens to 0.0.0.0/0 or ::/0"""
+    ports = []
+    for permission in security_group.get('IpPermissions', []):
+        open_v4 = any(r.get('CidrIp') == '0.0.0.0/0' for r in permission.get('IpRanges', []))
+        open_v6 = any(r.get('CidrIpv6') == '::/0' for r in permission.get('Ipv6Ranges', []))
+        if not (open_v4 or open_v6):
+            continue
+        protocol = permission.get('IpProtocol')
+        if protocol == '-1':
+            ports.append('all')
+        elif permission.get('FromPort') == permission.get('ToPort'):
+            ports.append(f"{permission.get('FromPort')}/{protocol}")
+        else:
+            ports.append(f"{permission.get('FromPort')}-{permission.get('ToPort')}/{protocol}")
+    return ports
+
+def enrich_instances(ec2, raw_instances, instances):
+    """Attach security group, volume, IAM profile, IMDS and AMI details
+
+    Referenced IDs are collected for the whole region first and resolved
+    with batched describe calls, so the call count grows with the number of
+    distinct IDs / ID_CHUNK_SIZE rather than with the number of instances.
+    Returns (enriched instances, number of API calls made).
+    """
+    group_ids = set()
+    volume_ids = set()
+    image_ids = set()
+    for instance in raw_instances:
+        group_ids.update(group['GroupId'] for group in instance.get('SecurityGroups', []))
+        volume_ids.update(mapping['Ebs']['VolumeId'] for mapping in instance.get('BlockDeviceMappings', [])
+                          if 'Ebs' in mapping)
+        if instance.get('ImageId'):
+            image_ids.add(instance['ImageId'])
+
+    groups, group_calls = describe_by_ids(ec2, 'describe_security_groups', 'SecurityGroups', 'group-id', group_ids,
+                                          GROUP_FIELDS)
+    volumes, volume_calls = describe_by_ids(ec2, 'describe_volumes', 'Volumes', 'volume-id', volume_ids,
+                                            VOLUME_FIELDS)
+    images, image_calls = describe_by_ids(ec2, 'describe_images', 'Images', 'image-id', image_ids - AMI_CACHE.keys())
+
+    groups = {group['GroupId']: group for group in groups}
+    volumes = {volume['VolumeId']: volume for volume in volumes}
+    for image in images:
+        AMI_CACHE[image['ImageId']] = {
+            'Name': image.get('Name'),
+            'OwnerId': intern(image.get('OwnerId')),
+            'CreationDate': image.get('CreationDate'),
+            'Public': image.get('Public', False)
+        }
+
+    enriched = []
+    for instance, record in zip(raw_instances, instances):
+        metadata_options = instance.get('MetadataOptions', {})
+        image = AMI_CACHE.get(instance.get('ImageId'), {})
+        security_groups = []
+        public_ingress = []
+        for group in instance.get('SecurityGroups', []):
+            security_groups.append(f"{group['GroupId']} ({group.get('GroupName', 'N/A')})")
+            public_ingress.extend(public_ingress_ports(groups.get(group['GroupId'], {})))
+        attached_volumes = []
+        for mapping in instance.get('BlockDeviceMappings', []):
+            volume = volumes.get(mapping.get('Ebs', {}).get('VolumeId'))
+            if volume:
+                encrypted = 'encrypted' if volume.get('Encrypted') else 'unencrypted'
+                attached_volumes.append(
+                    f"{volume['VolumeId']} {mapping.get('DeviceName', '')} {volume.get('Size')}GiB "
+                    f"{volume.get('VolumeType')} {encrypted}")
+        details = Ec2InstanceDetails(
+            ImageId=instance.get('ImageId'),
+            AmiName=image.get('Name'),
+            AmiOwner=image.get('OwnerId'),
+            VpcId=intern(instance.get('VpcId')),
+            SubnetId=intern(instance.get('SubnetId')),
+            KeyName=intern(instance.get('KeyName')),
+            IamProfile=intern(instance.get('IamInstanceProfile', {}).get('Arn')),
+            HttpTokens=intern(metadata_options.get('HttpTokens')),
+            HttpEndpoint=intern(metadata_options.get('HttpEndpoint')),
+            SecurityGroups=tuple(security_groups),
+            PublicIngress=tuple(public_ingress),
+            Volumes=tuple(attached_volumes)
+        )
+        enriched.append(record._replace(Details=details))
+
+    return enriched, group_calls + volume_calls + image_calls
+
+def get_region_instances(pool, region, detailed=False):
+    """Fetch one region's instances; returns (instances, enrichment API calls)"""
+    ec2 = pool.client('ec2', region)
+    raw_instances = []
+    region_instances = []
+
+    # Get instance details across all pages
+    for response in ec2.get_paginator('describe_instances').paginate():
+        for reservation in response['Reservations']:
+            for instance in reservation['Instances']:
+                region_instances.append(Ec2Instance.from_api(region, instance))
+                if detailed:
+                    raw_instances.append(DETAIL_FIELDS.project(instance))
+
+    if detailed and raw_instances:
+        return enrich_instances(ec2, raw_instances, region_instances)
+    return region_instances, 0
+
+def get_ec2_instances(access_key, secret_key, detailed=False, deadline=None, dead_regions=None,
+                      connect_timeout=5, read_timeout=30, max_attempts=3, max_workers=16,
+                      session_token=None, regions=None, on_region=None, console=None):
+    """Fetch EC2 instances from all regions concurrently
+
+    With detailed=True each instance also carries its security groups,
+    volumes, IAM profile, IMDS options and AMI details (see enrich_instances).
+    Regions known dead in dead_regions (a DeadRegionCache) are skipped and
+    regions failing with an auth or connectivity error are added to it.
+    Regions still running when the deadline passes are abandoned. Returns
+    (instances, [(region, reason)] for regions not fully enumerated).
+    Pass regions to skip the describe_regions lookup. on_region(region,
+    instances) is called as each region completes, in completion order.
+    """
+    from botocore.exceptions import ClientError
+    from rich.console import Console
     # Initialize console for rich output
-    console = Console()
+    console = console or Console()
     
-    # Set up AWS session with provided credentials
-    session = boto3.Session(
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key
+    # Set up AWS session with provided credentials; regions create their clients concurrently
+    pool = ClientPool(
+        access_key=access_key,
+        secret_key=secret_key,
+        session_token=session_token,
+        config=client_config(connect_timeout, read_timeout, max_attempts, deadline),
+        deadline=deadline
     )
+    dead_region_key = pool.access_key_id() if dead_regions else None
     
     # Get all regions
-    ec2_client = session.client('ec2')
-    regions = get_all_regions(ec2_client)
+    if regions is None:
+        regions = get_all_regions(pool.client('ec2'))
     
     # Store all instance details
     all_instances = []
-    
-    # Iterate through each region
+    incomplete = []
+    enrichment_calls = 0
+
+    tasks = {}
     for region in regions:
-        try:
-            # Create region-specific EC2 client
-            ec2 = session.client('ec2', region_name=region)
-            
-            # Get instance details
-            response = ec2.describe_instances()
-            
-            # Process each reservation and instance
-            for reservation in response['Reservations']:
-                for instance in reservation['Instances']:
-                    instance_details = {
-                        'Region': region,
-                        'InstanceId': instance.get('InstanceId', 'N/A'),
-                        'InstanceType': instance.get('InstanceType', 'N/A'),
-                        'State': instance.get('State', {}).get('Name', 'N/A'),
-                        'PublicIP': instance.get('PublicIpAddress', 'N/A'),
-                        'PrivateIP': instance.get('PrivateIpAddress', 'N/A'),
-                        'LaunchTime': str(instance.get('LaunchTime', 'N/A')),
-                        'Name': 'N/A'  # Default value for Name tag
-                    }
-                    
-                    # Extract Name tag if it exists
-                    if 'Tags' in instance:
-                        for tag in instance['Tags']:
-                            if tag['Key'] == 'Name':
-                                instance_details['Name'] = tag['Value']
-                                break
-                    
-                    all_instances.append(instance_details)
-                    
-        except ClientError as e:
-            console.print(f"[red]Error accessing region {region}: {str(e)}[/red]")
-        except Exception as e:
-            console.print(f"[red]Unexpected error in region {region}: {str(e)}[/red]")
-    
-    return all_instances
+        reason = dead_regions.reason(dead_region_key, region, 'ec2') if dead_regions else None
+        if reason:
+            incomplete.append((region, f"skipped, {reason}"))
+        else:
+            tasks[region] = lambda r=region: get_region_instances(pool, r, detailed)
 
-def display_instances(instances):
-    """Display instances in a rich table"""
-    console = Console()
+    plan_units(len(tasks))
+    for region, result, error in tracked(run_concurrently(tasks, max_workers, deadline)):
+        if error is None:
+            region_instances, calls = result
+            enrichment_calls += calls
+            all_instances.extend(region_instances)
+            if on_region:
+                on_region(region, region_instances)
+        elif isinstance(error, DeadlineExceeded):
+            incomplete.append((region, 'deadline reached'))
+        elif isinstance(error, BudgetExceeded):
+            incomplete.append((region, 'call budget exhausted'))
+        elif is_dead_region_error(error):
+            reason = dead_regions.mark_dead(dead_region_key, region, error, 'ec2') if dead_regions else type(error).__name__
+            incomplete.append((region, reason))
+            console.print(f"[yellow]Skipping region {region}: {str(error)}[/yellow]")
+        elif isinstance(error, ClientError):
+            incomplete.append((region, error.response.get('Error', {}).get('Code', 'error')))
+            console.print(f"[red]Error accessing region {region}: {str(error)}[/red]")
+        else:
+            incomplete.append((region, type(error).__name__))
+            console.print(f"[red]Unexpected error in region {region}: {str(error)}[/red]")
     
-    # Create table
-    table = Table(title="AWS EC2 Instances Across All Regions")
+    if detailed:
+        console.print(f"[green]Resolved instance details with {enrichment_calls} batched API calls[/green]")
     
-    # Add columns
-    table.add_column("Region", style="cyan")
-    table.add_column("Instance ID", style="magenta")
-    table.add_column("Name", style="green")
-    table.add_column("Type", style="blue")
-    table.add_column("State", style="yellow")
-    table.add_column("Public IP", style="white")
-    table.add_column("Private IP", style="white")
-    table.add_column("Launch Time", style="white")
-    
-    # Add rows
-    for instance in instances:
-        table.add_row(
-            instance['Region'],
-            instance['InstanceId'],
-            instance['Name'],
-            instance['InstanceType'],
-            instance['State'],
-            instance['PublicIP'],
-            instance['PrivateIP'],
-            instance['LaunchTime']
-        )
-    
-    # Display table
-    console.print(table)
-    console.print(f"\nTotal instances found: {len(instances)}")
+    # Completion order varies between runs; keep the table grouped by region
+    order = {region: index for index, region in enumerate(regions)}
+    all_instances.sort(key=lambda instance: order[instance.Region])
+    return all_instances, sorted(incomplete, key=lambda item: order[item[0]])
+
+def instance_columns(detailed=False):
+    """(header, column options) pairs of the instance table"""
+    columns = [
+        ("Region", {'style': "cyan"}),
+        ("Instance ID", {'style': "magenta"}),
+        ("Name", {'style': "green"}),
+        ("Type", {'style': "blue"}),
+        ("State", {'style': "yellow"}),
+        ("Public IP", {'style': "white"}),
+        ("Private IP", {'style': "white"}),
+        ("Launch Time", {'style': "white"})
+    ]
+    if detailed:
+        columns += [
+            ("AMI", {'style': "blue"}),
+            ("IAM Profile", {'style': "green"}),
+            ("IMDS Tokens", {'style': "yellow"}),
+            ("Security Groups", {'style': "magenta"}),
+            ("Public Ingress", {'style': "red"}),
+            ("Volumes", {'style': "white"})
+        ]
+    return columns
+
+def instance_row(instance, detailed=False):
+    """Table cells of one instance"""
+    row = [
+        instance.Region,
+        instance.InstanceId,
+        display_value(instance.Name),
+        display_value(instance.InstanceType),
+        display_value(instance.State),
+        display_value(instance.PublicIP),
+        display_value(instance.PrivateIP),
+        display_value(instance.LaunchTime)
+    ]
+    if detailed:
+        details = instance.Details or Ec2InstanceDetails()
+        row += [
+            f"{display_value(details.ImageId)} ({display_value(details.AmiName)})",
+            display_value(details.IamProfile),
+            display_value(details.HttpTokens),
+            "\n".join(details.SecurityGroups) or "None",
+            ", ".join(details.PublicIngress) or "None",
+            "\n".join(details.Volumes) or "None"
+        ]
+    return row
+
+def display_incomplete(console, total, incomplete):
+    console.print(f"\nTotal instances found: {total}")
+    if incomplete:
+        console.print(f"[yellow]Incomplete: {len(incomplete)} regions not fully enumerated[/yellow]")
+        for region, reason in incomplete:
+            console.print(f"[yellow]  {region}: {reason}[/yellow]")
 
-def main():
+def display_instances(instances, detailed=False, incomplete=(), max_rows=None, pager=False):
+    """Display instances in a streamed rich table (see live_table.StreamingTable)"""
+    table = StreamingTable("AWS EC2 Instances Across All Regions", instance_columns(detailed),
+                           max_rows=max_rows, pager=pager)
+    with table:
+        for instance in instances:
+            table.add_row(*instance_row(instance, detailed))
+    display_incomplete(table.console, len(instances), incomplete)
+
+def main(argv=None):
     # Set up argument parser
     parser = argparse.ArgumentParser(description='List AWS EC2 instances across all regions')
     parser.add_argument('--access-key', required=True, help='AWS Access Key ID')
     parser.add_argument('--secret-key', required=True, help='AWS Secret Access Key')
+    parser.add_argument('--detailed', action='store_true',
+                        help='Include security groups, volumes, IAM profile, IMDS options and AMI details')
+    parser.add_argument('--inventory', nargs='?', const=DEFAULT_INVENTORY, metavar='DB',
+                        help=f'Also store results in the local inventory (default DB: {DEFAULT_INVENTORY})')
     
-    args = parser.parse_args()
+    add_snapshot_arguments(parser)
+    add_timeout_arguments(parser)
+    add_budget_arguments(parser)
+    add_table_arguments(parser)
+    add_cassette_arguments(parser)
+    add_progress_arguments(parser)
+    args = parser.parse_args(argv)
+    from botocore.exceptions import NoCredentialsError
+    install_from_args(args)
+    budget = budget_from_args(parser, args)
+    from rich.console import Console
     
     console = Console()
     
     try:
         console.print("[green]Fetching EC2 instances... This may take a moment.[/green]")
-        instances = get_ec2_instances(args.access_key, args.secret_key)
-        display_instances(instances)
+        # Rows are printed as each region completes, instead of after the slowest one
+        table = StreamingTable("AWS EC2 Instances Across All Regions", instance_columns(args.detailed),
+                               max_rows=args.max_rows, pager=args.pager, console=console)
+        # With progress reporting on a terminal, the progress line takes over the table's status line
+        reporter = progress_from_args(args, status=table.update if console.is_terminal and not args.pager else None)
+        done = []
+
+        def on_region(region, region_instances):
+            for instance in region_instances:
+                table.add_row(*instance_row(instance, args.detailed))
+            done.append(region)
+            if reporter is None or reporter.status is None:
+                table.update(f"{len(done)} regions done, {table.rows} instances (last: {region})")
+
+        with table:
+            if reporter is not None:
+                reporter.start()
+            try:
+                instances, incomplete = get_ec2_instances(
+                    args.access_key, args.secret_key, args.detailed,
+                    deadline=Deadline(args.deadline),
+                    dead_regions=DeadRegionCache(ttl=args.dead_region_ttl),
+                    connect_timeout=args.connect_timeout,
+                    read_timeout=args.read_timeout,
+                    max_attempts=args.max_attempts,
+                    on_region=on_region,
+                    console=console
+                )
+            finally:
+                if reporter is not None:
+                    reporter.stop()
+        display_incomplete(console, len(instances), incomplete)
+        
+        if args.inventory or args.snapshot:
+            account = ClientPool(args.access_key, args.secret_key).get_account_id()
+        if args.inventory:
+            inventory = Inventory(args.inventory)
+            stored = inventory.add_records(instances, account)
+            inventory.close()
+            console.print(f"[green]Stored {stored} instances in {args.inventory}[/green]")
+        if args.snapshot:
+            # Regions that did not finish are not reported as removed by a later diff
+            with open_snapshot_writer(args.snapshot, 'enum_ec2', account) as snapshot:
+                snapshot.incomplete = [region for region, _ in incomplete]
+                snapshot.add_records(instances)
+            console.print(f"[green]Saved snapshot {snapshot.path}[/green]")
         
     except NoCredentialsError:
         console.print("[red]Error: Invalid AWS credentials provided[/red]")
     except Exception as e:
         console.print(f"[red]Error: {str(e)}[/red]")
+    if budget is not None:
+        display_budget(budget)
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,16 @@
-import boto3
 import base64
-from botocore.exceptions import ClientError
-from rich.console import Console
-from rich.table import Table
 from datetime import datetime
 import argparse
+from cassette import add_cassette_arguments, install_from_args
+
+from aws_clients import ClientPool
+from credential_cache import caller_identity
+from inventory import DEFAULT_INVENTORY, Inventory
+from journal import RunJournal, add_journal_arguments, run_unit
+from records import ElasticBeanstalkApplication, ElasticBeanstalkEnvironment, display_value, intern, to_dict
+from progress import add_progress_arguments, plan_units, progress_from_args, tracked
+from projection import split_fields
+from snapshot import add_snapshot_arguments, open_snapshot_writer
 
 def decode_base64_key(encoded_key):
     """Decode base64 encoded key if necessary"""
@@ -26,133 +32,161 @@ AWS_REGIONS = [
     # Add more regions as AWS expands
 ]
 
-def get_elasticbeanstalk_details(access_key, secret_key, regions):
-    """Get detailed information about Elastic Beanstalk applications in specified regions"""
-    console = Console()
-    all_applications = {}
+# Configuration options kept per environment, as Namespace:OptionName. An
+# environment has a few hundred options; only these are displayed, so the
+# rest are dropped as each response is read. --fields replaces the list and
+# --fields all keeps every option.
+CONFIGURATION_OPTIONS = (
+    'aws:autoscaling:launchconfiguration:InstanceType',
+    'aws:autoscaling:asg:MinSize',
+    'aws:autoscaling:asg:MaxSize',
+    'aws:elasticbeanstalk:environment:EnvironmentType'
+)
+
+def project_options(option_settings, options=CONFIGURATION_OPTIONS):
+    """{Namespace:OptionName: value} of the wanted options (every option if options is None)"""
+    settings = {}
+    for opt in option_settings:
+        name = f"{opt.get('Namespace')}:{opt['OptionName']}"
+        if 'Value' in opt and (options is None or name in options):
+            settings[name] = opt['Value']
+    return settings
+
+def get_region_applications(access_key, secret_key, region, console, options=CONFIGURATION_OPTIONS):
+    """Applications of one region with their environments
+
+    A ClientError from DescribeApplications (no access, throttling) is
+    raised so the caller can skip the region without journaling it.
+    """
+    from botocore.exceptions import ClientError
+    import boto3
+    # Create Elastic Beanstalk client for the region
+    eb_client = boto3.client(
+        'elasticbeanstalk',
+        region_name=region,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key
+    )
     
-    for region in regions:
+    region_applications = []
+    # Get all applications in the region
+    apps_response = eb_client.describe_applications()
+    applications = apps_response.get('Applications', [])
+    
+    if not applications:
+        console.print(f"[yellow]No applications found in {region}[/yellow]")
+        return []
+    
+    for app in applications:
+        environments = []
+        
+        # Get environment details for this application
         try:
-            # Create Elastic Beanstalk client for the region
-            eb_client = boto3.client(
-                'elasticbeanstalk',
-                region_name=region,
-                aws_access_key_id=access_key,
-                aws_secret_access_key=secret_key
+            env_response = eb_client.describe_environments(
+                ApplicationName=app['ApplicationName']
             )
-            
-            # Test connection by making a simple API call
-            eb_client.describe_applications()
-            
-        except ClientError as e:
-            console.print(f"[yellow]Warning: Could not connect to Elastic Beanstalk in {region}: {str(e)}. Skipping this region.[/yellow]")
-            continue
-            
-        try:
-            # Get all applications in the region
-            apps_response = eb_client.describe_applications()
-            applications = apps_response.get('Applications', [])
-            
-            if not applications:
-                console.print(f"[yellow]No applications found in {region}[/yellow]")
-                continue
+            for env in env_response.get('Environments', []):
+                instance_count = 0
+                configuration_settings = None
                 
-            # Store applications with region
-            all_applications[region] = []
-            
-            for app in applications:
-                app_details = {
-                    'ApplicationName': app.get('ApplicationName', 'N/A'),
-                    'Description': app.get('Description', 'N/A'),
-                    'DateCreated': app.get('DateCreated', 'N/A'),
-                    'DateUpdated': app.get('DateUpdated', 'N/A'),
-                    'Environments': [],
-                    'ConfigurationTemplates': app.get('ConfigurationTemplates', []),
-                    'ResourceLifecycleConfig': app.get('ResourceLifecycleConfig', {})
-                }
-                
-                # Get environment details for this application
+                # Get instance count and other resource details
                 try:
-                    env_response = eb_client.describe_environments(
-                        ApplicationName=app['ApplicationName']
+                    resources = eb_client.describe_environment_resources(
+                        EnvironmentName=env['EnvironmentName']
                     )
-                    for env in env_response.get('Environments', []):
-                        env_details = {
-                            'EnvironmentName': env.get('EnvironmentName', 'N/A'),
-                            'Status': env.get('Status', 'N/A'),
-                            'Health': env.get('Health', 'N/A'),
-                            'HealthStatus': env.get('HealthStatus', 'N/A'),
-                            'VersionLabel': env.get('VersionLabel', 'N/A'),
-                            'SolutionStackName': env.get('SolutionStackName', 'N/A'),
-                            'DateCreated': env.get('DateCreated', 'N/A'),
-                            'DateUpdated': env.get('DateUpdated', 'N/A'),
-                            'CNAME': env.get('CNAME', 'N/A'),
-                            'Tier': env.get('Tier', {}).get('Name', 'N/A'),
-                            'InstanceCount': 0  # Will be updated below
-                        }
-                        
-                        # Get instance count and other resource details
-                        try:
-                            resources = eb_client.describe_environment_resources(
-                                EnvironmentName=env['EnvironmentName']
-                            )
-                            instances = resources['EnvironmentResources'].get('Instances', [])
-                            env_details['InstanceCount'] = len(instances)
-                        except ClientError as e:
-                            console.print(f"[yellow]Warning: Could not get resources for {env['EnvironmentName']} in {region}: {str(e)}[/yellow]")
-                        
-                        # Get configuration settings
-                        try:
-                            config_response = eb_client.describe_configuration_settings(
-                                ApplicationName=app['ApplicationName'],
-                                EnvironmentName=env['EnvironmentName']
-                            )
-                            option_settings = config_response.get('ConfigurationSettings', [{}])[0].get('OptionSettings', [])
-                            env_details['ConfigurationSettings'] = {
-                                opt['OptionName']: opt['Value'] 
-                                for opt in option_settings 
-                                if 'Value' in opt
-                            }
-                        except ClientError as e:
-                            console.print(f"[yellow]Warning: Could not get config settings for {env['EnvironmentName']} in {region}: {str(e)}[/yellow]")
-                        
-                        app_details['Environments'].append(env_details)
-                
+                    instances = resources['EnvironmentResources'].get('Instances', [])
+                    instance_count = len(instances)
                 except ClientError as e:
-                    console.print(f"[yellow]Warning: Could not get environments for {app['ApplicationName']} in {region}: {str(e)}[/yellow]")
+                    console.print(f"[yellow]Warning: Could not get resources for {env['EnvironmentName']} in {region}: {str(e)}[/yellow]")
                 
-                all_applications[region].append(app_details)
+                # Get configuration settings
+                try:
+                    config_response = eb_client.describe_configuration_settings(
+                        ApplicationName=app['ApplicationName'],
+                        EnvironmentName=env['EnvironmentName']
+                    )
+                    option_settings = config_response.get('ConfigurationSettings', [{}])[0].get('OptionSettings', [])
+                    configuration_settings = project_options(option_settings, options)
+                except ClientError as e:
+                    console.print(f"[yellow]Warning: Could not get config settings for {env['EnvironmentName']} in {region}: {str(e)}[/yellow]")
                 
+                environments.append(ElasticBeanstalkEnvironment.from_api(
+                    env, instance_count, configuration_settings))
+        
+        except ClientError as e:
+            console.print(f"[yellow]Warning: Could not get environments for {app['ApplicationName']} in {region}: {str(e)}[/yellow]")
+        
+        region_applications.append(ElasticBeanstalkApplication(
+            intern(region),
+            app.get('ApplicationName'),
+            app.get('Description'),
+            app.get('DateCreated'),
+            app.get('DateUpdated'),
+            tuple(environments),
+            tuple(app.get('ConfigurationTemplates', [])),
+            app.get('ResourceLifecycleConfig', {})
+        ))
+        
+    return region_applications
+
+def get_elasticbeanstalk_details(access_key, secret_key, regions, journal=None, on_region=None, console=None,
+                                 options=CONFIGURATION_OPTIONS):
+    """Get detailed information about Elastic Beanstalk applications in specified regions
+
+    Each region is one journal unit, so a resumed run only revisits the
+    regions the interrupted run had not finished. on_region(region,
+    applications) is called as each region completes. options lists the
+    configuration options kept per environment (None: all of them).
+    """
+    from botocore.exceptions import ClientError
+    from rich.console import Console
+    console = console or Console()
+    all_applications = {}
+    
+    plan_units(len(regions))
+    for region in tracked(regions):
+        try:
+            applications = run_unit(
+                journal, ['elasticbeanstalk', region, 'DescribeApplications'],
+                lambda: [to_dict(app) for app in get_region_applications(access_key, secret_key, region, console, options)])
         except ClientError as e:
-            console.print(f"[yellow]Warning: Unexpected error processing {region}: {str(e)}[/yellow]")
+            # Not journaled, so --resume retries the region
+            console.print(f"[yellow]Warning: Could not connect to Elastic Beanstalk in {region}: {str(e)}. Skipping this region.[/yellow]")
+            applications = []
+        if applications:
+            all_applications[region] = [ElasticBeanstalkApplication.from_dict(app) for app in applications]
+        if on_region:
+            on_region(region, all_applications.get(region, []))
     
     return all_applications
 
-def display_results(applications):
+def display_results(applications, console=None):
     """Display detailed Elastic Beanstalk application information"""
-    console = Console()
+    from rich.console import Console
+    from rich.table import Table
+    console = console or Console()
     
     for region, apps in applications.items():
         console.print(f"\n[bold cyan]Region: {region}[/bold cyan]")
         
         for app in apps:
             # Application Table
-            app_table = Table(title=f"Application: {app['ApplicationName']}")
+            app_table = Table(title=f"Application: {app.ApplicationName}")
             app_table.add_column("Property", style="cyan")
             app_table.add_column("Value", style="magenta")
             
-            app_table.add_row("Description", app['Description'])
-            app_table.add_row("Date Created", str(app['DateCreated']))
-            app_table.add_row("Date Updated", str(app['DateUpdated']))
-            app_table.add_row("Configuration Templates", ", ".join(app['ConfigurationTemplates']) or "None")
-            lifecycle = app['ResourceLifecycleConfig']
+            app_table.add_row("Description", display_value(app.Description))
+            app_table.add_row("Date Created", display_value(app.DateCreated))
+            app_table.add_row("Date Updated", display_value(app.DateUpdated))
+            app_table.add_row("Configuration Templates", ", ".join(app.ConfigurationTemplates) or "None")
+            lifecycle = app.ResourceLifecycleConfig or {}
             app_table.add_row("Service Role", lifecycle.get('ServiceRole', 'N/A'))
             app_table.add_row("Version Lifecycle", str(lifecycle.get('VersionLifecycleConfig', 'N/A')))
             
             console.print(app_table)
             
             # Environments Table
-            if app['Environments']:
+            if app.Environments:
                 env_table = Table(title="Environments")
                 env_table.add_column("Name", style="cyan")
                 env_table.add_column("Status", style="green")
@@ -161,32 +195,32 @@ def display_results(applications):
                 env_table.add_column("Instances", style="blue")
                 env_table.add_column("CNAME", style="white")
                 
-                for env in app['Environments']:
+                for env in app.Environments:
                     env_table.add_row(
-                        env['EnvironmentName'],
-                        env['Status'],
-                        f"{env['Health']} ({env['HealthStatus']})",
-                        env['VersionLabel'],
-                        str(env['InstanceCount']),
-                        env['CNAME']
+                        env.EnvironmentName,
+                        display_value(env.Status),
+                        f"{display_value(env.Health)} ({display_value(env.HealthStatus)})",
+                        display_value(env.VersionLabel),
+                        str(env.InstanceCount),
+                        display_value(env.CNAME)
                     )
                 
                 console.print(env_table)
                 
                 # Detailed Environment Information
-                for env in app['Environments']:
-                    detail_table = Table(title=f"Environment Details: {env['EnvironmentName']}")
+                for env in app.Environments:
+                    detail_table = Table(title=f"Environment Details: {env.EnvironmentName}")
                     detail_table.add_column("Property", style="cyan")
                     detail_table.add_column("Value", style="magenta")
                     
-                    detail_table.add_row("Solution Stack", env['SolutionStackName'])
-                    detail_table.add_row("Date Created", str(env['DateCreated']))
-                    detail_table.add_row("Date Updated", str(env['DateUpdated']))
-                    detail_table.add_row("Tier", env['Tier'])
+                    detail_table.add_row("Solution Stack", display_value(env.SolutionStackName))
+                    detail_table.add_row("Date Created", display_value(env.DateCreated))
+                    detail_table.add_row("Date Updated", display_value(env.DateUpdated))
+                    detail_table.add_row("Tier", display_value(env.Tier))
                     
                     # Add some key configuration settings if available
-                    if 'ConfigurationSettings' in env:
-                        config = env['ConfigurationSettings']
+                    if env.ConfigurationSettings is not None:
+                        config = env.ConfigurationSettings
                         detail_table.add_row("Instance Type", config.get('aws:autoscaling:launchconfiguration:InstanceType', 'N/A'))
                         detail_table.add_row("Min Instances", config.get('aws:autoscaling:asg:MinSize', 'N/A'))
                         detail_table.add_row("Max Instances", config.get('aws:autoscaling:asg:MaxSize', 'N/A'))
@@ -196,14 +230,33 @@ def display_results(applications):
             
             console.print()  # Add spacing between applications
 
-def main():
+def store_in_inventory(applications, account, path):
+    """Store applications and their environments in the local inventory"""
+    inventory = Inventory(path)
+    for region, apps in applications.items():
+        inventory.add_records(apps, account)
+        inventory.add_records([env for app in apps for env in app.Environments], account, region)
+    inventory.close()
+
+def main(argv=None):
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Elastic Beanstalk Application Details Tool')
     parser.add_argument('--access-key', required=True, help='AWS Access Key (plain or base64 encoded)')
     parser.add_argument('--secret-key', required=True, help='AWS Secret Key (plain or base64 encoded)')
     parser.add_argument('--region', help='AWS Region to check (e.g., us-east-1)')
     parser.add_argument('--all-regions', action='store_true', help='Check all known AWS regions')
-    args = parser.parse_args()
+    parser.add_argument('--inventory', nargs='?', const=DEFAULT_INVENTORY, metavar='DB',
+                        help=f'Also store results in the local inventory (default DB: {DEFAULT_INVENTORY})')
+    parser.add_argument('--fields', help='Comma-separated configuration options to keep per environment, as '
+                        'Namespace:OptionName, or "all" (default: the ones displayed)')
+    add_snapshot_arguments(parser)
+    add_journal_arguments(parser)
+    add_cassette_arguments(parser)
+    add_progress_arguments(parser)
+    args = parser.parse_args(argv)
+    from botocore.exceptions import BotoCoreError, ClientError
+    install_from_args(args)
+    from rich.console import Console
     
     # Decode keys
     access_key = decode_base64_key(args.access_key)
@@ -219,28 +272,72 @@ def main():
     else:
         parser.error("Either --region or --all-regions must be specified")
     
+    if args.fields == 'all':
+        options = None
+    else:
+        options = tuple(split_fields(args.fields)) or CONFIGURATION_OPTIONS
+    
+    try:
+        journal = RunJournal('enum_elasticbean', args.resume)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    
     console = Console()
+    status = Console(stderr=True)
+    status.print(f"[dim]Run ID: {journal.run_id}[/dim]")
     console.print(f"[bold green]Fetching Elastic Beanstalk Application Details for {action_msg}...[/bold green]")
     
     try:
         # Verify credentials first
-        sts_client = boto3.client(
-            'sts',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key
-        )
-        identity = sts_client.get_caller_identity()
+        identity = caller_identity(ClientPool(access_key, secret_key))
         console.print(f"[green]Authenticated as: {identity['Arn']}[/green]")
         
-        applications = get_elasticbeanstalk_details(access_key, secret_key, regions)
+        # Each region is displayed as soon as it completes, under a live status line
+        done = []
+        
+        def on_region(region, region_applications):
+            done.append(region)
+            if region_applications:
+                display_results({region: region_applications}, console)
+            if reporter is None or reporter.status is None:
+                status_line.update(f"[green]Elastic Beanstalk: {len(done)}/{len(regions)} regions done "
+                                   f"(last: {region})[/green]")
+        
+        with console.status("[green]Elastic Beanstalk: waiting for the first region...[/green]") as status_line:
+            # With progress reporting on a terminal, the progress line takes over the status line
+            reporter = progress_from_args(args, status=(
+                lambda text: status_line.update(f"[green]Elastic Beanstalk: {text}[/green]")) if console.is_terminal else None)
+            if reporter is not None:
+                reporter.start()
+            try:
+                applications = get_elasticbeanstalk_details(access_key, secret_key, regions, journal, on_region,
+                                                            console, options)
+            finally:
+                if reporter is not None:
+                    reporter.stop()
         if not any(applications.values()):
             console.print(f"[yellow]No Elastic Beanstalk applications found in {action_msg}.[/yellow]")
-        else:
-            display_results(applications)
+        elif args.inventory:
+            store_in_inventory(applications, identity['Account'], args.inventory)
+        if args.snapshot:
+            # Saved even when empty, so the next run's diff shows what appeared
+            with open_snapshot_writer(args.snapshot, 'enum_elasticbean', identity['Account']) as snapshot:
+                for region, apps in applications.items():
+                    snapshot.add_records(apps)
+                    snapshot.add_records([env for app in apps for env in app.Environments], region)
+            console.print(f"[green]Saved snapshot {snapshot.path}[/green]")
     except ClientError as e:
         console.print(f"[bold red]Authentication Error: {str(e)}[/bold red]")
+    except (KeyboardInterrupt, BotoCoreError) as e:
+        status.print(f"\n[bold yellow]Run interrupted ({type(e).__name__}). "
+                     f"Resume with --resume {journal.run_id}[/bold yellow]")
     except Exception as e:
         console.print(f"[bold red]Error: {str(e)}[/bold red]")
+    finally:
+        journal.close()
+    if journal.resumed:
+        status.print(f"[dim]Resumed {journal.run_id}: {journal.reused} regions from the journal, "
+                     f"{journal.executed} fetched[/dim]")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+from aws_clients import ClientPool, decode_base64_key, run_concurrently
+from cassette import add_cassette_arguments, install_from_args
+from enum_all import paginate
+from inventory import DEFAULT_INVENTORY, Inventory, InventorySink
+from output_sink import TeeSink, open_sink
+
+def describe_eks_cluster(eks, region, name):
+    """Cluster details plus its nodegroup names"""
+    cluster = eks.describe_cluster(name=name)['cluster']
+    vpc_config = cluster.get('resourcesVpcConfig', {})
+    return {
+        'ResourceType': 'eks:cluster',
+        'Region': region,
+        'Name': name,
+        'Arn': cluster.get('arn'),
+        'Version': cluster.get('version'),
+        'Status': cluster.get('status'),
+        'Endpoint': cluster.get('endpoint'),
+        'PublicAccess': vpc_config.get('endpointPublicAccess'),
+        'PublicAccessCidrs': vpc_config.get('publicAccessCidrs'),
+        'VpcId': vpc_config.get('vpcId'),
+        'RoleArn': cluster.get('roleArn'),
+        'Nodegroups': list(paginate(eks, 'list_nodegroups', 'nodegroups', clusterName=name)),
+        'CreatedAt': cluster.get('createdAt')
+    }
+
+def collect_eks_clusters(pool, region, max_workers=8):
+    """List every cluster in a region and enrich them in parallel"""
+    eks = pool.client('eks', region)
+    names = list(paginate(eks, 'list_clusters', 'clusters'))
+    tasks = {name: (lambda name=name: describe_eks_cluster(eks, region, name)) for name in names}
+    records = []
+    for name, record, error in run_concurrently(tasks, max_workers):
+        if error is not None:
+            # Still report the cluster when only the enrichment call is denied
+            record = {'ResourceType': 'eks:cluster', 'Region': region, 'Name': name, 'Error': str(error)}
+        records.append(record)
+    return records
+
+def collect_secrets(pool, region):
+    """Secret metadata only; secret values are never requested"""
+    secretsmanager = pool.client('secretsmanager', region)
+    records = []
+    for secret in paginate(secretsmanager, 'list_secrets', 'SecretList'):
+        records.append({
+            'ResourceType': 'secretsmanager:secret',
+            'Region': region,
+            'Name': secret.get('Name'),
+            'Arn': secret.get('ARN'),
+            'RotationEnabled': secret.get('RotationEnabled', False),
+            'LastChangedDate': secret.get('LastChangedDate'),
+            'LastRotatedDate': secret.get('LastRotatedDate'),
+            'KmsKeyId': secret.get('KmsKeyId')
+        })
+    return records
+
+COLLECTORS = {
+    'eks': collect_eks_clusters,
+    'secretsmanager': collect_secrets
+}
+
+def run_inventory(pool, regions, sink, services=None, max_workers=32):
+    """Run the EKS and Secrets Manager collectors for every region concurrently"""
+    services = services or list(COLLECTORS)
+    tasks = {(service, region): (lambda c=COLLECTORS[service], r=region: c(pool, r))
+             for service in services for region in regions}
+    count = 0
+    for (service, region), records, error in run_concurrently(tasks, max_workers):
+        if error is not None:
+            sink.error(service, region, str(error))
+            continue
+        for record in records:
+            sink.write(record)
+        count += len(records)
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inventory EKS clusters and Secrets Manager secret metadata across regions')
+    parser.add_argument('--profile', help='AWS profile name to use')
+    parser.add_argument('--access-key', help='AWS Access Key (plain or base64 encoded)')
+    parser.add_argument('--secret-key', help='AWS Secret Key (plain or base64 encoded)')
+    parser.add_argument('--region', action='append', help='Region to check (repeatable, default: all enabled regions)')
+    parser.add_argument('--services', help='Comma-separated subset of: %s' % ','.join(COLLECTORS))
+    parser.add_argument('--format', choices=['table', 'jsonl'], default='table', help='Output format')
+    parser.add_argument('--output', help='Write JSONL output to this file instead of stdout')
+    parser.add_argument('--workers', type=int, default=32, help='Maximum concurrent API tasks')
+    parser.add_argument('--inventory', nargs='?', const=DEFAULT_INVENTORY, metavar='DB',
+                        help=f'Also store results in the local inventory (default DB: {DEFAULT_INVENTORY})')
+    add_cassette_arguments(parser)
+    args = parser.parse_args(argv)
+    from botocore.exceptions import ClientError, NoCredentialsError
+    install_from_args(args)
+
+    if bool(args.access_key) != bool(args.secret_key):
+        parser.error("--access-key and --secret-key must be given together")
+
+    pool = ClientPool(
+        access_key=decode_base64_key(args.access_key) if args.access_key else None,
+        secret_key=decode_base64_key(args.secret_key) if args.secret_key else None,
+        profile=args.profile
+    )
+    services = args.services.split(',') if args.services else None
+
+    try:
+        regions = args.region or pool.get_all_regions()
+        account = pool.get_account_id() if args.inventory else None
+    except (ClientError, NoCredentialsError) as e:
+        print(f"Error listing regions: {e}", file=sys.stderr)
+        return 1
+
+    sink = open_sink(args.format, args.output, title='EKS and Secrets Manager')
+    if args.inventory:
+        sink = TeeSink(sink, InventorySink(Inventory(args.inventory), account))
+    with sink:
+        run_inventory(pool, regions, sink, services, args.workers)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+import argparse
+import ipaddress
+import sys
+
+from aws_clients import (ClientPool, Deadline, DeadlineExceeded, DeadRegionCache, add_timeout_arguments,
+                         client_config, decode_base64_key, is_dead_region_error, run_concurrently)
+from cassette import add_cassette_arguments, install_from_args
+from output_sink import open_sink
+from projection import FieldSpec, project_pages
+
+# Which running instances a source network can reach, and on which ports.
+# Security groups are listed once per region in bulk and their ingress
+# rules are indexed by CIDR: one dict per prefix length, keyed by the
+# masked network address. The rules whose CIDR contains a source are found
+# with one lookup per prefix length in use, not by scanning every rule.
+# Each group's matching port ranges are merged into sorted, disjoint
+# intervals once, and an instance's exposure is the union of its groups'.
+# Rules that allow another security group form a graph; a breadth-first
+# walk from the directly exposed instances finds the instances reachable
+# one or more hops further in. Each group is expanded once, so the cost
+# is linear in rules, group references and instance memberships. Network
+# ACLs and routes are not evaluated and prefix-list rules are skipped.
+
+# Sources checked when none are given: anywhere on the internet
+INTERNET = ('0.0.0.0/0', '::/0')
+
+# IpProtocol numbers the API may return instead of names
+PROTOCOL_NAMES = {'6': 'tcp', '17': 'udp', '1': 'icmp', '58': 'icmpv6'}
+
+ALL_TRAFFIC = ('-1', 0, 65535)
+
+INSTANCE_FIELDS = FieldSpec([
+    'InstanceId', 'PublicIpAddress', 'PrivateIpAddress', 'Tags', 'SecurityGroups.GroupId',
+    'NetworkInterfaces.Groups.GroupId', 'NetworkInterfaces.Ipv6Addresses.Ipv6Address'
+])
+GROUP_FIELDS = FieldSpec([
+    'GroupId', 'GroupName', 'IpPermissions.IpProtocol', 'IpPermissions.FromPort', 'IpPermissions.ToPort',
+    'IpPermissions.IpRanges.CidrIp', 'IpPermissions.Ipv6Ranges.CidrIpv6', 'IpPermissions.UserIdGroupPairs.GroupId'
+])
+
+def port_range(permission):
+    """(protocol, from, to) allowed by an ingress permission
+
+    Protocol '-1' is all traffic. Protocols other than TCP and UDP are
+    reported whole, as (protocol, -1, -1).
+    """
+    protocol = str(permission.get('IpProtocol', '-1')).lower()
+    protocol = PROTOCOL_NAMES.get(protocol, protocol)
+    if protocol == '-1':
+        return ALL_TRAFFIC
+    if protocol not in ('tcp', 'udp'):
+        return (protocol, -1, -1)
+    from_port = permission.get('FromPort')
+    if from_port is None or from_port == -1:
+        return (protocol, 0, 65535)
+    return (protocol, from_port, permission.get('ToPort', from_port))
+
+def merge_ports(ranges):
+    """Sorted, disjoint port ranges; all traffic absorbs everything else"""
+    merged = []
+    for protocol, start, end in sorted(ranges):
+        if protocol == '-1':
+            return [ALL_TRAFFIC]
+        if merged and merged[-1][0] == protocol and start <= merged[-1][2] + 1:
+            if end > merged[-1][2]:
+                merged[-1] = (protocol, merged[-1][1], end)
+        else:
+            merged.append((protocol, start, end))
+    return merged
+
+def covers_port(ranges, port):
+    """True if merged ranges allow port over TCP or UDP"""
+    return any(protocol == '-1' or (protocol in ('tcp', 'udp') and start <= port <= end)
+               for protocol, start, end in ranges)
+
+def format_ports(ranges):
+    labels = []
+    for protocol, start, end in ranges:
+        if protocol == '-1':
+            labels.append('all')
+        elif start == -1:
+            labels.append(protocol)
+        elif start == end:
+            labels.append(f"{start}/{protocol}")
+        else:
+            labels.append(f"{start}-{end}/{protocol}")
+    return ', '.join(labels)
+
+class RuleIndex:
+    """Ingress rules of one region's security groups, by source CIDR and by referenced group"""
+
+    def __init__(self, groups):
+        self.names = {}
+        # version -> prefix length -> {network address as int: [(group id, port range)]}
+        self.networks = {4: {}, 6: {}}
+        # referenced group -> [(group id allowing it, port range)]
+        self.references = {}
+        self.rules = 0
+        parsed = {}
+        for group in groups:
+            group_id = group['GroupId']
+            self.names[group_id] = group.get('GroupName')
+            for permission in group.get('IpPermissions', []):
+                ports = port_range(permission)
+                cidrs = [r.get('CidrIp') for r in permission.get('IpRanges', [])]
+                cidrs += [r.get('CidrIpv6') for r in permission.get('Ipv6Ranges', [])]
+                for cidr in cidrs:
+                    if not cidr:
+                        continue
+                    network = parsed.get(cidr)
+                    if network is None:
+                        network = parsed[cidr] = ipaddress.ip_network(cidr, strict=False)
+                    by_length = self.networks[network.version].setdefault(network.prefixlen, {})
+                    by_length.setdefault(int(network.network_address), []).append((group_id, ports))
+                    self.rules += 1
+                for pair in permission.get('UserIdGroupPairs', []):
+                    if pair.get('GroupId'):
+                        self.references.setdefault(pair['GroupId'], []).append((group_id, ports))
+                        self.rules += 1
+
+    def exposed_groups(self, source):
+        """{group id: merged port ranges} open to every address of source (an ip_network)"""
+        ranges = {}
+        bits = source.max_prefixlen
+        address = int(source.network_address)
+        for prefixlen, networks in self.networks[source.version].items():
+            if prefixlen > source.prefixlen:
+                continue  # narrower than the source: some of its addresses are not allowed
+            mask = ((1 << bits) - 1) ^ ((1 << (bits - prefixlen)) - 1)
+            for group_id, ports in networks.get(address & mask, ()):
+                ranges.setdefault(group_id, []).append(ports)
+        return {group_id: merge_ports(group_ranges) for group_id, group_ranges in ranges.items()}
+
+    def label(self, group_id):
+        return f"{group_id} ({self.names.get(group_id) or 'N/A'})"
+
+def instance_groups(instance):
+    """Security group IDs of an instance and all its network interfaces"""
+    group_ids = [group['GroupId'] for group in instance.get('SecurityGroups', [])]
+    for interface in instance.get('NetworkInterfaces', []):
+        group_ids.extend(group['GroupId'] for group in interface.get('Groups', []))
+    return list(dict.fromkeys(group_ids))
+
+def reachable_address(instance, source):
+    """Address of instance that traffic from source can be sent to, or None
+
+    Private sources reach instances over their private address; other
+    IPv4 sources need a public IP.
+    """
+    if source.version == 6:
+        return next((address['Ipv6Address'] for interface in instance.get('NetworkInterfaces', [])
+                     for address in interface.get('Ipv6Addresses', [])), None)
+    if source.is_private:
+        return instance.get('PrivateIpAddress')
+    return instance.get('PublicIpAddress')
+
+def analyze_region(region, instances, groups, sources=INTERNET, lateral=True, ports=None):
+    """Exposure of one region's instances, one finding dict per (instance, source)
+
+    Exposure is 'direct' when a source address reaches the instance, or
+    'lateral' when it is reachable from a directly exposed instance through
+    group references, Hops steps away. With ports, only instances exposed
+    on one of them are reported.
+    """
+    index = RuleIndex(groups)
+    memberships = [instance_groups(instance) for instance in instances]
+    members = {}
+    for position, group_ids in enumerate(memberships):
+        for group_id in group_ids:
+            members.setdefault(group_id, []).append(position)
+
+    findings = []
+    for source_text in sources:
+        source = ipaddress.ip_network(source_text, strict=False)
+        exposed = index.exposed_groups(source)
+        reached = {}  # instance position -> (hops, via group, merged ranges, address)
+        for position, instance in enumerate(instances):
+            ranges = [r for group_id in memberships[position] for r in exposed.get(group_id, ())]
+            if ranges:
+                address = reachable_address(instance, source)
+                if address:
+                    reached[position] = (0, None, merge_ports(ranges), address)
+
+        frontier = list(reached) if lateral else []
+        expanded = set()
+        targeted = set()
+        hops = 0
+        while frontier:
+            hops += 1
+            # Groups that let in a group holding an instance reached so far
+            targets = {}
+            for position in frontier:
+                for group_id in memberships[position]:
+                    if group_id in expanded:
+                        continue
+                    expanded.add(group_id)
+                    for target, target_ports in index.references.get(group_id, ()):
+                        if target not in targeted:
+                            targets.setdefault(target, (group_id, []))[1].append(target_ports)
+            frontier = []
+            for target, (via, target_ranges) in targets.items():
+                targeted.add(target)
+                target_ranges = merge_ports(target_ranges)
+                for position in members.get(target, ()):
+                    if position not in reached:
+                        reached[position] = (hops, via, target_ranges, instances[position].get('PrivateIpAddress'))
+                        frontier.append(position)
+
+        for position in sorted(reached):
+            hops, via, ranges, address = reached[position]
+            if ports and not any(covers_port(ranges, port) for port in ports):
+                continue
+            instance = instances[position]
+            findings.append({
+                'ResourceType': 'ec2:exposure',
+                'Region': region,
+                'InstanceId': instance.get('InstanceId'),
+                'Name': next((tag['Value'] for tag in instance.get('Tags', []) if tag['Key'] == 'Name'), None),
+                'Address': address,
+                'Source': source_text,
+                'Exposure': 'direct' if hops == 0 else 'lateral',
+                'Hops': hops,
+                'Via': index.label(via) if via else None,
+                'Ports': format_ports(ranges)
+            })
+    return findings, index.rules
+
+def collect_region(pool, region):
+    """Running instances and all security groups of a region, listed in bulk"""
+    ec2 = pool.client('ec2', region)
+    running = [{'Name': 'instance-state-name', 'Values': ['running']}]
+    instances = list(project_pages(ec2.get_paginator('describe_instances').paginate(Filters=running),
+                                   'Reservations.Instances', INSTANCE_FIELDS))
+    groups = list(project_pages(ec2.get_paginator('describe_security_groups').paginate(),
+                                'SecurityGroups', GROUP_FIELDS))
+    return instances, groups
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find EC2 instances reachable from the internet (or a given network) '
+                                                 'through their security groups')
+    parser.add_argument('--profile', help='AWS profile name to use')
+    parser.add_argument('--access-key', help='AWS Access Key (plain or base64 encoded)')
+    parser.add_argument('--secret-key', help='AWS Secret Key (plain or base64 encoded)')
+    parser.add_argument('--region', action='append', help='Region to check (repeatable, default: all enabled regions)')
+    parser.add_argument('--source', action='append', metavar='CIDR',
+                        help='Source network to check, repeatable (default: 0.0.0.0/0 and ::/0)')
+    parser.add_argument('--port', action='append', type=int, help='Only report instances exposed on this port (repeatable)')
+    parser.add_argument('--no-lateral', action='store_true',
+                        help='Only report direct exposure, not instances reachable through security group references')
+    parser.add_argument('--format', choices=['table', 'jsonl'], default='table', help='Output format')
+    parser.add_argument('--output', help='Write JSONL output to this file instead of stdout')
+    parser.add_argument('--workers', type=int, default=16, help='Maximum regions listed concurrently')
+    add_timeout_arguments(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args(argv)
+    from botocore.exceptions import ClientError, NoCredentialsError
+    install_from_args(args)
+
+    if bool(args.access_key) != bool(args.secret_key):
+        parser.error("--access-key and --secret-key must be given together")
+    sources = args.source or list(INTERNET)
+    for source in sources:
+        try:
+            ipaddress.ip_network(source, strict=False)
+        except ValueError as e:
+            parser.error(f"Invalid --source: {e}")
+
+    deadline = Deadline(args.deadline)
+    access_key = decode_base64_key(args.access_key) if args.access_key else None
+    pool = ClientPool(
+        access_key=access_key,
+        secret_key=decode_base64_key(args.secret_key) if args.secret_key else None,
+        profile=args.profile,
+        config=client_config(args.connect_timeout, args.read_timeout, args.max_attempts, deadline),
+        deadline=deadline
+    )
+    dead_regions = DeadRegionCache(ttl=args.dead_region_ttl)
+    dead_region_key = pool.access_key_id()
+
+    try:
+        regions = args.region or pool.get_all_regions()
+    except (ClientError, NoCredentialsError) as e:
+        print(f"Error listing regions: {e}", file=sys.stderr)
+        return 1
+
+    tasks = {}
+    sink = open_sink(args.format, args.output, title='EC2 Exposure')
+    counts = {'direct': 0, 'lateral': 0}
+    rules = 0
+    with sink:
+        for region in regions:
+            reason = dead_regions.reason(dead_region_key, region, 'ec2')
+            if reason:
+                sink.error('ec2', region, f"skipped, {reason}")
+            else:
+                tasks[region] = lambda r=region: collect_region(pool, r)
+        for region, result, error in run_concurrently(tasks, args.workers, deadline):
+            if error is not None:
+                if isinstance(error, DeadlineExceeded):
+                    message = 'deadline reached'
+                elif is_dead_region_error(error):
+                    message = dead_regions.mark_dead(dead_region_key, region, error, 'ec2')
+                else:
+                    message = str(error)
+                sink.error('ec2', region, message)
+                continue
+            instances, groups = result
+            findings, region_rules = analyze_region(region, instances, groups, sources, not args.no_lateral, args.port)
+            rules += region_rules
+            for finding in findings:
+                counts[finding['Exposure']] += 1
+                sink.write(finding)
+    print(f"{counts['direct']} direct and {counts['lateral']} lateral exposures from {', '.join(sources)}; "
+          f"{rules} ingress rules indexed in {len(tasks)} regions", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# HTTP responses are cached on disk per URL and auth identity so repeated
+# Artifactory probes transfer only what changed. Stored ETag/Last-Modified
+# validators are sent back as If-None-Match/If-Modified-Since and a 304 is
+# answered from disk; a per-request TTL serves recent entries without any
+# request, which covers endpoints that send no validators. The identity is
+# a hash of the Authorization header, which is never stored. Files are
+# created 0600 in a 0700 directory. AWSENUM_HTTP_CACHE points the cache
+# elsewhere, or disables it with "off".
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.awsenum', 'http')
+
+# Response headers kept with a cached body
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+class HttpCache:
+    """Conditional-request cache for GET requests made through cassette.http_request"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    def _path(self, method, url, headers):
+        identity = hashlib.sha256((headers or {}).get('Authorization', '').encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, hashlib.sha256(f"{method} {url} {identity}".encode('utf-8')).hexdigest())
+
+    def _load(self, path):
+        try:
+            with open(path + '.json') as f:
+                meta = json.load(f)
+            with open(path + '.body', 'rb') as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _write(self, path, data):
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def _store(self, path, response, meta=None):
+        if meta is None:
+            meta = {'url': response.url, 'status': response.status_code,
+                    'headers': {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}}
+            self._write(path + '.body', response.content)
+        meta['stored'] = time.time()
+        self._write(path + '.json', json.dumps(meta).encode('utf-8'))
+
+    def _response(self, meta, body, source):
+        import requests
+        response = requests.models.Response()
+        response.status_code = meta['status']
+        response.url = meta['url']
+        response.headers = requests.structures.CaseInsensitiveDict(meta['headers'])
+        response.headers['X-Awsenum-Cache'] = source
+        response._content = body
+        return response
+
+    def request(self, method, url, headers=None, ttl=0, **kwargs):
+        """cassette.http_request, answered from or revalidated against the cache
+
+        Entries younger than ttl seconds are served without a request.
+        Older ones are revalidated if they have validators and refetched
+        otherwise. Only successful GET responses are cached.
+        """
+        from cassette import http_request
+        if method != 'GET':
+            return http_request(method, url, headers=headers, **kwargs)
+        path = self._path(method, url, headers)
+        meta, body = self._load(path)
+        conditional = dict(headers or {})
+        if meta is not None:
+            if time.time() - meta['stored'] < ttl:
+                with self._lock:
+                    self.hits += 1
+                return self._response(meta, body, 'hit')
+            if 'ETag' in meta['headers']:
+                conditional['If-None-Match'] = meta['headers']['ETag']
+            if 'Last-Modified' in meta['headers']:
+                conditional['If-Modified-Since'] = meta['headers']['Last-Modified']
+
+        response = http_request(method, url, headers=conditional, **kwargs)
+        with self._lock:
+            self.bytes_received += len(response.content)
+        if response.status_code == 304 and meta is not None:
+            self._store(path, response, meta)
+            with self._lock:
+                self.revalidated += 1
+            return self._response(meta, body, 'revalidated')
+        with self._lock:
+            self.fetched += 1
+        if response.status_code == 200 and (ttl or any(name in response.headers for name in ('ETag', 'Last-Modified'))):
+            self._store(path, response)
+        return response
+
+def default_cache():
+    """The HTTP cache configured from AWSENUM_HTTP_CACHE, or None when disabled or under a cassette
+
+    Cassettes key requests on URL and body only, so conditional requests
+    would not replay against them.
+    """
+    import cassette
+    setting = os.environ.get('AWSENUM_HTTP_CACHE', DEFAULT_CACHE_DIR)
+    if setting == 'off' or cassette.ACTIVE is not None:
+        return None
+    return HttpCache(setting)
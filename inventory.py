@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from records import display_value, to_dict
+
+_encode = json.JSONEncoder(default=str, check_circular=False, separators=(',', ':')).encode
+
+DEFAULT_INVENTORY = os.path.join(os.path.expanduser('~'), '.awsenum', 'inventory.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    uid TEXT PRIMARY KEY,
+    account TEXT,
+    region TEXT,
+    resource_type TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    name TEXT,
+    public_ip TEXT,
+    private_ip TEXT,
+    vpc_id TEXT,
+    cname TEXT,
+    collected_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    uid TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS resources_account ON resources (account);
+CREATE INDEX IF NOT EXISTS resources_region ON resources (region);
+CREATE INDEX IF NOT EXISTS resources_type ON resources (resource_type);
+CREATE INDEX IF NOT EXISTS resources_id ON resources (resource_id);
+CREATE INDEX IF NOT EXISTS resources_name ON resources (name);
+CREATE INDEX IF NOT EXISTS resources_public_ip ON resources (public_ip);
+CREATE INDEX IF NOT EXISTS resources_private_ip ON resources (private_ip);
+CREATE INDEX IF NOT EXISTS resources_vpc ON resources (vpc_id);
+CREATE INDEX IF NOT EXISTS resources_cname ON resources (cname);
+CREATE INDEX IF NOT EXISTS tags_uid ON tags (uid);
+CREATE INDEX IF NOT EXISTS tags_key_value ON tags (key, value);
+"""
+
+# Field holding the resource ID, tried in order, for records and sink dicts
+ID_FIELDS = ['SnapshotId', 'VolumeId', 'InstanceId', 'DBInstanceId', 'ClusterId', 'FunctionName', 'ResourceId', 'Arn',
+             'EnvironmentName', 'ApplicationName', 'Name']
+
+def first_field(data, *fields):
+    for field in fields:
+        value = data.get(field)
+        if value:
+            return value
+    return None
+
+def resource_key(data, account=None, region=None):
+    """(uid, account, region, resource type, resource ID) of a record dict
+
+    The uid is account:region:type:id, unique per resource and stable
+    across runs.
+    """
+    resource_type = data['ResourceType']
+    resource_id = first_field(data, *ID_FIELDS)
+    account = data.get('Account') or account
+    region = data.get('Region') or region
+    return f"{account}:{region}:{resource_type}:{resource_id}", account, region, resource_type, resource_id
+
+def inventory_row(record, account=None, region=None, collected_at=None):
+    """Flatten a record or sink dict into (resources row, [(key, value) tags])"""
+    data = record if isinstance(record, dict) else to_dict(record)
+    details = data.get('Details') or {}
+    uid, account, region, resource_type, resource_id = resource_key(data, account, region)
+    tags = data.get('Tags') or []
+    if isinstance(tags, dict):
+        tags = list(tags.items())
+    row = (
+        uid,
+        account,
+        region,
+        resource_type,
+        resource_id,
+        first_field(data, 'Name', 'ApplicationName', 'EnvironmentName', 'FunctionName'),
+        first_field(data, 'PublicIP', 'PublicIp'),
+        first_field(data, 'PrivateIP', 'PrivateIp'),
+        first_field(data, 'VpcId') or details.get('VpcId'),
+        first_field(data, 'CNAME', 'Endpoint'),
+        collected_at or time.time(),
+        _encode(data)
+    )
+    return row, [(uid, key, value) for key, value in tags]
+
+class Inventory:
+    """Local SQLite store of every enumerated resource, indexed for lookups"""
+
+    def __init__(self, path=DEFAULT_INVENTORY):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def add_records(self, records, account=None, region=None):
+        """Bulk upsert records in a single transaction; returns the number stored
+
+        Re-ingesting a resource replaces its previous row and tags, so the
+        inventory always reflects the latest run that saw it.
+        """
+        now = time.time()
+        rows = []
+        tags = []
+        for record in records:
+            row, row_tags = inventory_row(record, account, region, now)
+            rows.append(row)
+            tags.extend(row_tags)
+        if not rows:
+            return 0
+        with self.conn:
+            self.conn.executemany('DELETE FROM tags WHERE uid = ?', [(row[0],) for row in rows])
+            self.conn.executemany('INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self.conn.executemany('INSERT INTO tags VALUES (?, ?, ?)', tags)
+        return len(rows)
+
+    def query(self, account=None, region=None, resource_type=None, resource_id=None, ip=None,
+              vpc_id=None, cname=None, tags=(), name=None, limit=None):
+        """Return matching resources as dicts; every exact-match filter is served by an index
+
+        cname and name accept SQL LIKE wildcards (%), which scan the table. tags is a list of
+        (key, value) pairs, value None matching any value.
+        """
+        clauses = []
+        params = []
+        for column, value in (('account', account), ('region', region), ('resource_type', resource_type),
+                              ('resource_id', resource_id), ('vpc_id', vpc_id)):
+            if value:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        for column, value in (('cname', cname), ('name', name)):
+            if value:
+                clauses.append(f'{column} LIKE ?' if '%' in value else f'{column} = ?')
+                params.append(value)
+        if ip:
+            clauses.append('(public_ip = ? OR private_ip = ?)')
+            params += [ip, ip]
+        for key, value in tags:
+            if value is None:
+                clauses.append('uid IN (SELECT uid FROM tags WHERE key = ?)')
+                params.append(key)
+            else:
+                clauses.append('uid IN (SELECT uid FROM tags WHERE key = ? AND value = ?)')
+                params += [key, value]
+        sql = 'SELECT account, data FROM resources'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY uid'  # uid is account:region:type:id, so this sorts the same way via the primary key
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        results = []
+        for account_id, data in self.conn.execute(sql, params):
+            result = json.loads(data)
+            result.setdefault('Account', account_id)
+            results.append(result)
+        return results
+
+    def close(self):
+        self.conn.close()
+
+class InventorySink:
+    """Output sink that ingests records into an Inventory in bulk transactions"""
+
+    def __init__(self, inventory, account=None, flush_every=5000):
+        self.inventory = inventory
+        self.account = account
+        self.flush_every = flush_every
+        self.pending = []
+
+    def write(self, record):
+        self.pending.append(record)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def write_batch(self, batch):
+        self.pending.extend(batch)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def error(self, service, region, message):
+        pass
+
+    def flush(self):
+        self.inventory.add_records(self.pending, self.account)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.inventory.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_tag(text):
+    key, sep, value = text.partition('=')
+    return key, (value if sep else None)
+
+def display_query_results(results):
+    """Display query results in a rich table"""
+    from rich.console import Console
+    from rich.table import Table
+    console = Console()
+
+    table = Table(title="Inventory Query Results")
+    table.add_column("Account", style="cyan")
+    table.add_column("Region", style="cyan")
+    table.add_column("Type", style="blue")
+    table.add_column("Resource ID", style="magenta")
+    table.add_column("Name", style="green")
+    table.add_column("Public IP", style="white")
+    table.add_column("Private IP", style="white")
+    table.add_column("CNAME / Endpoint", style="white")
+
+    for result in results:
+        table.add_row(
+            display_value(result.get('Account')),
+            display_value(result.get('Region')),
+            result['ResourceType'],
+            display_value(first_field(result, *ID_FIELDS)),
+            display_value(first_field(result, 'Name', 'ApplicationName', 'EnvironmentName', 'FunctionName')),
+            display_value(first_field(result, 'PublicIP', 'PublicIp')),
+            display_value(first_field(result, 'PrivateIP', 'PrivateIp')),
+            display_value(first_field(result, 'CNAME', 'Endpoint'))
+        )
+
+    console.print(table)
+    console.print(f"\nMatching resources: {len(results)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query the local resource inventory without calling AWS')
+    parser.add_argument('--db', default=DEFAULT_INVENTORY, help=f'Inventory database (default: {DEFAULT_INVENTORY})')
+    parser.add_argument('--account', help='Account ID')
+    parser.add_argument('--region', help='Region')
+    parser.add_argument('--type', dest='resource_type', help='Resource type, e.g. ec2:instance, s3:bucket')
+    parser.add_argument('--id', dest='resource_id', help='Resource ID (instance ID, bucket name, ...)')
+    parser.add_argument('--ip', help='Public or private IP address')
+    parser.add_argument('--vpc', help='VPC ID')
+    parser.add_argument('--cname', help='CNAME or endpoint (%% wildcards allowed)')
+    parser.add_argument('--name', help='Name (%% wildcards allowed)')
+    parser.add_argument('--tag', action='append', default=[], help='KEY=VALUE or KEY (repeatable)')
+    parser.add_argument('--limit', type=int, help='Maximum number of results')
+    parser.add_argument('--format', choices=['table', 'jsonl'], default='table', help='Output format')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Inventory not found: {args.db} (run an enumerator with --inventory first)", file=sys.stderr)
+        return 1
+
+    inventory = Inventory(args.db)
+    results = inventory.query(
+        account=args.account, region=args.region, resource_type=args.resource_type,
+        resource_id=args.resource_id, ip=args.ip, vpc_id=args.vpc, cname=args.cname,
+        name=args.name, tags=[parse_tag(tag) for tag in args.tag], limit=args.limit
+    )
+    inventory.close()
+
+    if args.format == 'jsonl':
+        for result in results:
+            print(json.dumps(result, default=str))
+    else:
+        display_query_results(results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
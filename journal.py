@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_RUN_DIR = os.path.join(os.path.expanduser('~'), '.awsenum', 'runs')
+
+class RunJournal:
+    """Append-only log of completed enumeration units, used to resume interrupted runs
+
+    Each unit is a list such as [service, region, operation] and is written
+    with its JSON result as soon as it completes. Resuming loads those
+    results and only the missing units make API calls. Units that raised
+    are not journaled, so a resume retries them. Journals can hold
+    resource details, so they are created readable by the owner only.
+    """
+
+    def __init__(self, tool, run_id=None, directory=DEFAULT_RUN_DIR):
+        self.tool = tool
+        self.resumed = run_id is not None
+        self.run_id = run_id or f"{tool}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        if os.path.basename(self.run_id) != self.run_id:
+            raise ValueError(f"Invalid run ID: {self.run_id}")
+        self.path = os.path.join(directory, f"{self.run_id}.jsonl")
+        self.completed = {}
+        self.reused = 0
+        self.executed = 0
+        self._lock = threading.Lock()
+        if self.resumed:
+            self.load()
+        else:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._file = os.fdopen(fd, 'a', encoding='utf-8')
+        if not self.resumed:
+            self._append({'run': self.run_id, 'tool': tool, 'started': time.time()})
+
+    def load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"No journal for run {self.run_id} in {os.path.dirname(self.path)}")
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # last line cut short by the interruption
+                if 'tool' in entry and entry['tool'] != self.tool:
+                    raise ValueError(f"Run {self.run_id} was recorded by {entry['tool']}, not {self.tool}")
+                if 'unit' in entry:
+                    self.completed[json.dumps(entry['unit'])] = entry['result']
+
+    def _append(self, entry):
+        line = json.dumps(entry, default=str, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def run(self, unit, func):
+        """Return the journaled result of unit, or call func() and journal its result"""
+        key = json.dumps(unit)
+        if key in self.completed:
+            self.reused += 1
+            return self.completed[key]
+        result = func()
+        self._append({'unit': unit, 'result': result})
+        self.completed[key] = result
+        self.executed += 1
+        return result
+
+    def close(self):
+        self._file.close()
+
+def run_unit(journal, unit, func):
+    """journal.run(unit, func), or just func() when the run is not journaled"""
+    if journal is None:
+        return func()
+    return journal.run(unit, func)
+
+def add_journal_arguments(parser):
+    parser.add_argument('--resume', metavar='RUN_ID', help='Resume an interrupted run, only calling AWS for units it had not finished')
@@ -1,9 +1,13 @@
-import boto3
 import base64
-from botocore.exceptions import ClientError
-from rich.console import Console
-from rich.table import Table
 import argparse
+from cassette import add_cassette_arguments, install_from_args
+
+from aws_clients import ClientPool
+from credential_cache import caller_identity
+from inventory import DEFAULT_INVENTORY, Inventory
+from live_table import StreamingTable, add_table_arguments
+from records import S3Bucket, intern
+from snapshot import add_snapshot_arguments, open_snapshot_writer
 
 def decode_base64_key(encoded_key):
     """Decode base64 encoded key if necessary"""
@@ -13,20 +17,21 @@ def decode_base64_key(encoded_key):
         return encoded_key  # Return as-is if not base64 encoded
 
 def get_user_id(access_key, secret_key):
-    """Get AWS user ID using the provided credentials"""
+    """Get AWS user ID using the provided credentials (cached across runs, see credential_cache)"""
+    from botocore.exceptions import ClientError
     try:
-        sts_client = boto3.client(
-            'sts',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key
-        )
-        identity = sts_client.get_caller_identity()
+        identity = caller_identity(ClientPool(access_key, secret_key))
         return identity['UserId'], identity['Arn']
     except ClientError as e:
         return None, f"Error: {str(e)}"
 
-def list_accessible_buckets(access_key, secret_key):
-    """List all S3 buckets and test basic accessibility"""
+def list_accessible_buckets(access_key, secret_key, on_bucket=None):
+    """List all S3 buckets and test basic accessibility
+
+    on_bucket(bucket) is called as each bucket's checks complete.
+    """
+    from botocore.exceptions import ClientError
+    import boto3
     try:
         s3_client = boto3.client(
             's3',
@@ -42,27 +47,21 @@ def list_accessible_buckets(access_key, secret_key):
         
         for bucket in buckets:
             bucket_name = bucket['Name']
-            bucket_details = {
-                'Name': bucket_name,
-                'CreationDate': bucket['CreationDate'].strftime('%Y-%m-%d %H:%M:%S'),
-                'CanList': False,
-                'CanGet': False,
-                'CanPut': False,
-                'Location': 'Unknown'
-            }
+            can_list = can_get = can_put = False
+            location = 'Unknown'
             
             # Test basic permissions
             try:
                 # Test listing objects
                 s3_client.list_objects_v2(Bucket=bucket_name, MaxKeys=1)
-                bucket_details['CanList'] = True
+                can_list = True
             except ClientError:
                 pass
                 
             try:
                 # Test getting bucket location
-                location = s3_client.get_bucket_location(Bucket=bucket_name)
-                bucket_details['Location'] = location['LocationConstraint'] or 'us-east-1'
+                response = s3_client.get_bucket_location(Bucket=bucket_name)
+                location = response['LocationConstraint'] or 'us-east-1'
             except ClientError:
                 pass
                 
@@ -70,7 +69,7 @@ def list_accessible_buckets(access_key, secret_key):
                 # Test putting an object (using a test key)
                 test_key = 'test-access-check.txt'
                 s3_client.put_object(Bucket=bucket_name, Key=test_key, Body='test')
-                bucket_details['CanPut'] = True
+                can_put = True
                 # Clean up test object
                 s3_client.delete_object(Bucket=bucket_name, Key=test_key)
             except ClientError:
@@ -78,58 +77,82 @@ def list_accessible_buckets(access_key, secret_key):
                 
             try:
                 # Test getting an object (assuming we can put first)
-                if bucket_details['CanPut']:
+                if can_put:
                     test_key = 'test-access-check.txt'
                     s3_client.put_object(Bucket=bucket_name, Key=test_key, Body='test')
                     s3_client.get_object(Bucket=bucket_name, Key=test_key)
-                    bucket_details['CanGet'] = True
+                    can_get = True
                     s3_client.delete_object(Bucket=bucket_name, Key=test_key)
             except ClientError:
                 pass
                 
-            bucket_info.append(bucket_details)
+            bucket_info.append(S3Bucket(
+                bucket_name,
+                bucket['CreationDate'].strftime('%Y-%m-%d %H:%M:%S'),
+                intern(location),
+                can_list,
+                can_get,
+                can_put
+            ))
+            if on_bucket:
+                on_bucket(bucket_info[-1])
         
         return bucket_info
     
     except ClientError as e:
         return None, f"Error accessing S3: {str(e)}"
 
-def display_bucket_info(user_id, arn, bucket_info):
-    """Display bucket information in a rich table"""
-    console = Console()
-    
-    # Display user info
+BUCKET_COLUMNS = [
+    ("Bucket Name", {'style': "cyan"}),
+    ("Creation Date", {'style': "magenta"}),
+    ("Location", {'style': "green"}),
+    ("Can List", {'justify': "center"}),
+    ("Can Get", {'justify': "center"}),
+    ("Can Put", {'justify': "center"})
+]
+
+def bucket_row(bucket):
+    """Table cells of one bucket"""
+    return [
+        bucket.Name,
+        bucket.CreationDate,
+        bucket.Location,
+        "[green]✓[/green]" if bucket.CanList else "[red]✗[/red]",
+        "[green]✓[/green]" if bucket.CanGet else "[red]✗[/red]",
+        "[green]✓[/green]" if bucket.CanPut else "[red]✗[/red]"
+    ]
+
+def display_user(console, user_id, arn):
     console.print(f"[bold green]User ID:[/bold green] {user_id}")
     console.print(f"[bold green]ARN:[/bold green] {arn}")
     console.print()
+
+def display_bucket_info(user_id, arn, bucket_info, max_rows=None, pager=False):
+    """Display bucket information in a streamed rich table (see live_table.StreamingTable)"""
+    from rich.console import Console
+    console = Console()
     
-    # Create table
-    table = Table(title="Accessible S3 Buckets")
-    table.add_column("Bucket Name", style="cyan", no_wrap=True)
-    table.add_column("Creation Date", style="magenta")
-    table.add_column("Location", style="green")
-    table.add_column("Can List", justify="center")
-    table.add_column("Can Get", justify="center")
-    table.add_column("Can Put", justify="center")
-    
-    for bucket in bucket_info:
-        table.add_row(
-            bucket['Name'],
-            bucket['CreationDate'],
-            bucket['Location'],
-            "[green]✓[/green]" if bucket['CanList'] else "[red]✗[/red]",
-            "[green]✓[/green]" if bucket['CanGet'] else "[red]✗[/red]",
-            "[green]✓[/green]" if bucket['CanPut'] else "[red]✗[/red]"
-        )
+    # Display user info
+    display_user(console, user_id, arn)
     
-    console.print(table)
+    with StreamingTable("Accessible S3 Buckets", BUCKET_COLUMNS, max_rows=max_rows, pager=pager,
+                        console=console) as table:
+        for bucket in bucket_info:
+            table.add_row(*bucket_row(bucket))
 
-def main():
+def main(argv=None):
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='AWS S3 Bucket Enumeration Tool')
     parser.add_argument('--access-key', required=True, help='AWS Access Key (plain or base64 encoded)')
     parser.add_argument('--secret-key', required=True, help='AWS Secret Key (plain or base64 encoded)')
-    args = parser.parse_args()
+    parser.add_argument('--inventory', nargs='?', const=DEFAULT_INVENTORY, metavar='DB',
+                        help=f'Also store results in the local inventory (default DB: {DEFAULT_INVENTORY})')
+    add_snapshot_arguments(parser)
+    add_table_arguments(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args(argv)
+    install_from_args(args)
+    from rich.console import Console
     
     # Decode keys if necessary
     access_key = decode_base64_key(args.access_key)
@@ -139,13 +162,30 @@ def main():
     user_id, arn = get_user_id(access_key, secret_key)
     
     if user_id:
-        # Get bucket information
-        bucket_info = list_accessible_buckets(access_key, secret_key)
+        console = Console()
+        display_user(console, user_id, arn)
+        
+        # Get bucket information, printing each bucket once its checks complete
+        table = StreamingTable("Accessible S3 Buckets", BUCKET_COLUMNS, chunk_size=20,
+                               max_rows=args.max_rows, pager=args.pager, console=console)
+        
+        def on_bucket(bucket):
+            table.add_row(*bucket_row(bucket))
+            table.update(f"{table.rows} buckets checked (last: {bucket.Name})")
+        
+        with table:
+            bucket_info = list_accessible_buckets(access_key, secret_key, on_bucket)
         
         if isinstance(bucket_info, list):
-            display_bucket_info(user_id, arn, bucket_info)
+            if args.inventory:
+                inventory = Inventory(args.inventory)
+                inventory.add_records(bucket_info, account=arn.split(':')[4])
+                inventory.close()
+            if args.snapshot:
+                with open_snapshot_writer(args.snapshot, 'list_buckets', arn.split(':')[4]) as snapshot:
+                    snapshot.add_records(bucket_info)
+                console.print(f"[green]Saved snapshot {snapshot.path}[/green]")
         else:
-            console = Console()
             console.print(f"[bold red]Failed to enumerate buckets: {bucket_info[1]}[/bold red]")
     else:
         console = Console()
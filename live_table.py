@@ -0,0 +1,157 @@
+import os
+import shlex
+import subprocess
+
+# Rows printed to a terminal before the rest are only counted. Piped or
+# paged output is never truncated.
+DEFAULT_MAX_ROWS = 2000
+
+# Column widths are measured once, on the first chunk, and kept within these
+MAX_COLUMN_WIDTH = 48
+MIN_COLUMN_WIDTH = 6
+
+COLUMN_GAP = '  '
+
+class StreamingTable:
+    """Print table rows in fixed-width chunks as they arrive
+
+    Rows are buffered until chunk_size is reached, then printed, so memory
+    is bounded by the chunk, not the result size. Column widths are fixed by
+    the first chunk, which lets every later row be cut to width directly
+    instead of going through rich's table layout; cells longer than their
+    column end in an ellipsis. While rows arrive a status
+    line (see update) shows progress on terminals. Above max_rows rows are
+    counted but not printed; pager=True streams every row into $PAGER
+    (default `less -RS`) instead. Print anything else to self.console, which
+    keeps the status line intact. jsonl says the tool has --format jsonl,
+    which the hint about hidden rows then mentions.
+    """
+
+    def __init__(self, title, columns, chunk_size=200, max_rows=None, pager=False, console=None, jsonl=False):
+        from rich.console import Console
+        self.title = title
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.jsonl = jsonl
+        self.console = console or Console()
+        self.output = self.console
+        self.pager = None
+        if pager and self.console.is_terminal:
+            command = shlex.split(os.environ.get('PAGER') or 'less -RS')
+            self.pager = subprocess.Popen(command, stdin=subprocess.PIPE, text=True)
+            self.output = Console(file=self.pager.stdin, force_terminal=True, width=self.console.width)
+        if max_rows is None:
+            max_rows = DEFAULT_MAX_ROWS if self.console.is_terminal and self.pager is None else 0
+        self.max_rows = max_rows
+        self.widths = None
+        self.chunk = []
+        self.rows = 0
+        self.hidden = 0
+        self._status = None
+        if self.console.is_terminal and self.pager is None:
+            self._status = self.console.status(f"{title}: waiting for results...")
+            self._status.start()
+
+    def add_row(self, *values):
+        self.rows += 1
+        if self.max_rows and self.rows > self.max_rows:
+            self.hidden += 1
+            return
+        self.chunk.append(values)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def update(self, text):
+        """Replace the status line text"""
+        if self._status is not None:
+            self._status.update(f"{self.title}: {text}")
+
+    def flush(self):
+        from rich.segment import Segment, Segments
+        if not self.chunk:
+            return
+        if self.widths is None:
+            self._start()
+        segments = []
+        for row in self.chunk:
+            cells = [self._cell(value, width, options) for value, width, (_, options)
+                     in zip(row, self.widths, self.columns)]
+            for line in range(max(len(cell) for cell in cells)):
+                for cell, width in zip(cells, self.widths):
+                    segments.extend(cell[line] if line < len(cell) else [Segment(' ' * width)])
+                    segments.append(Segment(COLUMN_GAP))
+                segments.append(Segment.line())
+        self.output.print(Segments(segments))
+        self.chunk = []
+
+    def _start(self):
+        """Fix column widths from the first chunk and print the title and header"""
+        from rich.cells import cell_len
+        from rich.rule import Rule
+        self.widths = [
+            min(MAX_COLUMN_WIDTH, max([cell_len(header)] + [
+                cell_len(line) for row in self.chunk
+                for line in self.output.render_str(str(row[i])).plain.split('\n')]))
+            for i, (header, _) in enumerate(self.columns)
+        ]
+        # Shrink the widest columns until a row fits the console
+        while sum(self.widths) + len(COLUMN_GAP) * len(self.widths) > self.output.width:
+            widest = self.widths.index(max(self.widths))
+            if self.widths[widest] <= MIN_COLUMN_WIDTH:
+                break
+            self.widths[widest] -= 1
+        total = min(self.output.width, sum(self.widths) + len(COLUMN_GAP) * len(self.widths))
+        self.output.print(self.title, style='italic', justify='center', width=total)
+        self.output.print(COLUMN_GAP.join(header.ljust(width)[:width] for (header, _), width
+                                          in zip(self.columns, self.widths)),
+                          style='bold', highlight=False, no_wrap=True, crop=True)
+        self.output.print(Rule(style='dim'), width=total)
+
+    def _cell(self, value, width, options):
+        """Segments of each line of one cell, cut or padded to width"""
+        from rich.cells import cell_len, set_cell_size
+        from rich.segment import Segment
+        value = str(value)
+        style = self.output.get_style(options.get('style') or 'none')
+        justify = options.get('justify', 'left')
+        lines = []
+        for line in value.split('\n'):
+            if '[' in line:
+                # Markup such as [green]✓[/green] goes through rich's own rendering
+                text = self.output.render_str(line)
+                text.truncate(width, overflow='ellipsis')
+                text.stylize(style, 0)
+                text.align(justify, width)
+                lines.append(list(text.render(self.output, end='')))
+                continue
+            if cell_len(line) > width:
+                line = set_cell_size(line, width - 1) + '…'
+            elif justify == 'right':
+                line = line.rjust(width)
+            elif justify == 'center':
+                line = line.center(width)
+            lines.append([Segment(set_cell_size(line, width), style)])
+        return lines
+
+    def close(self):
+        self.flush()
+        if self._status is not None:
+            self._status.stop()
+        if self.hidden:
+            options = '--pager, --max-rows 0 or --format jsonl' if self.jsonl else '--pager or --max-rows 0'
+            self.output.print(f"[yellow]{self.hidden} more rows not shown (limit {self.max_rows}); "
+                               f"use {options} to see them all[/yellow]")
+        if self.pager is not None:
+            self.pager.stdin.close()
+            self.pager.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def add_table_arguments(parser):
+    parser.add_argument('--max-rows', type=int,
+                        help=f'Rows to print on a terminal before only counting the rest (default: {DEFAULT_MAX_ROWS}, 0: no limit)')
+    parser.add_argument('--pager', action='store_true', help='Stream the table into $PAGER (default: less -RS)')
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+
+from aws_clients import ClientPool, decode_base64_key, run_concurrently
+from cassette import add_cassette_arguments, install_from_args
+from credential_cache import active_cache, caller_identity
+from output_sink import open_sink
+from records import to_dict
+
+DEFAULT_ROLE = 'OrganizationAccountAccessRole'
+
+def list_accounts(pool):
+    """Active accounts of the organization as (account ID, name) pairs"""
+    organizations = pool.client('organizations')
+    accounts = []
+    for page in organizations.get_paginator('list_accounts').paginate():
+        for account in page['Accounts']:
+            if account.get('Status') == 'ACTIVE':
+                accounts.append((account['Id'], account.get('Name')))
+    return accounts
+
+def assume_account(pool, partition, account_id, role, external_id=None, session_name='awsenum-org-audit'):
+    """ClientPool for a member account, through role assumed with pool's credentials
+
+    The role credentials come from the STS cache and are refreshed in the
+    background, so repeated audits skip AssumeRole and long ones never expire.
+    """
+    credentials = active_cache().role_credentials(
+        pool, f"arn:{partition}:iam::{account_id}:role/{role}", session_name, external_id)
+    return ClientPool(credentials=credentials, config=pool.config)
+
+def frozen_credentials(pool):
+    credentials = pool.session.get_credentials().get_frozen_credentials()
+    return credentials.access_key, credentials.secret_key, credentials.token
+
+def enumerate_permissions(pool, regions, sink, workers, all_regions=False):
+    """enum_aws service permission probes"""
+    from enum_aws import check_service_permissions
+    access_key, secret_key, token = frozen_credentials(pool)
+    permissions = check_service_permissions(access_key, secret_key, all_regions,
+                                            session_token=token, regions=regions)
+    for service_region, actions in permissions.items():
+        sink.write({'ResourceType': 'permission', 'Service': service_region, 'Actions': ', '.join(actions)})
+
+def enumerate_ec2(pool, regions, sink, workers, all_regions=False):
+    """enum_ec2 instances in every region"""
+    from rich.console import Console
+    from enum_ec2 import get_ec2_instances
+    access_key, secret_key, token = frozen_credentials(pool)
+    # Regions it could not enumerate are reported through the sink below, so its
+    # console stays off stdout (the JSONL output) and quiet
+    instances, incomplete = get_ec2_instances(access_key, secret_key, max_workers=workers,
+                                              session_token=token, regions=regions,
+                                              console=Console(stderr=True, quiet=True))
+    for instance in instances:
+        sink.write(instance)
+    for region, reason in incomplete:
+        sink.error('ec2', region, reason)
+
+def enumerate_inventory(pool, regions, sink, workers, all_regions=False):
+    """enum_all sweep of EC2, S3, RDS, ElastiCache and Lambda"""
+    from enum_all import run_sweep
+    run_sweep(pool, regions, sink, max_workers=workers)
+
+ENUMERATORS = {
+    'perms': enumerate_permissions,
+    'ec2': enumerate_ec2,
+    'all': enumerate_inventory
+}
+
+class AccountSink:
+    """Buffer one account's records, tagged with its account ID
+
+    Accounts finish in any order; buffering keeps each account's records
+    together in the shared output instead of interleaving them.
+    """
+
+    def __init__(self, account_id, account_name=None):
+        self.account_id = account_id
+        self.account_name = account_name
+        self.records = []
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        if not isinstance(record, dict):
+            record = to_dict(record)
+        record = dict(record, Account=self.account_id)
+        with self._lock:
+            self.records.append(record)
+
+    def write_batch(self, batch):
+        fields = list(batch.columns)
+        for row in batch.rows():
+            self.write(dict(zip(fields, row), ResourceType=batch.resource_type))
+
+    def error(self, service, region, message):
+        with self._lock:
+            self.errors.append((service, region, message))
+
+    def flush_to(self, sink):
+        for record in self.records:
+            sink.write(record)
+        for service, region, message in self.errors:
+            sink.error(f"{service} ({self.account_id})", region, message)
+
+def audit_account(pool, partition, home_account, account_id, account_name, enumerators, regions,
+                  role, external_id=None, workers=8, all_regions=False):
+    """Run the enumerators against one account; returns its AccountSink and a summary dict"""
+    from botocore.exceptions import BotoCoreError, ClientError
+    start = time.perf_counter()
+    sink = AccountSink(account_id, account_name)
+    summary = {'Account': account_id, 'Name': account_name, 'Status': 'ok'}
+    try:
+        account_pool = pool if account_id == home_account else assume_account(
+            pool, partition, account_id, role, external_id)
+    except ClientError as e:
+        summary['Status'] = f"AssumeRole failed: {e.response.get('Error', {}).get('Code', 'error')}"
+        account_pool = None
+    if account_pool is not None:
+        for name in enumerators:
+            try:
+                ENUMERATORS[name](account_pool, regions, sink, workers, all_regions)
+            except (ClientError, BotoCoreError) as e:
+                sink.error(name, None, str(e))
+                summary['Status'] = 'partial'
+    summary['Records'] = len(sink.records)
+    summary['Errors'] = len(sink.errors)
+    summary['Seconds'] = round(time.perf_counter() - start, 2)
+    return sink, summary
+
+# --processes shards the accounts across worker processes, for org-scale
+# runs where one process is CPU-bound on building clients, parsing
+# responses and encoding JSON. Each worker builds its own session and
+# client pools from the caller's credentials and pulls accounts from a
+# shared queue, auditing up to max_accounts of them at once on threads.
+# A finished account goes back to the parent as one message: its summary,
+# its errors and its records already encoded as JSON lines, so the parent
+# only writes them out. Workers are spawned rather than forked, so no lock
+# held by one of the parent's threads is copied into them.
+
+def _shard_worker(tasks, results, credentials, settings, threads, replay=None):
+    """Worker process body: audit accounts from tasks until it hands out a None per thread"""
+    if replay:
+        import cassette
+        cassette.install(replay, 'replay')
+    access_key, secret_key, token = credentials
+    pool = ClientPool(access_key=access_key, secret_key=secret_key, session_token=token)
+
+    def run():
+        while True:
+            member = tasks.get()
+            if member is None:
+                return
+            account_id, account_name = member
+            try:
+                sink, summary = audit_account(pool, account_id=account_id, account_name=account_name, **settings)
+            except Exception as e:
+                results.put((account_id, {'Account': account_id, 'Status': f"failed: {e}", 'Records': 0,
+                                          'Errors': 1}, '', []))
+                continue
+            lines = '\n'.join(json.dumps(record, default=str) for record in sink.records)
+            results.put((account_id, summary, lines, sink.errors))
+
+    runners = [threading.Thread(target=run) for _ in range(threads)]
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join()
+
+def write_encoded(sink, account_id, lines, errors):
+    """Write an account's records as sent back by a worker process"""
+    write_lines = getattr(sink, 'write_lines', None)
+    if write_lines is not None:
+        write_lines(lines)
+    else:
+        for line in lines.splitlines():
+            sink.write(json.loads(line))
+    for service, region, message in errors:
+        sink.error(f"{service} ({account_id})", region, message)
+
+def audit_sharded(pool, sink, members, processes, max_accounts, settings):
+    """Audit members across worker processes, writing each account as it comes back; returns the summaries"""
+    import multiprocessing
+    import cassette
+    replay = cassette.ACTIVE.path if cassette.ACTIVE is not None and cassette.ACTIVE.mode == 'replay' else None
+    context = multiprocessing.get_context('spawn')
+    tasks, results = context.Queue(), context.Queue()
+    for member in members:
+        tasks.put(member)
+    for _ in range(processes * max_accounts):
+        tasks.put(None)
+    workers = [context.Process(target=_shard_worker, daemon=True,
+                               args=(tasks, results, frozen_credentials(pool), settings, max_accounts, replay))
+               for _ in range(min(processes, len(members)))]
+    for worker in workers:
+        worker.start()
+
+    summaries = []
+    remaining = {account_id for account_id, _ in members}
+    try:
+        while remaining:
+            try:
+                account_id, summary, lines, errors = results.get(timeout=1)
+            except queue.Empty:
+                if any(worker.is_alive() for worker in workers):
+                    continue
+                break
+            remaining.discard(account_id)
+            write_encoded(sink, account_id, lines, errors)
+            summaries.append(summary)
+    finally:
+        for worker in workers:
+            if remaining:
+                worker.terminate()
+            worker.join()
+    for account_id in remaining:
+        summaries.append({'Account': account_id, 'Status': 'failed: worker process exited', 'Records': 0,
+                          'Errors': 1})
+    return summaries
+
+def audit_organization(pool, sink, enumerators, regions, role=DEFAULT_ROLE, external_id=None, accounts=None,
+                       max_accounts=8, workers=8, all_regions=False, processes=1):
+    """Audit every organization account concurrently and write the results to sink
+
+    At most max_accounts accounts run at once, each with at most workers
+    concurrent API calls of its own, so wall time follows the slowest
+    account rather than the number of accounts. The calling account is
+    audited with its own credentials. With processes > 1 the accounts are
+    sharded across that many worker processes, each running up to
+    max_accounts at once. Returns the per-account summaries.
+    """
+    arn = caller_identity(pool)['Arn']
+    partition, home_account = arn.split(':')[1], arn.split(':')[4]
+    members = list_accounts(pool)
+    if accounts:
+        members = [(account_id, name) for account_id, name in members if account_id in accounts]
+
+    if processes > 1:
+        settings = {'partition': partition, 'home_account': home_account, 'enumerators': enumerators,
+                    'regions': regions, 'role': role, 'external_id': external_id, 'workers': workers,
+                    'all_regions': all_regions}
+        summaries = audit_sharded(pool, sink, members, processes, max_accounts, settings)
+        return sorted(summaries, key=lambda summary: summary['Account'])
+
+    tasks = {account_id: (lambda a=account_id, n=name: audit_account(
+                 pool, partition, home_account, a, n, enumerators, regions, role, external_id, workers, all_regions))
+             for account_id, name in members}
+    summaries = []
+    for account_id, result, error in run_concurrently(tasks, max_accounts):
+        if error is not None:
+            summaries.append({'Account': account_id, 'Status': f"failed: {error}", 'Records': 0, 'Errors': 1})
+            continue
+        account_sink, summary = result
+        account_sink.flush_to(sink)
+        summaries.append(summary)
+    return sorted(summaries, key=lambda summary: summary['Account'])
+
+def display_summary(summaries, elapsed):
+    """Per-account summary table on stderr, so JSONL output stays clean"""
+    from rich.console import Console
+    from rich.table import Table
+    console = Console(stderr=True)
+
+    table = Table(title="Organization Audit")
+    table.add_column("Account", style="cyan")
+    table.add_column("Name", style="green")
+    table.add_column("Status", style="yellow")
+    table.add_column("Records", style="magenta")
+    table.add_column("Errors", style="red")
+    table.add_column("Seconds", style="white")
+    for summary in summaries:
+        table.add_row(
+            summary['Account'],
+            summary.get('Name') or 'N/A',
+            summary['Status'],
+            str(summary['Records']),
+            str(summary['Errors']),
+            str(summary.get('Seconds', 'N/A'))
+        )
+    console.print(table)
+    slowest = max((summary.get('Seconds', 0) for summary in summaries), default=0)
+    console.print(f"\n{len(summaries)} accounts in {elapsed:.2f}s (slowest account: {slowest:.2f}s)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run enumerators across every account of an AWS Organization')
+    parser.add_argument('--profile', help='AWS profile of the management (or delegated admin) account')
+    parser.add_argument('--access-key', help='AWS Access Key (plain or base64 encoded)')
+    parser.add_argument('--secret-key', help='AWS Secret Key (plain or base64 encoded)')
+    parser.add_argument('--role', default=DEFAULT_ROLE, help=f'Audit role to assume in member accounts (default: {DEFAULT_ROLE})')
+    parser.add_argument('--external-id', help='External ID required by the audit role')
+    parser.add_argument('--accounts', help='Comma-separated account IDs to audit (default: every active account)')
+    parser.add_argument('--enumerators', default='perms,ec2',
+                        help='Comma-separated enumerators to run (default: perms,ec2; available: %s)' % ','.join(ENUMERATORS))
+    parser.add_argument('--region', action='append', help='Region to enumerate (repeatable, default: all enabled regions)')
+    parser.add_argument('--all-regions', action='store_true', help='Probe permissions in every region, not just the default one')
+    parser.add_argument('--max-accounts', type=int, default=8,
+                        help='Accounts audited at once, per worker process with --processes (default: 8)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Worker processes to shard the accounts across (default: 1, audit in this process)')
+    parser.add_argument('--per-account-workers', type=int, default=8,
+                        help='Concurrent API calls within one account (default: 8)')
+    parser.add_argument('--format', choices=['table', 'jsonl'], default='table', help='Output format')
+    parser.add_argument('--output', help='Write JSONL output to this file instead of stdout')
+    add_cassette_arguments(parser)
+    args = parser.parse_args(argv)
+    from botocore.exceptions import ClientError, NoCredentialsError
+    install_from_args(args)
+
+    if bool(args.access_key) != bool(args.secret_key):
+        parser.error("--access-key and --secret-key must be given together")
+    if args.processes < 1:
+        parser.error("--processes must be at least 1")
+    if args.processes > 1 and args.record:
+        parser.error("--record cannot be combined with --processes; record a single-process run")
+    enumerators = args.enumerators.split(',')
+    unknown = [name for name in enumerators if name not in ENUMERATORS]
+    if unknown:
+        parser.error(f"Unknown enumerators: {', '.join(unknown)}")
+
+    pool = ClientPool(
+        access_key=decode_base64_key(args.access_key) if args.access_key else None,
+        secret_key=decode_base64_key(args.secret_key) if args.secret_key else None,
+        profile=args.profile
+    )
+
+    try:
+        regions = args.region or pool.get_all_regions()
+    except (ClientError, NoCredentialsError) as e:
+        print(f"Error listing regions: {e}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    sink = open_sink(args.format, args.output, title='Organization Audit')
+    with sink:
+        try:
+            summaries = audit_organization(
+                pool, sink, enumerators, regions, args.role, args.external_id,
+                set(args.accounts.split(',')) if args.accounts else None,
+                args.max_accounts, args.per_account_workers, args.all_regions, args.processes)
+        except (ClientError, NoCredentialsError) as e:
+            print(f"Error listing organization accounts: {e}", file=sys.stderr)
+            return 1
+    display_summary(summaries, time.perf_counter() - start)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
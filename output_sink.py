@@ -0,0 +1,141 @@
+import json
+import sys
+import threading
+
+from records import display_value, to_dict
+
+class JsonlSink:
+    """Write one JSON object per line as records arrive"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        """Write a dict or a record from records.py"""
+        if not isinstance(record, dict):
+            record = to_dict(record)
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self.stream.write(line + '\n')
+
+    def write_batch(self, batch):
+        """Write every row of a records.RecordBatch"""
+        fields = ['ResourceType'] + list(batch.columns)
+        lines = [json.dumps(dict(zip(fields, [batch.resource_type] + [to_dict(value) for value in row])), default=str)
+                 for row in batch.rows()]
+        with self._lock:
+            self.stream.write('\n'.join(lines) + '\n' if lines else '')
+
+    def write_lines(self, lines):
+        """Write records already encoded as JSON lines, e.g. by a worker process"""
+        if lines:
+            with self._lock:
+                self.stream.write(lines + '\n')
+
+    def error(self, service, region, message):
+        self.write({'ResourceType': 'error', 'Service': service, 'Region': region, 'Message': message})
+
+    def close(self):
+        self.stream.flush()
+        if self.stream not in (sys.stdout, sys.stderr):
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TableSink:
+    """Collect records and render one rich table per resource type on close"""
+
+    def __init__(self, title='AWS Resources'):
+        self.title = title
+        self.records = {}
+        self.batches = []
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        """Add a dict or a record from records.py"""
+        if not isinstance(record, dict):
+            record = to_dict(record)
+        with self._lock:
+            self.records.setdefault(record['ResourceType'], []).append(record)
+
+    def write_batch(self, batch):
+        """Add a records.RecordBatch; its columns are rendered as-is"""
+        with self._lock:
+            self.batches.append(batch)
+
+    def error(self, service, region, message):
+        with self._lock:
+            self.errors.append((service, region, message))
+
+    def close(self):
+        from rich.console import Console
+        from rich.table import Table
+
+        console = Console()
+        for resource_type, rows in self.records.items():
+            columns = [key for key in dict.fromkeys(k for row in rows for k in row) if key != 'ResourceType']
+            table = Table(title=f"{self.title}: {resource_type}")
+            for column in columns:
+                table.add_column(column, style="cyan" if column == 'Region' else None)
+            for row in rows:
+                table.add_row(*[display_value(row.get(column)) for column in columns])
+            console.print(table)
+            console.print(f"Total {resource_type}: {len(rows)}\n")
+        for batch in self.batches:
+            table = Table(title=f"{self.title}: {batch.resource_type}")
+            for column in batch.columns:
+                table.add_column(column, style="cyan" if column == 'Region' else None)
+            for row in batch.rows():
+                table.add_row(*[display_value(value) for value in row])
+            console.print(table)
+            console.print(f"Total {batch.resource_type}: {len(batch)}\n")
+        for service, region, message in self.errors:
+            console.print(f"[yellow]Warning: {service} in {region or 'global'}: {message}[/yellow]")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TeeSink:
+    """Forward every record to several sinks"""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def write(self, record):
+        for sink in self.sinks:
+            sink.write(record)
+
+    def write_batch(self, batch):
+        for sink in self.sinks:
+            sink.write_batch(batch)
+
+    def error(self, service, region, message):
+        for sink in self.sinks:
+            sink.error(service, region, message)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_sink(output_format='table', path=None, title='AWS Resources'):
+    """Return a sink for the requested output format"""
+    if output_format == 'jsonl':
+        return JsonlSink(open(path, 'w') if path else sys.stdout)
+    if output_format == 'table':
+        return TableSink(title)
+    raise ValueError(f"Unknown output format: {output_format}")
@@ -0,0 +1,230 @@
+import json
+import sys
+import threading
+import time
+
+# Progress of a long run, fed by the tool's work plan (units planned and
+# finished: regions, probes) and by botocore hooks installed like
+# budget.py's. The hooks only bump counters and track the calls in flight;
+# rates, throttling and the ETA are computed by the reporter thread from
+# the difference between two snapshots, so the calls themselves pay for a
+# dict update and two counter increments. On a terminal the reporter
+# keeps one status line current; otherwise it writes a JSON line to stderr
+# every few seconds.
+
+ACTIVE = None
+
+# Error codes services answer with when a caller is being throttled
+THROTTLE_CODES = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'RequestLimitExceeded', 'RequestThrottled', 'SlowDown',
+    'ProvisionedThroughputExceededException', 'BandwidthLimitExceeded', 'EC2ThrottledException'
+}
+
+class RunProgress:
+    """Units planned and finished, API calls, throttled responses and calls in flight"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.total = 0
+        self.done = 0
+        self.calls = 0
+        self.attempts = 0
+        self.throttled = 0
+        self.inflight = {}
+        self._lock = threading.Lock()
+
+    def plan(self, count):
+        with self._lock:
+            self.total += count
+
+    def advance(self, count=1):
+        with self._lock:
+            self.done += count
+
+    def snapshot(self):
+        """Counters at this instant, plus the slowest call still in flight"""
+        now = time.monotonic()
+        with self._lock:
+            slowest = min(self.inflight.values(), key=lambda call: call[0], default=None)
+            state = {'time': now, 'elapsed': now - self.started, 'done': self.done, 'total': self.total,
+                     'calls': self.calls, 'attempts': self.attempts, 'throttled': self.throttled}
+        state['slowest'] = None if slowest is None else {
+            'service': slowest[1], 'operation': slowest[2], 'region': slowest[3],
+            'seconds': round(now - slowest[0], 1)}
+        return state
+
+    # botocore hooks
+
+    def _request_created(self, request, event_name, **kwargs):
+        # Sent requests only: a call refused in before-call (budget, cassette) never gets here.
+        # Retries create the request again; the call keeps its first start time.
+        _, service, operation = event_name.split('.')
+        with self._lock:
+            self.inflight.setdefault(id(request.context), (time.monotonic(), service, operation,
+                                                           request.context.get('client_region')))
+
+    def _call_finished(self, context, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.inflight.pop(id(context), None)
+
+    def _needs_retry(self, response=None, **kwargs):
+        throttled = response is not None and response[1].get('Error', {}).get('Code') in THROTTLE_CODES
+        with self._lock:
+            self.attempts += 1
+            self.throttled += throttled
+
+    def handlers(self):
+        return [('request-created', self._request_created), ('after-call', self._call_finished),
+                ('after-call-error', self._call_finished), ('needs-retry', self._needs_retry)]
+
+def install(progress):
+    """Count the calls of every botocore session created from now on"""
+    from botocore import handlers
+    global ACTIVE
+    ACTIVE = progress
+    handlers.BUILTIN_HANDLERS.extend(progress.handlers())
+    return progress
+
+def uninstall():
+    from botocore import handlers
+    global ACTIVE
+    if ACTIVE is None:
+        return
+    for handler in ACTIVE.handlers():
+        if handler in handlers.BUILTIN_HANDLERS:
+            handlers.BUILTIN_HANDLERS.remove(handler)
+    ACTIVE = None
+
+def plan_units(count):
+    """Add count units to the active run's plan; a no-op without progress reporting"""
+    if ACTIVE is not None:
+        ACTIVE.plan(count)
+
+def advance(count=1):
+    """Mark count planned units finished; a no-op without progress reporting"""
+    if ACTIVE is not None:
+        ACTIVE.advance(count)
+
+def tracked(units):
+    """Yield each unit, marking it finished once the caller's loop moves past it"""
+    for unit in units:
+        yield unit
+        advance()
+
+def rates(previous, current):
+    """Calls per second and throttled percentage between two snapshots, and the ETA in seconds"""
+    seconds = max(current['time'] - previous['time'], 1e-9)
+    attempts = current['attempts'] - previous['attempts']
+    remaining = current['total'] - current['done']
+    eta = current['elapsed'] / current['done'] * remaining if current['done'] and remaining > 0 else None
+    return {
+        'calls_per_second': round((current['calls'] - previous['calls']) / seconds, 1),
+        'throttled_percent': round(100 * (current['throttled'] - previous['throttled']) / attempts, 1)
+        if attempts else 0.0,
+        'eta_seconds': None if eta is None else round(eta)
+    }
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def describe(state, current_rates):
+    """One status line for a snapshot and its rates"""
+    parts = [f"{state['done']}/{state['total']} units",
+             f"{current_rates['calls_per_second']} calls/s",
+             f"{current_rates['throttled_percent']}% throttled"]
+    slowest = state['slowest']
+    if slowest is not None:
+        parts.append(f"slowest: {slowest['service']} {slowest['operation']} "
+                     f"({slowest['region'] or 'global'}) {slowest['seconds']}s")
+    eta = current_rates['eta_seconds']
+    parts.append(f"ETA {format_duration(eta)}" if eta is not None else "ETA N/A")
+    return ', '.join(parts)
+
+class ProgressReporter:
+    """Thread showing a RunProgress every interval seconds until stopped
+
+    mode 'live' keeps a status line on stderr current: through status(text)
+    when the tool already shows one (e.g. StreamingTable.update), else in a
+    rich Live display of its own. mode 'json' writes one JSON line to
+    stderr per interval and a last one on stop.
+    """
+
+    def __init__(self, progress, mode='live', interval=1.0, status=None):
+        self.progress = progress
+        self.mode = mode
+        self.interval = interval
+        self.status = status
+        self.live = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._previous = progress.snapshot()
+
+    def report(self):
+        state = self.progress.snapshot()
+        current_rates = rates(self._previous, state)
+        self._previous = state
+        if self.mode == 'json':
+            line = dict(state, **current_rates)
+            del line['time']
+            line['elapsed'] = round(line['elapsed'], 1)
+            sys.stderr.write(json.dumps({'progress': line}) + '\n')
+            sys.stderr.flush()
+        elif self.status is not None:
+            self.status(describe(state, current_rates))
+        elif self.live is not None:
+            self.live.update(f"[dim]{describe(state, current_rates)}[/dim]", refresh=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def start(self):
+        if self.mode == 'live' and self.status is None:
+            from rich.console import Console
+            from rich.live import Live
+            # Output printed to a terminal stdout goes above the line instead of through it
+            self.live = Live("", console=Console(stderr=True), transient=True, auto_refresh=False,
+                             redirect_stdout=sys.stdout.isatty(), redirect_stderr=False)
+            self.live.start()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if self.mode == 'json':
+            self.report()
+        if self.live is not None:
+            self.live.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def add_progress_arguments(parser):
+    parser.add_argument('--progress', choices=['auto', 'live', 'json', 'off'], default='auto',
+                        help='Progress and ETA on stderr: a live line on a terminal, JSON lines otherwise (default: auto)')
+    parser.add_argument('--progress-interval', type=float, default=10,
+                        help='Seconds between JSON progress lines (default: 10)')
+
+def progress_from_args(args, status=None):
+    """Install progress tracking as given on the command line; returns an unstarted ProgressReporter or None
+
+    status is a callable showing a line of text on the tool's own status
+    line, used instead of a separate live display.
+    """
+    mode = args.progress
+    if mode == 'off':
+        return None
+    if mode == 'auto':
+        mode = 'live' if sys.stderr.isatty() else 'json'
+    progress = install(RunProgress())
+    if mode == 'live':
+        return ProgressReporter(progress, mode, 1.0, status)
+    return ProgressReporter(progress, mode, args.progress_interval)
@@ -0,0 +1,76 @@
+# Collectors declare the response fields they read as dotted paths, and a
+# FieldSpec copies just those out of each item while its page is being
+# processed. The rest of the botocore response (network interfaces,
+# placement, block device details, dozens of scalars per instance) is
+# dropped with the page instead of living as long as the results. A
+# projected item keeps the response's shape, so code reading
+# instance.get('State', {}).get('Name') runs unchanged on it. Lists are
+# walked implicitly: SecurityGroups.GroupId keeps the GroupId of every
+# group, and a path ending at a list or dict keeps it whole.
+
+class FieldSpec:
+    """Dotted field paths compiled once into a tree and applied per item"""
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.tree = {}
+        for field in self.fields:
+            node = self.tree
+            parts = field.split('.')
+            for part in parts[:-1]:
+                if part in node and node[part] is None:
+                    break  # an ancestor is already kept whole
+                node = node.setdefault(part, {})
+            else:
+                node[parts[-1]] = None
+
+    def project(self, item):
+        """A copy of item holding only the spec's fields"""
+        return _project(item, self.tree)
+
+    def values(self, item):
+        """{field: value} for each field, see lookup"""
+        return {field: lookup(item, field) for field in self.fields}
+
+    def __add__(self, fields):
+        return FieldSpec(self.fields + [field for field in fields if field not in self.fields])
+
+def _project(value, tree):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: _project(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+def lookup(value, field):
+    """Value at a dotted path; under a list, the values found in every item"""
+    parts = field.split('.') if isinstance(field, str) else field
+    for index, part in enumerate(parts):
+        if isinstance(value, list):
+            found = []
+            for item in value:
+                result = lookup(item, parts[index:])
+                if isinstance(result, list):
+                    found.extend(result)
+                elif result is not None:
+                    found.append(result)
+            return found
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def project_pages(pages, path, spec):
+    """Yield the items at path (e.g. Reservations.Instances) of every page, projected by spec
+
+    Only the projection outlives the page it came from.
+    """
+    for page in pages:
+        for item in lookup(page, path) or []:
+            yield spec.project(item)
+
+def split_fields(value):
+    """A comma-separated --fields value as a list"""
+    return [field.strip() for field in (value or '').split(',') if field.strip()]
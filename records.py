@@ -0,0 +1,263 @@
+import sys
+from typing import NamedTuple
+
+# Record types for inventory data. NamedTuples carry no per-instance dict,
+# missing values are None instead of an 'N/A' string per field, and the
+# low-cardinality strings (regions, states, types) are interned so every
+# record shares one copy. Renderers turn None back into 'N/A'.
+
+def intern(value):
+    """Intern a low-cardinality string so all records share one copy"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+def display_value(value):
+    """Render a record field for table output"""
+    return 'N/A' if value is None else str(value)
+
+def tag_value(tags, key):
+    """Value of a tag in an AWS Tags list, or None"""
+    for tag in tags or []:
+        if tag['Key'] == key:
+            return tag['Value']
+    return None
+
+def to_dict(record):
+    """Convert a record (and nested records) to plain dicts for serialization"""
+    if not isinstance(record, (list, tuple)):
+        return record
+    fields = getattr(record, '_fields', None)
+    if fields is None:
+        return [to_dict(value) for value in record]
+    result = {'ResourceType': record.resource_type} if hasattr(record, 'resource_type') else {}
+    for key, value in zip(fields, record):
+        result[key] = to_dict(value)
+    return result
+
+class Ec2InstanceDetails(NamedTuple):
+    """Fields added by enum_ec2 --detailed"""
+    ImageId: str = None
+    AmiName: str = None
+    AmiOwner: str = None
+    VpcId: str = None
+    SubnetId: str = None
+    KeyName: str = None
+    IamProfile: str = None
+    HttpTokens: str = None
+    HttpEndpoint: str = None
+    SecurityGroups: tuple = ()
+    PublicIngress: tuple = ()
+    Volumes: tuple = ()
+
+class Ec2Instance(NamedTuple):
+    resource_type = 'ec2:instance'
+
+    Region: str
+    InstanceId: str
+    InstanceType: str = None
+    State: str = None
+    PublicIP: str = None
+    PrivateIP: str = None
+    LaunchTime: object = None
+    Name: str = None
+    Details: Ec2InstanceDetails = None
+    Tags: tuple = ()
+
+    @classmethod
+    def from_api(cls, region, instance):
+        """Build a record from a describe_instances instance"""
+        return cls(
+            intern(region),
+            instance.get('InstanceId'),
+            intern(instance.get('InstanceType')),
+            intern(instance.get('State', {}).get('Name')),
+            instance.get('PublicIpAddress'),
+            instance.get('PrivateIpAddress'),
+            instance.get('LaunchTime'),
+            tag_value(instance.get('Tags'), 'Name'),
+            None,
+            tuple((intern(tag['Key']), tag['Value']) for tag in instance.get('Tags', []))
+        )
+
+class EbsVolume(NamedTuple):
+    resource_type = 'ec2:volume'
+
+    Region: str
+    VolumeId: str
+    Size: int = None
+    VolumeType: str = None
+    State: str = None
+    Encrypted: bool = False
+    AvailabilityZone: str = None
+    CreateTime: object = None
+    AttachedInstance: str = None
+    InstanceName: str = None
+    InstanceState: str = None
+
+    @classmethod
+    def from_api(cls, region, volume, instance=None):
+        """Build a record from a describe_volumes volume and its attached instance's (id, name, state)"""
+        instance_id, name, state = instance or (None, None, None)
+        return cls(
+            intern(region),
+            volume.get('VolumeId'),
+            volume.get('Size'),
+            intern(volume.get('VolumeType')),
+            intern(volume.get('State')),
+            volume.get('Encrypted', False),
+            intern(volume.get('AvailabilityZone')),
+            volume.get('CreateTime'),
+            instance_id,
+            name,
+            intern(state)
+        )
+
+class EbsSnapshot(NamedTuple):
+    resource_type = 'ec2:snapshot'
+
+    Region: str
+    SnapshotId: str
+    VolumeId: str = None
+    VolumeSize: int = None
+    State: str = None
+    Encrypted: bool = False
+    StorageTier: str = None
+    StartTime: object = None
+    Description: str = None
+    SourceVolumeState: str = None
+    SourceInstance: str = None
+    Public: bool = False
+    SharedWith: tuple = None
+
+    @classmethod
+    def from_api(cls, region, snapshot, source=None, public=False, shared_with=None):
+        """Build a record from a describe_snapshots snapshot
+
+        source is the (volume state, attached instance) of the source
+        volume, None once the volume is deleted. shared_with stays None
+        unless sharing was checked.
+        """
+        volume_state, instance_id = source or ('deleted', None)
+        return cls(
+            intern(region),
+            snapshot.get('SnapshotId'),
+            snapshot.get('VolumeId'),
+            snapshot.get('VolumeSize'),
+            intern(snapshot.get('State')),
+            snapshot.get('Encrypted', False),
+            intern(snapshot.get('StorageTier')),
+            snapshot.get('StartTime'),
+            snapshot.get('Description'),
+            intern(volume_state),
+            instance_id,
+            public,
+            shared_with
+        )
+
+class S3Bucket(NamedTuple):
+    resource_type = 's3:bucket'
+
+    Name: str
+    CreationDate: str = None
+    Location: str = None
+    CanList: bool = False
+    CanGet: bool = False
+    CanPut: bool = False
+
+class ElasticBeanstalkEnvironment(NamedTuple):
+    resource_type = 'elasticbeanstalk:environment'
+
+    EnvironmentName: str
+    Status: str = None
+    Health: str = None
+    HealthStatus: str = None
+    VersionLabel: str = None
+    SolutionStackName: str = None
+    DateCreated: object = None
+    DateUpdated: object = None
+    CNAME: str = None
+    Tier: str = None
+    InstanceCount: int = 0
+    ConfigurationSettings: dict = None
+
+    @classmethod
+    def from_api(cls, env, instance_count=0, configuration_settings=None):
+        """Build a record from a describe_environments environment"""
+        return cls(
+            env.get('EnvironmentName'),
+            intern(env.get('Status')),
+            intern(env.get('Health')),
+            intern(env.get('HealthStatus')),
+            env.get('VersionLabel'),
+            intern(env.get('SolutionStackName')),
+            env.get('DateCreated'),
+            env.get('DateUpdated'),
+            env.get('CNAME'),
+            intern(env.get('Tier', {}).get('Name')),
+            instance_count,
+            configuration_settings
+        )
+
+class ElasticBeanstalkApplication(NamedTuple):
+    resource_type = 'elasticbeanstalk:application'
+
+    Region: str
+    ApplicationName: str
+    Description: str = None
+    DateCreated: object = None
+    DateUpdated: object = None
+    Environments: tuple = ()
+    ConfigurationTemplates: tuple = ()
+    ResourceLifecycleConfig: dict = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a record (and its environments) from to_dict output"""
+        environments = tuple(
+            ElasticBeanstalkEnvironment(**{field: env.get(field) for field in ElasticBeanstalkEnvironment._fields})
+            for env in data.get('Environments') or ())
+        return cls(
+            intern(data['Region']),
+            data['ApplicationName'],
+            data.get('Description'),
+            data.get('DateCreated'),
+            data.get('DateUpdated'),
+            environments,
+            tuple(data.get('ConfigurationTemplates') or ()),
+            data.get('ResourceLifecycleConfig')
+        )
+
+class RecordBatch:
+    """Column-oriented batch of one record type: one list per field
+
+    Saves the per-record tuple header on very large inventories and lets
+    sinks walk a single column (e.g. every PublicIP) without touching the
+    others.
+    """
+
+    def __init__(self, record_type):
+        self.record_type = record_type
+        self.resource_type = record_type.resource_type
+        self.columns = {field: [] for field in record_type._fields}
+        self._appenders = [column.append for column in self.columns.values()]
+
+    @classmethod
+    def from_records(cls, record_type, records):
+        batch = cls(record_type)
+        for record in records:
+            batch.append(record)
+        return batch
+
+    def append(self, record):
+        for append, value in zip(self._appenders, record):
+            append(value)
+
+    def rows(self):
+        """Yield each row as a plain tuple in field order"""
+        return zip(*self.columns.values())
+
+    def __iter__(self):
+        make = self.record_type._make
+        return (make(row) for row in self.rows())
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
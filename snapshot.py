@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+
+from inventory import ID_FIELDS, first_field, resource_key
+from live_table import add_table_arguments
+from records import display_value, to_dict
+
+# A snapshot is one run's resources as gzip-compressed lines of
+# "uid<TAB>hash<TAB>json", sorted by uid, after a header line of run
+# metadata. The uid is inventory.resource_key's account:region:type:id and
+# the hash covers the canonical JSON, so two snapshots diff with one
+# streaming merge join that only parses the JSON of resources whose hash
+# changed. Snapshots hold resource details and are created readable by the
+# owner only.
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser('~'), '.awsenum', 'snapshots')
+
+FORMAT = 'awsenum-snapshot/1'
+
+_canonical = json.JSONEncoder(default=str, sort_keys=True, check_circular=False, separators=(',', ':')).encode
+
+def content_hash(line):
+    return hashlib.blake2b(line.encode('utf-8'), digest_size=8).hexdigest()
+
+class SnapshotWriter:
+    """Output sink that saves records as a sorted, hashed snapshot on close
+
+    incomplete lists regions the run did not finish; a later diff does not
+    report their resources as removed.
+    """
+
+    def __init__(self, path, tool, account=None, incomplete=()):
+        self.path = path
+        self.tool = tool
+        self.account = account
+        self.incomplete = list(incomplete)
+        self.entries = {}
+
+    def write(self, record, region=None):
+        data = record if isinstance(record, dict) else to_dict(record)
+        uid = resource_key(data, self.account, region)[0]
+        line = _canonical(data)
+        self.entries[uid] = (content_hash(line), line)
+
+    def write_batch(self, batch):
+        fields = list(batch.columns)
+        for row in batch.rows():
+            self.write(dict(zip(fields, [to_dict(value) for value in row]), ResourceType=batch.resource_type))
+
+    def add_records(self, records, region=None):
+        for record in records:
+            self.write(record, region)
+
+    def error(self, service, region, message):
+        if region and region not in self.incomplete:
+            self.incomplete.append(region)
+
+    def close(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        header = {'format': FORMAT, 'tool': self.tool, 'account': self.account, 'created': time.time(),
+                  'resources': len(self.entries), 'incomplete': sorted(self.incomplete)}
+        temporary = f"{self.path}.{os.getpid()}"
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with gzip.open(os.fdopen(fd, 'wb'), 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(json.dumps(header) + '\n')
+            f.writelines(f"{uid}\t{digest}\t{line}\n" for uid, (digest, line) in sorted(self.entries.items()))
+        os.replace(temporary, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Snapshot:
+    """Read a snapshot one resource at a time"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = gzip.open(path, 'rt', encoding='utf-8')
+        self.meta = json.loads(self._file.readline() or '{}')
+        if self.meta.get('format') != FORMAT:
+            self._file.close()
+            raise ValueError(f"Not an awsenum snapshot: {path}")
+
+    def __iter__(self):
+        """Yield (uid, hash, json text) in uid order"""
+        for line in self._file:
+            uid, digest, data = line.rstrip('\n').split('\t', 2)
+            yield uid, digest, data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def flatten(data, prefix=''):
+    """Nested dicts as one {dotted.field: value} dict; lists stay whole"""
+    fields = {}
+    for key, value in data.items():
+        if isinstance(value, dict) and value:
+            fields.update(flatten(value, f"{prefix}{key}."))
+        else:
+            fields[prefix + key] = value
+    return fields
+
+def field_changes(old, new):
+    """[(field, old value, new value)] for every field that differs"""
+    old = flatten(old)
+    new = flatten(new)
+    return [(field, old.get(field), new.get(field))
+            for field in sorted(old.keys() | new.keys()) if old.get(field) != new.get(field)]
+
+def diff_snapshots(old, new):
+    """Merge two Snapshots and yield (change, uid, resource, field changes)
+
+    change is 'added', 'removed', 'modified' (with its field_changes) or
+    'unverified' for a resource missing from new in a region the new run
+    did not finish. Only resources that differ are parsed, and memory stays
+    constant: each snapshot is read one line at a time.
+    """
+    incomplete = set(new.meta.get('incomplete') or ())
+    old_entries = iter(old)
+    new_entries = iter(new)
+    old_entry = next(old_entries, None)
+    new_entry = next(new_entries, None)
+    while old_entry is not None or new_entry is not None:
+        if new_entry is None or (old_entry is not None and old_entry[0] < new_entry[0]):
+            resource = json.loads(old_entry[2])
+            change = 'unverified' if resource.get('Region') in incomplete else 'removed'
+            yield change, old_entry[0], resource, []
+            old_entry = next(old_entries, None)
+        elif old_entry is None or new_entry[0] < old_entry[0]:
+            yield 'added', new_entry[0], json.loads(new_entry[2]), []
+            new_entry = next(new_entries, None)
+        else:
+            if old_entry[1] != new_entry[1]:
+                resource = json.loads(new_entry[2])
+                yield 'modified', new_entry[0], resource, field_changes(json.loads(old_entry[2]), resource)
+            old_entry = next(old_entries, None)
+            new_entry = next(new_entries, None)
+
+def snapshot_path(directory, tool, account):
+    return os.path.join(directory, f"{tool}-{account}-{time.strftime('%Y%m%d-%H%M%S')}.snap.gz")
+
+def list_snapshots(directory=DEFAULT_SNAPSHOT_DIR):
+    """Snapshot paths in directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.snap.gz')]
+    return sorted(paths, key=os.path.getmtime)
+
+def resolve_snapshot(name, directory=DEFAULT_SNAPSHOT_DIR):
+    """A snapshot path, or the name of one in directory"""
+    for path in (name, os.path.join(directory, name), os.path.join(directory, name + '.snap.gz')):
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"Snapshot not found: {name}")
+
+def latest_pair(directory=DEFAULT_SNAPSHOT_DIR):
+    """The newest snapshot and the one before it from the same tool and account"""
+    paths = list_snapshots(directory)
+    if not paths:
+        raise FileNotFoundError(f"No snapshots in {directory}")
+    series = os.path.basename(paths[-1]).rsplit('-', 2)[0]
+    previous = [path for path in paths[:-1] if os.path.basename(path).rsplit('-', 2)[0] == series]
+    if not previous:
+        raise FileNotFoundError(f"Only one {series} snapshot in {directory}")
+    return previous[-1], paths[-1]
+
+def open_snapshot_writer(option, tool, account):
+    """SnapshotWriter for a tool's --snapshot option value, or None when not given"""
+    if not option:
+        return None
+    if option == DEFAULT_SNAPSHOT_DIR or os.path.isdir(option):
+        option = snapshot_path(option, tool, account)
+    return SnapshotWriter(option, tool, account)
+
+def add_snapshot_arguments(parser):
+    parser.add_argument('--snapshot', nargs='?', const=DEFAULT_SNAPSHOT_DIR, metavar='PATH',
+                        help=f'Also save results as a snapshot for `awsenum diff` (default directory: {DEFAULT_SNAPSHOT_DIR})')
+
+def format_value(value):
+    if isinstance(value, list):
+        # Tags are stored as [key, value] pairs
+        return ', '.join('='.join(map(str, item)) if isinstance(item, list) and len(item) == 2
+                         else display_value(item) for item in value) or 'None'
+    return display_value(value)
+
+def format_change(old, new):
+    """(old, new) display strings; lists show only the items removed and added"""
+    if isinstance(old, list) and isinstance(new, list):
+        removed = [item for item in old if item not in new]
+        added = [item for item in new if item not in old]
+        return '-' + format_value(removed) if removed else '', '+' + format_value(added) if added else ''
+    return format_value(old), format_value(new)
+
+def display_diff(changes, old_meta, new_meta, max_rows=None, pager=False):
+    """Stream changes into a table, one row per changed field; returns {change: count}"""
+    from live_table import StreamingTable
+    columns = [
+        ("Change", {'style': "bold"}),
+        ("Type", {'style': "blue"}),
+        ("Region", {'style': "cyan"}),
+        ("Resource", {'style': "magenta"}),
+        ("Field", {'style': "yellow"}),
+        ("Old", {'style': "red"}),
+        ("New", {'style': "green"})
+    ]
+    styles = {'added': '[green]added[/green]', 'removed': '[red]removed[/red]',
+              'modified': '[yellow]modified[/yellow]', 'unverified': '[dim]unverified[/dim]'}
+    counts = {change: 0 for change in styles}
+    table = StreamingTable(f"Changes since {time.strftime('%Y-%m-%d %H:%M', time.localtime(old_meta['created']))}",
+                           columns, max_rows=max_rows, pager=pager, jsonl=True)
+    with table:
+        for change, uid, resource, fields in changes:
+            counts[change] += 1
+            label = [styles[change], resource['ResourceType'], display_value(resource.get('Region')),
+                     display_value(first_field(resource, *ID_FIELDS))]
+            for field, old, new in fields:
+                table.add_row(*label, field, *format_change(old, new))
+            if not fields:
+                table.add_row(*label, '', '', '')
+    table.console.print(f"\n{counts['added']} added, {counts['removed']} removed, {counts['modified']} modified")
+    if counts['unverified']:
+        table.console.print(f"[yellow]{counts['unverified']} resources missing from regions the new run did not "
+                            f"finish ({', '.join(new_meta['incomplete'])}) were not reported as removed[/yellow]")
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show what changed between two inventory snapshots')
+    parser.add_argument('old', nargs='?', help='Older snapshot (path or name; default: the one before NEW)')
+    parser.add_argument('new', nargs='?', help='Newer snapshot (path or name; default: the latest)')
+    parser.add_argument('--dir', default=DEFAULT_SNAPSHOT_DIR, help=f'Snapshot directory (default: {DEFAULT_SNAPSHOT_DIR})')
+    parser.add_argument('--type', dest='resource_type', help='Only report this resource type, e.g. ec2:instance')
+    parser.add_argument('--list', action='store_true', help='List saved snapshots and exit')
+    parser.add_argument('--format', choices=['table', 'jsonl'], default='table', help='Output format')
+    add_table_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for path in list_snapshots(args.dir):
+            print(os.path.basename(path))
+        return 0
+
+    try:
+        if args.old and args.new:
+            old_path, new_path = resolve_snapshot(args.old, args.dir), resolve_snapshot(args.new, args.dir)
+        elif args.old:
+            parser.error("Give both snapshots, or neither to diff the latest two")
+        else:
+            old_path, new_path = latest_pair(args.dir)
+        old, new = Snapshot(old_path), Snapshot(new_path)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    with old, new:
+        changes = diff_snapshots(old, new)
+        if args.resource_type:
+            changes = (change for change in changes if change[2]['ResourceType'] == args.resource_type)
+        if args.format == 'jsonl':
+            for change, uid, resource, fields in changes:
+                entry = {'Change': change, 'Uid': uid, 'Resource': resource}
+                if fields:
+                    entry['Fields'] = [{'Field': field, 'Old': old_value, 'New': new_value}
+                                       for field, old_value, new_value in fields]
+                print(json.dumps(entry, default=str))
+        else:
+            print(f"{os.path.basename(old_path)} -> {os.path.basename(new_path)}", file=sys.stderr)
+            display_diff(changes, old.meta, new.meta, args.max_rows, args.pager)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+from aws_clients import CallCounter, run_concurrently
+
+# Resource type for services whose ARNs carry a bare name (arn:aws:s3:::bucket)
+BARE_ARN_TYPES = {
+    's3': 'bucket',
+    'sns': 'topic',
+    'sqs': 'queue'
+}
+
+def parse_arn(arn):
+    """Split an ARN into (service, region, account, resource_type, resource_id)
+
+    Handles the three resource layouts AWS uses: type/id (ec2, eks, elb),
+    type:id (lambda, rds, secretsmanager) and a bare id (s3, sns, sqs).
+    """
+    parts = arn.split(':', 5)
+    if len(parts) < 6:
+        raise ValueError(f"Not an ARN: {arn}")
+    _, _, service, region, account, resource = parts
+    slash = resource.find('/')
+    colon = resource.find(':')
+    if slash != -1 and (colon == -1 or slash < colon):
+        resource_type, resource_id = resource.split('/', 1)
+    elif colon != -1:
+        resource_type, resource_id = resource.split(':', 1)
+    else:
+        resource_type, resource_id = BARE_ARN_TYPES.get(service, ''), resource
+    return service, region, account, resource_type, resource_id
+
+def list_tagged_resources(pool, region, counter):
+    """Every resource the tagging API knows in a region, one paginated stream"""
+    tagging = pool.client('resourcegroupstaggingapi', region)
+    records = []
+    for page in tagging.get_paginator('get_resources').paginate(ResourcesPerPage=100):
+        counter.add()
+        for mapping in page.get('ResourceTagMappingList', []):
+            arn = mapping['ResourceARN']
+            service, arn_region, account, resource_type, resource_id = parse_arn(arn)
+            records.append({
+                'ResourceType': f"{service}:{resource_type}" if resource_type else service,
+                'Region': arn_region or region,
+                'Account': account or None,
+                'ResourceId': resource_id,
+                'Arn': arn,
+                'Tags': [(tag['Key'], tag['Value']) for tag in mapping.get('Tags', [])]
+            })
+    return records
+
+def chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def describe_ec2_instances(pool, region, resources, counter):
+    ec2 = pool.client('ec2', region)
+    described = {}
+    for chunk in chunks([r['ResourceId'] for r in resources], 200):
+        for page in ec2.get_paginator('describe_instances').paginate(
+                Filters=[{'Name': 'instance-id', 'Values': chunk}]):
+            counter.add()
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    described[instance['InstanceId']] = {
+                        'InstanceId': instance['InstanceId'],
+                        'State': instance.get('State', {}).get('Name'),
+                        'Type': instance.get('InstanceType'),
+                        'PublicIp': instance.get('PublicIpAddress'),
+                        'PrivateIp': instance.get('PrivateIpAddress'),
+                        'VpcId': instance.get('VpcId')
+                    }
+    return described
+
+def describe_rds_instances(pool, region, resources, counter):
+    rds = pool.client('rds', region)
+    described = {}
+    for chunk in chunks([r['Arn'] for r in resources], 100):
+        for page in rds.get_paginator('describe_db_instances').paginate(
+                Filters=[{'Name': 'db-instance-id', 'Values': chunk}]):
+            counter.add()
+            for db in page['DBInstances']:
+                described[db['DBInstanceIdentifier']] = {
+                    'DBInstanceId': db['DBInstanceIdentifier'],
+                    'Engine': db.get('Engine'),
+                    'Status': db.get('DBInstanceStatus'),
+                    'Endpoint': db.get('Endpoint', {}).get('Address'),
+                    'PubliclyAccessible': db.get('PubliclyAccessible')
+                }
+    return described
+
+def describe_lambda_functions(pool, region, resources, counter):
+    # No batch API; one get_function_configuration per requested function
+    from botocore.exceptions import ClientError
+    lambda_client = pool.client('lambda', region)
+    described = {}
+    for resource in resources:
+        counter.add()
+        try:
+            function = lambda_client.get_function_configuration(FunctionName=resource['Arn'])
+        except ClientError:
+            # The tagging API still lists recently deleted functions; keep the tagging record as-is
+            continue
+        described[resource['ResourceId']] = {
+            'FunctionName': function.get('FunctionName'),
+            'Runtime': function.get('Runtime'),
+            'Role': function.get('Role'),
+            'LastModified': function.get('LastModified')
+        }
+    return described
+
+# Resource types that can get a targeted describe after the wide listing
+DESCRIBERS = {
+    'ec2:instance': describe_ec2_instances,
+    'rds:db': describe_rds_instances,
+    'lambda:function': describe_lambda_functions
+}
+
+def run_wide(pool, regions, sink, describe_types=(), max_workers=32):
+    """Cross-service inventory from the Resource Groups Tagging API
+
+    One paginated get_resources stream per region lists every tagged
+    resource ARN across all services. Only resource types listed in
+    describe_types get follow-up describe calls, batched by ID. Note the
+    tagging API only sees resources that carry (or once carried) a tag.
+    Returns (records written, API calls made).
+    """
+    counter = CallCounter()
+    unknown = set(describe_types) - set(DESCRIBERS)
+    if unknown:
+        raise ValueError(f"No describer for: {', '.join(sorted(unknown))} (available: {', '.join(DESCRIBERS)})")
+
+    def collect(region):
+        records = list_tagged_resources(pool, region, counter)
+        for resource_type in describe_types:
+            wanted = [r for r in records if r['ResourceType'] == resource_type]
+            if not wanted:
+                continue
+            described = DESCRIBERS[resource_type](pool, region, wanted, counter)
+            for record in wanted:
+                record.update(described.get(record['ResourceId'], {}))
+        return records
+
+    tasks = {region: (lambda r=region: collect(r)) for region in regions}
+    count = 0
+    for region, records, error in run_concurrently(tasks, max_workers):
+        if error is not None:
+            sink.error('resourcegroupstaggingapi', region, str(error))
+            continue
+        for record in records:
+            sink.write(record)
+        count += len(records)
+    return count, counter.count